@@ -26,9 +26,9 @@ class VirtualAccountRequestAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at')
 
 class WebhookEventAdmin(admin.ModelAdmin):
-    list_display = ('event_type', 'provider', 'processed', 'created_at')
+    list_display = ('event', 'event_type', 'provider', 'processed', 'attempts', 'created_at')
     list_filter = ('event_type', 'provider', 'processed', 'created_at')
-    search_fields = ('provider', 'event_type')
+    search_fields = ('provider', 'event_type', 'event', 'event_id')
     readonly_fields = ('created_at', 'processed_at')
 
 admin.site.register(Bank, BankAdmin)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BankingConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "banking"
+
+    def ready(self):
+        import banking.deposits  # noqa
@@ -0,0 +1,114 @@
+"""
+Crediting of deposits to users' dedicated virtual accounts.
+
+Paystack reports each transfer into a dedicated account as a
+``charge.success`` webhook. ``credit_deposits`` is the handler for those
+events: it matches each one to its ``VirtualAccount`` by the receiving
+account number and credits the whole batch at once, with one balance update
+per user, one insert of ``Transaction`` rows and one insert of ledger legs.
+The Paystack reference becomes the transaction's reference, and a reference
+that has already been used, even by a transaction since archived, is
+skipped.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from transactions import rollups, wallet
+from transactions.models import Transaction, TransactionReference
+from users.models import VirtualAccount
+
+from . import webhooks
+
+User = get_user_model()
+
+
+def _account_number(data):
+    authorization = data.get('authorization') if isinstance(data.get('authorization'), dict) else {}
+    metadata = data.get('metadata') if isinstance(data.get('metadata'), dict) else {}
+    number = authorization.get('receiver_bank_account_number') or metadata.get('receiver_account_number')
+    return str(number) if number else None
+
+
+def _deposit(event):
+    """
+    ``(reference, account_number, amount)`` for a successful deposit event,
+    or None.
+    """
+    data = event.payload.get('data')
+    if not isinstance(data, dict) or data.get('status') != 'success' or not data.get('reference'):
+        return None
+    account_number = _account_number(data)
+    try:
+        # Paystack amounts are in kobo
+        amount = Decimal(str(data.get('amount'))) / 100
+    except (InvalidOperation, ValueError):
+        return None
+    if not account_number or not amount.is_finite() or amount <= 0:
+        return None
+    return str(data['reference']), account_number, amount
+
+
+@webhooks.handler('charge.success')
+def credit_deposits(events):
+    """
+    Credit the deposits reported by ``events``. Charges that are not to a
+    virtual account are ignored.
+    """
+    deposits = {}
+    for event in events:
+        deposit = _deposit(event)
+        if deposit is not None:
+            deposits.setdefault(deposit[0], deposit)
+    if not deposits:
+        return
+
+    accounts = {
+        account.account_number: account
+        for account in VirtualAccount.objects.select_related('user').filter(
+            account_number__in={account_number for _, account_number, _ in deposits.values()}
+        )
+    }
+    deposits = {
+        reference: (accounts[account_number], amount)
+        for reference, account_number, amount in deposits.values()
+        if account_number in accounts
+    }
+    if not deposits:
+        return
+
+    # A reference always belongs to the same user, so with the users locked
+    # no other processor can credit it between this check and the insert.
+    list(
+        User.objects.select_for_update()
+        .filter(pk__in={account.user_id for account, _ in deposits.values()})
+        .order_by('pk')
+        .values_list('pk', flat=True)
+    )
+    credited = set(
+        TransactionReference.objects.filter(reference__in=list(deposits))
+        .values_list('reference', flat=True)
+    )
+    now = timezone.now()
+    transactions = Transaction.objects.bulk_create([
+        Transaction(
+            user=account.user,
+            transaction_type='credit',
+            category='deposit',
+            amount=amount,
+            description=f'Wallet top-up via virtual account {account.account_number}',
+            status='completed',
+            reference=reference,
+            completed_at=now,
+            metadata={
+                'payment_method': 'virtual_account',
+                'account_number': account.account_number,
+                'bank_name': account.bank_name,
+            },
+        )
+        for reference, (account, amount) in deposits.items()
+        if reference not in credited
+    ])
+    wallet.credit_many((transaction.user, transaction.amount, transaction) for transaction in transactions)
+    rollups.record(transactions)
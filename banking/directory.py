@@ -0,0 +1,245 @@
+"""
+Local directory of banks, synced from Paystack.
+
+``refresh`` fetches Paystack's bank list once and applies it to the ``Bank``
+table in one upsert: it diffs the list against the stored rows, writes only
+the banks that are new or changed with a single
+``bulk_create(update_conflicts=True)``, and deactivates banks Paystack no
+longer lists. The ``sync_banks`` command runs it on a schedule, and the bank
+list endpoint serves from the table (syncing only while it is still empty).
+
+``arefresh`` is the same for async views.
+
+Bank names are read from ``current()``, an immutable ``BankDirectory``
+snapshot of the table held in memory by each process. The first call loads
+it; after that, once ``BANK_DIRECTORY_TTL`` seconds have passed, a background
+thread compares the table's version (row count and latest ``updated_at``)
+with the snapshot's and swaps in a new snapshot only if it changed. Readers
+never wait on the database, and a page of accounts is named with one
+``resolve_many`` call.
+"""
+import logging
+import os
+import threading
+import time
+from types import MappingProxyType
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction as db_transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from . import paystack
+from .models import Bank
+
+logger = logging.getLogger(__name__)
+
+BANKS_PATH = 'bank'
+BANKS_PARAMS = {'country': 'Nigeria'}
+
+FIELDS = ['name', 'country', 'currency', 'type', 'is_active']
+
+# Names for major banks, used for codes the Bank table does not know
+FALLBACK_NAMES = {
+    '044': 'Access Bank',
+    '023': 'Citibank',
+    '063': 'Diamond Bank',
+    '050': 'Ecobank',
+    '070': 'Fidelity Bank',
+    '011': 'First Bank',
+    '214': 'First City Monument Bank',
+    '058': 'Guaranty Trust Bank',
+    '030': 'Heritage Bank',
+    '301': 'Jaiz Bank',
+    '082': 'Keystone Bank',
+    '014': 'MainStreet Bank',
+    '076': 'Polaris Bank',
+    '101': 'Providus Bank',
+    '221': 'Stanbic IBTC',
+    '068': 'Standard Chartered',
+    '232': 'Sterling Bank',
+    '100': 'Suntrust Bank',
+    '032': 'Union Bank',
+    '033': 'United Bank for Africa',
+    '215': 'Unity Bank',
+    '035': 'Wema Bank',
+    '057': 'Zenith Bank',
+}
+
+
+class DirectoryError(Exception):
+    """Raised when Paystack does not return a usable bank list."""
+
+
+def _bank_list(response):
+    if response.status_code != 200:
+        raise DirectoryError(f'Paystack API error: {response.status_code} - {response.text[:500]}')
+    data = response.json()
+    if not isinstance(data, dict) or not data.get('status'):
+        message = data.get('message') if isinstance(data, dict) else None
+        raise DirectoryError(message or 'Invalid response from Paystack')
+    banks = [item for item in data.get('data') or [] if isinstance(item, dict) and item.get('code')]
+    if not banks:
+        # Never treat an empty list as every bank having closed
+        raise DirectoryError('Paystack returned no banks')
+    return banks
+
+
+def _bank(item):
+    code = str(item['code'])
+    return Bank(
+        code=code,
+        name=item.get('name') or code,
+        country=item.get('country') or 'Nigeria',
+        currency=item.get('currency') or 'NGN',
+        type=item.get('type') or 'nuban',
+        is_active=bool(item.get('active', True)) and not item.get('is_deleted', False),
+    )
+
+
+def store(items):
+    """
+    Apply Paystack's bank list ``items`` to the ``Bank`` table.
+
+    Returns ``{'created': n, 'updated': n, 'deactivated': n, 'unchanged': n}``.
+    """
+    # Later duplicates win; one upsert cannot touch the same row twice
+    banks = {bank.code: bank for bank in map(_bank, items)}
+    with db_transaction.atomic():
+        stored = {row[0]: row[1:] for row in Bank.objects.values_list('code', *FIELDS)}
+        changed = [
+            bank for code, bank in banks.items()
+            if stored.get(code) != tuple(getattr(bank, field) for field in FIELDS)
+        ]
+        Bank.objects.bulk_create(
+            changed,
+            update_conflicts=True,
+            unique_fields=['code'],
+            update_fields=FIELDS + ['updated_at'],
+        )
+        deactivated = Bank.objects.filter(is_active=True).exclude(code__in=list(banks)).update(
+            is_active=False, updated_at=timezone.now()
+        )
+    # Let this process pick up the change on its next read
+    _expire()
+    created = sum(1 for bank in changed if bank.code not in stored)
+    return {
+        'created': created,
+        'updated': len(changed) - created,
+        'deactivated': deactivated,
+        'unchanged': len(banks) - len(changed),
+    }
+
+
+def refresh():
+    """
+    Fetch the bank list from Paystack and store it. Returns ``store``'s counts.
+    """
+    return store(_bank_list(paystack.get(BANKS_PATH, params=BANKS_PARAMS)))
+
+
+async def arefresh():
+    """
+    Async ``refresh``.
+    """
+    items = _bank_list(await paystack.aget(BANKS_PATH, params=BANKS_PARAMS))
+    return await sync_to_async(store)(items)
+
+
+class BankDirectory:
+    """
+    An immutable snapshot of the bank directory: bank code -> name, as of
+    ``version`` of the Bank table. Inactive banks keep their names, since
+    existing accounts may still be held with them.
+    """
+
+    def __init__(self, version, names):
+        self.version = version
+        self._names = MappingProxyType({**FALLBACK_NAMES, **names})
+
+    def __len__(self):
+        return len(self._names)
+
+    def resolve(self, code, default=None):
+        """
+        Return the name of bank ``code``, or ``default`` if it is unknown.
+        """
+        return self._names.get(code, default)
+
+    def resolve_many(self, codes):
+        """
+        Return ``{code: name}`` for each of ``codes`` that is known.
+        """
+        return {code: self._names[code] for code in codes if code in self._names}
+
+
+_lock = threading.Lock()
+_current = None
+_checked_at = 0.0
+_checking = False
+
+
+def _reset():
+    global _lock, _current, _checked_at, _checking
+    _lock = threading.Lock()
+    _current = None
+    _checked_at = 0.0
+    _checking = False
+
+
+# A forked worker loads its own snapshot
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset)
+
+
+def _version():
+    stats = Bank.objects.aggregate(count=Count('id'), updated_at=Max('updated_at'))
+    return stats['count'], stats['updated_at']
+
+
+def _read():
+    # The version is read first, so a change made in between is picked up by the next check
+    version = _version()
+    return BankDirectory(version, dict(Bank.objects.values_list('code', 'name')))
+
+
+def _expire():
+    global _checked_at
+    _checked_at = float('-inf')
+
+
+def _revalidate():
+    global _current, _checked_at, _checking
+    try:
+        if _version() != _current.version:
+            _current = _read()
+    except Exception:
+        logger.exception('Bank directory refresh failed')
+    finally:
+        with _lock:
+            _checked_at = time.monotonic()
+            _checking = False
+        connection.close()
+
+
+def current():
+    """
+    Return this process's ``BankDirectory``. Only the first call reads the
+    database; a stale snapshot is served while it is checked in the background.
+    """
+    global _current, _checked_at, _checking
+    snapshot = _current
+    if snapshot is None:
+        with _lock:
+            if _current is None:
+                _current = _read()
+                _checked_at = time.monotonic()
+            return _current
+    if time.monotonic() - _checked_at >= settings.BANK_DIRECTORY_TTL:
+        with _lock:
+            start = not _checking
+            _checking = True
+        if start:
+            threading.Thread(target=_revalidate, name='bank-directory', daemon=True).start()
+    return snapshot
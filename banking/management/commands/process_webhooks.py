@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from banking import webhooks
+
+
+class Command(BaseCommand):
+    help = 'Apply stored Paystack webhook events in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Number of events claimed and applied together')
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help='Stop after this many batches (default: until none are left)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or (options['max_batches'] is not None and options['max_batches'] < 1):
+            raise CommandError('--batch-size and --max-batches must be at least 1')
+
+        totals = webhooks.process_pending(
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {totals['processed']}, failed {totals['failed']}"
+        ))
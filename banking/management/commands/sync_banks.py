@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from banking import directory
+
+
+class Command(BaseCommand):
+    help = "Sync the local bank directory with Paystack's bank list"
+
+    def handle(self, *args, **options):
+        try:
+            counts = directory.refresh()
+        except Exception as e:
+            raise CommandError(f'Failed to sync banks: {e}')
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {counts['created']}, updated {counts['updated']}, "
+            f"deactivated {counts['deactivated']}, unchanged {counts['unchanged']}"
+        ))
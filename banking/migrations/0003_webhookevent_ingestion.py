@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='webhookevent',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='event',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='event_id',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='webhookevent',
+            name='last_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AlterField(
+            model_name='webhookevent',
+            name='event_type',
+            field=models.CharField(choices=[('transfer', 'Transfer'), ('virtual_account', 'Virtual Account'), ('verification', 'Verification'), ('charge', 'Charge'), ('other', 'Other')], max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='webhookevent',
+            index=models.Index(condition=models.Q(('processed', False)), fields=['created_at', 'id'], name='webhook_unprocessed_idx'),
+        ),
+    ]
@@ -80,22 +80,37 @@ class VirtualAccountRequest(models.Model):
         return f"{self.user.username} - {self.status}"
 
 class WebhookEvent(models.Model):
+    """
+    A provider callback, stored as received and applied later in batches by
+    ``banking.webhooks``. ``event_id`` deduplicates redeliveries.
+    """
     EVENT_TYPES = [
         ('transfer', 'Transfer'),
         ('virtual_account', 'Virtual Account'),
         ('verification', 'Verification'),
+        ('charge', 'Charge'),
+        ('other', 'Other'),
     ]
     
     event_type = models.CharField(max_length=20, choices=EVENT_TYPES)
     provider = models.CharField(max_length=100)
+    # The provider's own event name, e.g. charge.success
+    event = models.CharField(max_length=100, blank=True, default='')
+    event_id = models.CharField(max_length=255, unique=True, null=True, blank=True)
     payload = models.JSONField()
     signature = models.CharField(max_length=255, blank=True, null=True)
     processed = models.BooleanField(default=False)
     processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Events waiting to be processed, oldest first
+            models.Index(fields=['created_at', 'id'], condition=models.Q(processed=False), name='webhook_unprocessed_idx'),
+        ]
     
     def __str__(self):
         return f"{self.event_type} - {self.provider} - {self.created_at}"
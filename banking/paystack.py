@@ -0,0 +1,105 @@
+"""
+Shared HTTP client for the Paystack API.
+
+Like ``transactions.yanga``, one pooled ``requests.Session`` is kept per
+process and every call goes through the ``paystack`` circuit breaker
+(``spacevest.circuit``): at most ``PAYSTACK_MAX_CONCURRENT`` calls run at once,
+and while Paystack is failing or slow calls raise ``ProviderUnavailable``
+straight away instead of waiting on their timeout.
+
+``aget``/``apost`` are the same calls for async views, made with a pooled
+``httpx.AsyncClient`` (``spacevest.aio``) behind the same breaker.
+"""
+import os
+import threading
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from spacevest import aio, circuit
+
+TIMEOUT = (settings.PAYSTACK_CONNECT_TIMEOUT, settings.PAYSTACK_READ_TIMEOUT)
+
+# One quick retry for reads; anything slower is left to the circuit breaker
+RETRY = Retry(
+    total=1,
+    connect=1,
+    read=1,
+    status=1,
+    backoff_factor=0.2,
+    status_forcelist=[502, 503, 504],
+    allowed_methods=frozenset(['GET']),
+    raise_on_status=False,
+)
+
+_lock = threading.Lock()
+_session = None
+
+
+def _reset():
+    global _session
+    _session = None
+
+
+# A forked worker must open its own connections
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset)
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                session.headers['Authorization'] = f"Bearer {settings.PAYSTACK_SECRET_KEY}"
+                session.headers['Content-Type'] = 'application/json'
+                adapter = HTTPAdapter(
+                    pool_connections=1, pool_maxsize=settings.PAYSTACK_MAX_CONCURRENT, max_retries=RETRY
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def url(path):
+    return f"{settings.PAYSTACK_BASE_URL}/{path.lstrip('/')}"
+
+
+def breaker():
+    return circuit.breaker('paystack', settings.PAYSTACK_MAX_CONCURRENT)
+
+
+def get(path, **kwargs):
+    kwargs.setdefault('timeout', TIMEOUT)
+    return breaker().call(get_session().get, url(path), **kwargs)
+
+
+def post(path, **kwargs):
+    kwargs.setdefault('timeout', TIMEOUT)
+    return breaker().call(get_session().post, url(path), **kwargs)
+
+
+def _new_async_client():
+    limits = httpx.Limits(max_connections=settings.PAYSTACK_MAX_CONCURRENT)
+    return httpx.AsyncClient(
+        headers={'Authorization': f"Bearer {settings.PAYSTACK_SECRET_KEY}", 'Content-Type': 'application/json'},
+        timeout=httpx.Timeout(settings.PAYSTACK_READ_TIMEOUT, connect=settings.PAYSTACK_CONNECT_TIMEOUT),
+        transport=httpx.AsyncHTTPTransport(retries=RETRY.connect, limits=limits),
+    )
+
+
+def get_async_client():
+    return aio.client('paystack', _new_async_client)
+
+
+async def aget(path, **kwargs):
+    return await breaker().acall(get_async_client().get, url(path), **kwargs)
+
+
+async def apost(path, **kwargs):
+    return await breaker().acall(get_async_client().post, url(path), **kwargs)
@@ -0,0 +1,179 @@
+"""
+Cached, coalesced account-name lookups against Paystack's ``/bank/resolve``.
+
+``aresolve(account_number, bank_code)`` returns Paystack's reply for a
+resolved account, or raises ``AccountNotResolved`` when Paystack could not
+resolve it. Replies are kept in Django's cache:
+
+- resolved accounts for ``PAYSTACK_RESOLVE_TTL`` seconds;
+- accounts Paystack rejected (a 4xx reply, such as an invalid account
+  number) for ``PAYSTACK_RESOLVE_NEGATIVE_TTL`` seconds, so a form that is
+  re-submitted does not ask again straight away.
+
+Anything else (timeouts, 5xx and 429 replies, an open circuit) is raised to
+the caller and never cached.
+
+Identical lookups that arrive while one is in flight wait for it instead of
+calling Paystack themselves. The in-flight lookups are shared by every thread
+and event loop in the process, so a double-click that lands on two threads
+still makes one outbound call.
+
+``aresolve_many`` resolves a list of accounts concurrently, under both a cap
+on lookups in flight and a rate limit on lookups started, for batch
+verification.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import paystack
+
+RESOLVE_PATH = 'bank/resolve'
+
+_lock = threading.Lock()
+# cache key -> Future of the lookup in flight
+_inflight = {}
+
+
+def _reset():
+    global _lock, _inflight
+    _lock = threading.Lock()
+    _inflight = {}
+
+
+# Lookups in flight in the parent are not ours to wait on
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset)
+
+
+class AccountNotResolved(Exception):
+    """Raised when Paystack answers that it cannot resolve an account."""
+
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+def _key(account_number, bank_code):
+    return f'bank_resolve:{bank_code}:{account_number}'
+
+
+def _outcome(outcome):
+    if outcome[0] == 'resolved':
+        return outcome[1]
+    raise AccountNotResolved(outcome[1], outcome[2])
+
+
+async def _fetch(key, account_number, bank_code):
+    response = await paystack.aget(
+        RESOLVE_PATH, params={'account_number': account_number, 'bank_code': bank_code}
+    )
+    try:
+        result = response.json() if response.content else {}
+    except ValueError:
+        result = {}
+    if not isinstance(result, dict):
+        result = {}
+
+    if response.status_code == 200 and result.get('status') and 'data' in result:
+        outcome = ('resolved', result)
+        await cache.aset(key, outcome, settings.PAYSTACK_RESOLVE_TTL)
+        return outcome
+
+    message = result.get('message', 'Bank verification failed')
+    if response.status_code == 200 or (400 <= response.status_code < 500 and response.status_code != 429):
+        # Answered, but without an account
+        outcome = ('failed', 400 if response.status_code == 200 else response.status_code, message)
+        await cache.aset(key, outcome, settings.PAYSTACK_RESOLVE_NEGATIVE_TTL)
+        return outcome
+
+    # Paystack is failing or throttling us; report it, uncached
+    response.raise_for_status()
+    raise AccountNotResolved(response.status_code, message)
+
+
+async def aresolve(account_number, bank_code):
+    """
+    Resolve ``account_number`` at ``bank_code``. Returns Paystack's reply
+    (``{'status': True, 'data': {'account_name': ..., ...}}``).
+
+    Raises ``AccountNotResolved`` if Paystack cannot resolve the account, and
+    ``httpx`` errors or ``ProviderUnavailable`` if it could not be asked.
+    """
+    key = _key(account_number, bank_code)
+    while True:
+        cached = await cache.aget(key)
+        if cached is not None:
+            return _outcome(cached)
+
+        with _lock:
+            future = _inflight.get(key)
+            owner = future is None
+            if owner:
+                future = _inflight[key] = Future()
+
+        if not owner:
+            try:
+                return _outcome(await asyncio.wrap_future(future))
+            except asyncio.CancelledError:
+                if future.cancelled():
+                    # The caller that was asking gave up; ask again
+                    continue
+                raise
+
+        try:
+            outcome = await _fetch(key, account_number, bank_code)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(outcome)
+        finally:
+            with _lock:
+                _inflight.pop(key, None)
+            if not future.done():
+                future.cancel()
+        return _outcome(outcome)
+
+
+async def aresolve_many(accounts, concurrency=None, rate=None):
+    """
+    Resolve several ``(account_number, bank_code)`` pairs. At most
+    ``concurrency`` lookups (default ``PAYSTACK_RESOLVE_CONCURRENCY``) are in
+    flight, and at most ``rate`` per second (default ``PAYSTACK_RESOLVE_RATE``)
+    are started; cached accounts count against neither.
+
+    Returns a list with, for each pair, Paystack's reply or the exception its
+    lookup raised.
+    """
+    concurrency = concurrency or settings.PAYSTACK_RESOLVE_CONCURRENCY
+    interval = 1 / (rate or settings.PAYSTACK_RESOLVE_RATE)
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    next_start = loop.time()
+
+    cached = await cache.aget_many([_key(*account) for account in accounts])
+
+    async def resolve_one(account_number, bank_code):
+        nonlocal next_start
+        try:
+            outcome = cached.get(_key(account_number, bank_code))
+            if outcome is not None:
+                return _outcome(outcome)
+            async with semaphore:
+                # Lookups start at least ``interval`` apart
+                now = loop.time()
+                start = max(now, next_start)
+                next_start = start + interval
+                if start > now:
+                    await asyncio.sleep(start - now)
+                return await aresolve(account_number, bank_code)
+        except Exception as e:
+            return e
+
+    return await asyncio.gather(*(resolve_one(*account) for account in accounts))
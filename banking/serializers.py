@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.conf import settings
+from django.db import models
 from .models import Bank, BankAccountVerification, VirtualAccountRequest
+from . import directory
 
 class BankSerializer(serializers.ModelSerializer):
     class Meta:
@@ -25,11 +27,36 @@ class PaystackBankSerializer(serializers.Serializer):
     created_at = serializers.DateTimeField(required=False, allow_null=True)
     updated_at = serializers.DateTimeField(required=False, allow_null=True)
 
-class BankAccountVerificationSerializer(serializers.ModelSerializer):
+class BankNamesListSerializer(serializers.ListSerializer):
+    """
+    Names the banks of every item on the page with one bank directory lookup.
+    """
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.child.bank_names = directory.current().resolve_many({item.bank_code for item in items})
+        return super().to_representation(items)
+
+class BankNameMixin:
+    """
+    ``get_bank_name`` for a ``bank_name`` method field, read from the bank
+    directory by ``bank_code``.
+    """
+    bank_names = None
+
+    def get_bank_name(self, obj):
+        names = self.bank_names
+        if names is None:
+            names = directory.current().resolve_many([obj.bank_code])
+        return names.get(obj.bank_code, f"Bank ({obj.bank_code})")
+
+class BankAccountVerificationSerializer(BankNameMixin, serializers.ModelSerializer):
+    bank_name = serializers.SerializerMethodField()
+
     class Meta:
         model = BankAccountVerification
+        list_serializer_class = BankNamesListSerializer
         fields = [
-            'id', 'account_number', 'bank_code', 'account_name', 'status',
+            'id', 'account_number', 'bank_code', 'bank_name', 'account_name', 'status',
             'verification_reference', 'created_at', 'updated_at'
         ]
         read_only_fields = ['account_name', 'status', 'verification_reference', 'created_at', 'updated_at']
@@ -55,12 +82,13 @@ class WebhookSerializer(serializers.Serializer):
     data = serializers.JSONField()
     signature = serializers.CharField(max_length=255, required=False)
 
-class BankAccountSerializer(serializers.ModelSerializer):
-    bank_name = serializers.CharField(source='bank.name', read_only=True)
+class BankAccountSerializer(BankNameMixin, serializers.ModelSerializer):
+    bank_name = serializers.SerializerMethodField()
     bank_code = serializers.CharField(write_only=True)
     
     class Meta:
         model = BankAccountVerification
+        list_serializer_class = BankNamesListSerializer
         fields = [
             'id', 'account_number', 'bank_code', 'bank_name', 
             'account_name', 'status', 'created_at', 'updated_at'
@@ -1,3 +1,298 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import hmac
+import json
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from transactions.models import LedgerEntry, Transaction, TransactionReference
+from users.models import BankAccount, VirtualAccount
+
+from spacevest import aio
+
+from . import directory, resolve, webhooks
+from .models import Bank, BankAccountVerification, WebhookEvent
+
+User = get_user_model()
+
+
+def bank(code, name, **fields):
+    return {'code': code, 'name': name, 'active': True, **fields}
+
+
+class BankDirectorySyncTests(TestCase):
+    def setUp(self):
+        directory._reset()
+        self.addCleanup(directory._reset)
+        directory.store([bank('001', 'First'), bank('002', 'Second'), bank('003', 'Third')])
+
+    def test_only_changed_banks_are_written(self):
+        unchanged_at = Bank.objects.get(code='001').updated_at
+        counts = directory.store([
+            bank('001', 'First'), bank('002', 'Second Renamed'), bank('004', 'Fourth'), bank('004', 'Fourth'),
+        ])
+
+        self.assertEqual(counts, {'created': 1, 'updated': 1, 'deactivated': 1, 'unchanged': 1})
+        self.assertEqual(
+            list(Bank.objects.order_by('code').values_list('code', 'name', 'is_active')),
+            [('001', 'First', True), ('002', 'Second Renamed', True), ('003', 'Third', False),
+             ('004', 'Fourth', True)],
+        )
+        self.assertEqual(Bank.objects.get(code='001').updated_at, unchanged_at)
+        # Closed banks keep their names for existing accounts
+        self.assertEqual(directory.current().resolve_many(['002', '003', '999']),
+                         {'002': 'Second Renamed', '003': 'Third'})
+
+    def test_empty_bank_list_is_rejected(self):
+        reply = mock.Mock(status_code=200)
+        reply.json.return_value = {'status': True, 'data': []}
+        with mock.patch('banking.paystack.get', return_value=reply), self.assertRaises(directory.DirectoryError):
+            directory.refresh()
+        self.assertEqual(Bank.objects.filter(is_active=True).count(), 3)
+
+
+def paystack_reply(status_code, body):
+    return httpx.Response(status_code, json=body, request=httpx.Request('GET', 'https://paystack.test/bank/resolve'))
+
+
+class ResolveAccountTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def lookups(self, *replies):
+        async def answer(*args, **kwargs):
+            # Long enough for concurrent callers to find the lookup in flight
+            await asyncio.sleep(0.05)
+            return next(replies_left)
+
+        replies_left = iter(replies)
+        return mock.patch('banking.paystack.aget', side_effect=answer)
+
+    async def test_concurrent_lookups_are_coalesced_and_cached(self):
+        reply = {'status': True, 'data': {'account_name': 'Ada Obi', 'account_number': '0123456789'}}
+        with self.lookups(paystack_reply(200, reply)) as aget:
+            results = await asyncio.gather(*(resolve.aresolve('0123456789', '058') for _ in range(5)))
+            self.assertEqual(await resolve.aresolve('0123456789', '058'), reply)
+        self.assertEqual(results, [reply] * 5)
+        self.assertEqual(aget.call_count, 1)
+
+    async def test_rejected_account_is_remembered(self):
+        with self.lookups(paystack_reply(422, {'status': False, 'message': 'Could not resolve account name'})) as aget:
+            for _ in range(2):
+                with self.assertRaises(resolve.AccountNotResolved) as raised:
+                    await resolve.aresolve('0000000000', '058')
+                self.assertEqual((raised.exception.status_code, raised.exception.message),
+                                 (422, 'Could not resolve account name'))
+        self.assertEqual(aget.call_count, 1)
+
+    async def test_provider_errors_are_not_cached(self):
+        reply = {'status': True, 'data': {'account_name': 'Ada Obi'}}
+        with self.lookups(paystack_reply(502, {'status': False}), paystack_reply(200, reply)) as aget:
+            with self.assertRaises(httpx.HTTPStatusError):
+                await resolve.aresolve('0123456789', '058')
+            self.assertEqual(await resolve.aresolve('0123456789', '058'), reply)
+        self.assertEqual(aget.call_count, 2)
+
+
+class VerifyBankAccountTests(TransactionTestCase):
+    def test_already_verified_with_cold_bank_directory(self):
+        user = User.objects.create_user(username='verifier', email='verifier@example.com', password='pass')
+        # The view always checks bank 001 for now
+        BankAccountVerification.objects.create(
+            user=user, account_number='0123456789', bank_code='001', account_name='A Verifier', status='verified'
+        )
+        directory._reset()
+        self.client.force_login(user)
+        response = self.client.post(
+            '/api/banking/verify-account/',
+            {'account_number': '0123456789', 'bank_code': '058'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['data']['account_name'], 'A Verifier')
+
+    def test_anonymous_request_is_rejected(self):
+        with mock.patch('banking.paystack.aget') as aget:
+            response = self.client.post(
+                '/api/banking/verify-account/',
+                {'account_number': '0123456789', 'bank_code': '058'},
+                content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 403)
+        aget.assert_not_called()
+
+    def test_client_is_closed_after_a_wsgi_request(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        user = User.objects.create_user(username='verifier', email='verifier@example.com', password='pass')
+        reply = {'status': True, 'data': {'account_name': 'A Verifier', 'account_number': '0123456789'}}
+        clients = []
+
+        def new_client():
+            clients.append(httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, json=reply))))
+            return clients[-1]
+
+        self.client.force_login(user)
+        with mock.patch('banking.paystack._new_async_client', side_effect=new_client):
+            response = self.client.post(
+                '/api/banking/verify-account/',
+                {'account_number': '0123456789', 'bank_code': '058'},
+                content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['account_name'], 'A Verifier')
+        self.assertEqual(len(clients), 1)
+        self.assertTrue(clients[0].is_closed)
+        self.assertEqual(len(aio._clients), 0)
+
+
+class VerifyBankAccountsTests(TransactionTestCase):
+    url = '/api/banking/verify-accounts/'
+
+    def setUp(self):
+        directory._reset()
+        self.addCleanup(directory._reset)
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(username='payer', email='payer@example.com', password='pass')
+        self.client.force_login(self.user)
+
+    def post(self, accounts):
+        return self.client.post(self.url, {'accounts': accounts}, content_type='application/json')
+
+    def test_batch_with_mixed_outcomes(self):
+        directory.store([bank('058', 'GTBank')])
+        BankAccountVerification.objects.create(
+            user=self.user, account_number='1111111111', bank_code='058', account_name='Known Payee', status='verified'
+        )
+        replies = {
+            '2222222222': paystack_reply(200, {'status': True, 'data': {'account_name': 'New Payee'}}),
+            '3333333333': paystack_reply(422, {'status': False, 'message': 'Could not resolve account name'}),
+            '4444444444': paystack_reply(500, {'status': False}),
+        }
+
+        async def answer(path, params):
+            return replies[params['account_number']]
+
+        accounts = [
+            {'account_number': number, 'bank_code': '058'}
+            for number in ('1111111111', '2222222222', '3333333333', '4444444444', '2222222222')
+        ]
+        with mock.patch('banking.paystack.aget', side_effect=answer) as aget:
+            response = self.post(accounts)
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['summary'], {'verified': 2, 'failed': 1, 'error': 1})
+        self.assertEqual(
+            [(item['account_number'], item['status']) for item in body['results']],
+            [('1111111111', 'verified'), ('2222222222', 'verified'), ('3333333333', 'failed'), ('4444444444', 'error')],
+        )
+        self.assertTrue(body['results'][0]['already_verified'])
+        self.assertEqual(body['results'][2]['message'], 'Could not resolve account name')
+        # Neither the verified account nor the duplicate is looked up
+        self.assertEqual(aget.call_count, 3)
+
+        self.assertEqual(
+            dict(BankAccountVerification.objects.filter(user=self.user).values_list('account_number', 'status')),
+            {'1111111111': 'verified', '2222222222': 'verified', '3333333333': 'failed'},
+        )
+        account = BankAccount.objects.get(user=self.user)
+        self.assertEqual((account.account_number, account.account_name, account.bank_name),
+                         ('2222222222', 'New Payee', 'GTBank'))
+        self.assertTrue(account.is_verified and account.is_primary)
+
+    def test_invalid_accounts_are_rejected(self):
+        with mock.patch('banking.paystack.aget') as aget:
+            self.assertEqual(self.post([]).status_code, 400)
+            self.assertEqual(self.post([{'account_number': '2222222222'}]).status_code, 400)
+        aget.assert_not_called()
+        self.assertFalse(BankAccountVerification.objects.exists())
+
+
+def sign(body, key='test-secret'):
+    return hmac.new(key.encode(), body, hashlib.sha512).hexdigest()
+
+
+@override_settings(PAYSTACK_SECRET_KEY='test-secret')
+class PaystackWebhookTests(TestCase):
+    url = '/api/banking/webhooks/paystack/'
+
+    def post(self, body, signature):
+        return self.client.post(self.url, body, content_type='application/json',
+                                HTTP_X_PAYSTACK_SIGNATURE=signature)
+
+    def test_replayed_event_is_stored_once(self):
+        body = json.dumps({'event': 'transfer.success', 'data': {'id': 7, 'reference': 'ref-7'}}).encode()
+        self.assertEqual(self.post(body, sign(body)).status_code, 200)
+        self.assertEqual(self.post(body, sign(body)).status_code, 200)
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+        self.assertEqual(WebhookEvent.objects.get().event_id, 'transfer.success:7')
+
+    def test_bad_signature_is_rejected(self):
+        body = json.dumps({'event': 'transfer.success', 'data': {'id': 8}}).encode()
+        self.assertEqual(self.post(body, sign(body, key='wrong')).status_code, 401)
+        self.assertEqual(self.post(body, '').status_code, 401)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_failed_handler_is_retried_later(self):
+        body = json.dumps({'event': 'test.failing', 'data': {'id': 9}}).encode()
+        webhooks.ingest(body, sign(body))
+
+        @webhooks.handler('test.failing')
+        def fail(events):
+            raise RuntimeError('boom')
+
+        self.addCleanup(webhooks._handlers.pop, 'test.failing')
+        with self.assertLogs('banking.webhooks', 'ERROR'):
+            self.assertEqual(webhooks.process_pending(), {'processed': 0, 'failed': 1})
+        event = WebhookEvent.objects.get()
+        self.assertFalse(event.processed)
+        self.assertEqual((event.attempts, event.last_error), (1, 'boom'))
+
+        webhooks._handlers['test.failing'] = lambda events: None
+        self.assertEqual(webhooks.process_pending(), {'processed': 1, 'failed': 0})
+        event.refresh_from_db()
+        self.assertTrue(event.processed)
+
+
+@override_settings(PAYSTACK_SECRET_KEY='test-secret')
+class DepositTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='depositor', email='depositor@example.com', password='pass')
+        VirtualAccount.objects.create(
+            user=self.user, bank_name='Test Bank', account_number='9900000001', account_name='A Depositor'
+        )
+
+    def deliver(self, event_id, reference, kobo=250000):
+        body = json.dumps({'event': 'charge.success', 'data': {
+            'id': event_id, 'status': 'success', 'reference': reference, 'amount': kobo,
+            'authorization': {'receiver_bank_account_number': '9900000001'},
+        }}).encode()
+        webhooks.ingest(body, sign(body))
+        return webhooks.process_pending()
+
+    def test_replayed_reference_is_credited_once(self):
+        self.assertEqual(self.deliver(1, 'dep-1'), {'processed': 1, 'failed': 0})
+        # Paystack can resend a charge under a new event id
+        self.assertEqual(self.deliver(2, 'dep-1'), {'processed': 1, 'failed': 0})
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.wallet_balance, Decimal('2500.00'))
+        self.assertEqual(Transaction.objects.filter(reference='dep-1').count(), 1)
+        self.assertEqual(LedgerEntry.objects.filter(user=self.user, account='wallet').count(), 1)
+
+    def test_archived_reference_is_not_credited_again(self):
+        # Archived transactions keep their reference in TransactionReference
+        TransactionReference.objects.create(reference='dep-old')
+        self.assertEqual(self.deliver(3, 'dep-old'), {'processed': 1, 'failed': 0})
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.wallet_balance, Decimal('0'))
+        self.assertFalse(Transaction.objects.filter(reference='dep-old').exists())
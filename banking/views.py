@@ -4,106 +4,68 @@ from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet
-import requests
-from decouple import config
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.db import transaction as db_transaction
-from django.core.cache import cache
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from .models import Bank, BankAccountVerification, VirtualAccountProvider, VirtualAccountRequest
 from .serializers import (
     BankSerializer, BankAccountVerificationSerializer, VirtualAccountRequestSerializer,
     VerifyAccountSerializer, CreateVirtualAccountSerializer, PaystackBankSerializer, BankAccountSerializer
 )
 from users.models import BankAccount
+from spacevest import aio
+from spacevest.circuit import ProviderUnavailable
+from . import directory, paystack, resolve, webhooks
 
-PAYSTACK_SECRET_KEY = config('PAYSTACK_SECRET_KEY')
-PAYSTACK_BASE_URL = 'https://api.paystack.co'
+def _local_banks():
+    return BankSerializer(Bank.objects.filter(is_active=True).order_by('name'), many=True).data
 
-class BankListView(APIView):
-    permission_classes = [AllowAny]
-    
-    def get(self, request):
-        use_cache = request.query_params.get('cache', 'true').lower() == 'true'
-        
-        # Try to get banks from cache if enabled
-        if use_cache:
-            cached_banks = cache.get('paystack_banks_list')
-            if cached_banks:
-                return Response(cached_banks)
-        
+
+class BankListView(View):
+    """
+    The bank directory, served from the local Bank table that ``sync_banks``
+    keeps in step with Paystack. Paystack is only called (once, for the whole
+    list) while the table is still empty.
+    """
+
+    async def get(self, request):
         try:
-            # Fetch from Paystack
-            headers = {
-                'Authorization': f'Bearer {PAYSTACK_SECRET_KEY}',
-                'Content-Type': 'application/json'
-            }
-            
-            response = requests.get(
-                f"{PAYSTACK_BASE_URL}/bank",
-                params={'country': 'Nigeria'},
-                headers=headers,
-                timeout=10  # 10 seconds timeout
-            )
-            
-            if response.status_code == 200:
-                response_data = response.json()
-                if not response_data.get('status'):
-                    raise Exception(response_data.get('message', 'Invalid response from Paystack'))
-                
-                paystack_banks = response_data.get('data', [])
-                
-                # Cache the raw result for 24 hours
-                cache.set('paystack_banks_list', paystack_banks, 60 * 60 * 24)
-                
-                # Update local database for reference
-                for bank_data in paystack_banks:
-                    # Ensure required fields have defaults
-                    bank_data.setdefault('country', 'Nigeria')
-                    bank_data.setdefault('currency', 'NGN')
-                    bank_data.setdefault('type', 'nuban')
-                    bank_data.setdefault('active', True)
-                    Bank.objects.update_or_create(
-                        code=bank_data['code'],
-                        defaults={
-                            'name': bank_data['name'],
-                            'country': bank_data.get('country', 'Nigeria'),
-                            'currency': bank_data.get('currency', 'NGN'),
-                            'type': bank_data.get('type', 'nuban'),
-                            'is_active': bank_data.get('active', True)
-                        }
-                    )
-                
-                return Response({
-                    'status': True,
-                    'message': 'Banks retrieved successfully',
-                    'data': paystack_banks
-                })
-            
-            error_message = f'Paystack API error: {response.status_code} - {response.text}'
-            return Response(
-                {'status': False, 'message': error_message},
-                status=status.HTTP_502_BAD_GATEWAY
-            )
-                
-        except requests.Timeout:
+            return await self._get(request)
+        finally:
+            await aio.release(request)
+
+    async def _get(self, request):
+        banks = await sync_to_async(_local_banks)()
+        if banks:
+            return aio.Response({
+                'status': True,
+                'message': 'Banks retrieved successfully',
+                'data': banks
+            })
+
+        try:
+            await directory.arefresh()
+            return aio.Response({
+                'status': True,
+                'message': 'Banks retrieved successfully',
+                'data': await sync_to_async(_local_banks)()
+            })
+        except ProviderUnavailable:
+            error_message = 'Paystack is temporarily unavailable'
+        except httpx.TimeoutException:
             error_message = 'Request to Paystack API timed out'
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             error_message = f'Error connecting to Paystack: {str(e)}'
         except Exception as e:
             error_message = f'Error processing bank list: {str(e)}'
-        
-        # Fallback to local database if Paystack is down or error occurred
-        local_banks = Bank.objects.filter(is_active=True).order_by('name')
-        if local_banks.exists():
-            serializer = BankSerializer(local_banks, many=True)
-            return Response({
-                'status': True,
-                'message': 'Using cached bank data',
-                'data': serializer.data,
-                'cached': True
-            })
-        
-        return Response(
+
+        return aio.Response(
             {'status': False, 'message': error_message},
             status=status.HTTP_503_SERVICE_UNAVAILABLE
         )
@@ -115,9 +77,85 @@ class BankAccountVerificationListView(generics.ListAPIView):
     def get_queryset(self):
         return BankAccountVerification.objects.filter(user=self.request.user)
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def verify_bank_account(request):
+def _existing_verification(user, account_number, bank_code):
+    # Check for any existing verification (regardless of status). No lock is
+    # held across the Paystack call, so the recorders below read it again.
+    return BankAccountVerification.objects.filter(
+        user=user,
+        account_number=account_number,
+        bank_code=bank_code
+    ).first()
+
+
+def _record_verification(user, account_number, bank_code, result):
+    # Get bank name for the account
+    bank_name = get_bank_name(bank_code)
+    if not bank_name:
+        bank_name = f"Bank ({bank_code})"
+    
+    with db_transaction.atomic():
+        # Update existing verification or create a new one
+        verification_data = {
+            'account_name': result['data']['account_name'],
+            'status': 'verified',
+            'verification_reference': result['data'].get('reference'),
+            'metadata': result
+        }
+        
+        verification, _ = BankAccountVerification.objects.update_or_create(
+            user=user,
+            account_number=account_number,
+            bank_code=bank_code,
+            defaults=verification_data
+        )
+        
+        # Create or update bank account
+        bank_account, created = BankAccount.objects.update_or_create(
+            user=user,
+            account_number=account_number,
+            bank_code=bank_code,
+            defaults={
+                'account_name': result['data']['account_name'],
+                'bank_name': bank_name,
+                'is_primary': not BankAccount.objects.filter(
+                    user=user, 
+                    is_primary=True
+                ).exists()
+            }
+        )
+    return BankAccountVerificationSerializer(verification).data
+
+
+def _record_failure(user, account_number, bank_code, error_message):
+    # Log failed attempt - update existing or create new
+    verification_data = {
+        'status': 'failed',
+        'metadata': {'error': error_message}
+    }
+    
+    with db_transaction.atomic():
+        existing_verification = BankAccountVerification.objects.filter(
+            user=user,
+            account_number=account_number,
+            bank_code=bank_code
+        ).select_for_update().first()
+        if existing_verification is None:
+            # Create new failed verification
+            BankAccountVerification.objects.create(
+                user=user,
+                account_number=account_number,
+                bank_code=bank_code,
+                **verification_data
+            )
+        elif existing_verification.status != 'verified':
+            # Update existing verification, unless another request verified it meanwhile
+            for key, value in verification_data.items():
+                setattr(existing_verification, key, value)
+            existing_verification.save()
+
+
+@aio.api_view(['POST'])
+async def verify_bank_account(request):
     """
     Verify a bank account using Paystack's API.
     
@@ -133,7 +171,7 @@ def verify_bank_account(request):
     """
     serializer = VerifyAccountSerializer(data=request.data)
     if not serializer.is_valid():
-        return Response(
+        return aio.Response(
             {'status': False, 'message': 'Validation error', 'errors': serializer.errors},
             status=status.HTTP_400_BAD_REQUEST
         )
@@ -144,143 +182,236 @@ def verify_bank_account(request):
     bank_code = '001'
     
     try:
-        with db_transaction.atomic():
-            # Check for any existing verification (regardless of status)
-            existing_verification = BankAccountVerification.objects.filter(
-                user=request.user,
-                account_number=account_number,
-                bank_code=bank_code
-            ).select_for_update().first()
-            
-            if existing_verification and existing_verification.status == 'verified':
-                return Response(
-                    {
-                        'status': True,
-                        'message': 'Account already verified',
-                        'data': BankAccountVerificationSerializer(existing_verification).data
-                    },
-                    status=status.HTTP_409_CONFLICT
-                )
-            # If pending or failed, we'll update the existing record instead of creating a new one
-        
-        # Call Paystack API for verification
-        headers = {
-            'Authorization': f'Bearer {PAYSTACK_SECRET_KEY}',
-            'Content-Type': 'application/json'
-        }
-        
-        try:
-            response = requests.get(
-                f"{PAYSTACK_BASE_URL}/bank/resolve",
-                params={
-                    'account_number': account_number,
-                    'bank_code': bank_code
+        existing_verification = await sync_to_async(_existing_verification)(
+            request.user, account_number, bank_code
+        )
+        if existing_verification and existing_verification.status == 'verified':
+            # Serializing may load the bank directory from the database
+            data = await sync_to_async(lambda: BankAccountVerificationSerializer(existing_verification).data)()
+            return aio.Response(
+                {
+                    'status': True,
+                    'message': 'Account already verified',
+                    'data': data
                 },
-                headers=headers,
-                timeout=10  # 10 seconds timeout
+                status=status.HTTP_409_CONFLICT
             )
+        # If pending or failed, we'll update the existing record instead of creating a new one
+        
+        # Resolve the account with Paystack (cached, and shared with identical lookups in flight)
+        try:
+            result = await resolve.aresolve(account_number, bank_code)
             
-            response.raise_for_status()
-            result = response.json()
-            
-            if not result.get('status') or 'data' not in result:
-                raise Exception(result.get('message', 'Invalid response from Paystack'))
-            
-            # Get bank name for the account
-            bank_name = get_bank_name(bank_code)
-            if not bank_name:
-                bank_name = f"Bank ({bank_code})"
-            
-            with db_transaction.atomic():
-                # Update existing verification or create a new one
-                verification_data = {
-                    'account_name': result['data']['account_name'],
-                    'status': 'verified',
-                    'verification_reference': result['data'].get('reference'),
-                    'metadata': result
-                }
-                
-                if existing_verification:
-                    # Update existing verification
-                    for key, value in verification_data.items():
-                        setattr(existing_verification, key, value)
-                    existing_verification.save()
-                    verification = existing_verification
-                else:
-                    # Create new verification
-                    verification = BankAccountVerification.objects.create(
-                        user=request.user,
-                        account_number=account_number,
-                        bank_code=bank_code,
-                        **verification_data
-                    )
-                
-                # Create or update bank account
-                bank_account, created = BankAccount.objects.update_or_create(
-                    user=request.user,
-                    account_number=account_number,
-                    bank_code=bank_code,
-                    defaults={
-                        'account_name': result['data']['account_name'],
-                        'bank_name': bank_name,
-                        'is_primary': not BankAccount.objects.filter(
-                            user=request.user, 
-                            is_primary=True
-                        ).exists()
-                    }
-                )
+            verification = await sync_to_async(_record_verification)(
+                request.user, account_number, bank_code, result
+            )
             
-            return Response({
+            return aio.Response({
                 'status': True,
                 'message': 'Account verified successfully',
-                'data': BankAccountVerificationSerializer(verification).data
+                'data': verification
             })
             
-        except requests.Timeout:
+        except ProviderUnavailable:
+            # Paystack is failing; don't record this as a failed verification
+            return aio.Response(
+                {'status': False, 'message': 'Bank verification is temporarily unavailable, please try again shortly'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        except resolve.AccountNotResolved as e:
+            error_message = e.message
+            status_code = e.status_code
+        except httpx.TimeoutException:
             error_message = 'Bank verification request timed out'
             status_code = status.HTTP_504_GATEWAY_TIMEOUT
-        except requests.HTTPError as e:
-            error_data = e.response.json() if e.response.content else {}
+        except httpx.HTTPStatusError as e:
+            try:
+                error_data = e.response.json() if e.response.content else {}
+            except ValueError:
+                error_data = {}
             error_message = error_data.get('message', 'Bank verification failed')
             status_code = e.response.status_code
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             error_message = f'Error connecting to Paystack: {str(e)}'
             status_code = status.HTTP_502_BAD_GATEWAY
         except Exception as e:
             error_message = f'Error verifying account: {str(e)}'
             status_code = status.HTTP_400_BAD_REQUEST
         
-        # Log failed attempt - update existing or create new
-        verification_data = {
-            'status': 'failed',
-            'metadata': {'error': error_message}
-        }
-        
-        if existing_verification:
-            # Update existing verification
-            for key, value in verification_data.items():
-                setattr(existing_verification, key, value)
-            existing_verification.save()
-        else:
-            # Create new failed verification
-            BankAccountVerification.objects.create(
-                user=request.user,
-                account_number=account_number,
-                bank_code=bank_code,
-                **verification_data
-            )
+        await sync_to_async(_record_failure)(
+            request.user, account_number, bank_code, error_message
+        )
         
-        return Response(
+        return aio.Response(
             {'status': False, 'message': error_message},
             status=status_code
         )
         
     except Exception as e:
-        return Response(
+        return aio.Response(
             {'status': False, 'message': f'An unexpected error occurred: {str(e)}'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+def _lookup_error(error):
+    if isinstance(error, ProviderUnavailable):
+        return 'Bank verification is temporarily unavailable, please try again shortly'
+    if isinstance(error, httpx.TimeoutException):
+        return 'Bank verification request timed out'
+    if isinstance(error, httpx.HTTPStatusError):
+        return f'Paystack API error: {error.response.status_code}'
+    if isinstance(error, httpx.HTTPError):
+        return f'Error connecting to Paystack: {str(error)}'
+    return f'Error verifying account: {str(error)}'
+
+
+def _verified_accounts(user, accounts):
+    return set(
+        BankAccountVerification.objects.filter(
+            user=user,
+            status='verified',
+            account_number__in={account_number for account_number, _ in accounts},
+        ).values_list('account_number', 'bank_code')
+    )
+
+
+def _record_batch(user, outcomes):
+    """
+    Upsert the verifications and bank accounts for ``outcomes``, a list of
+    ``(account_number, bank_code, reply or AccountNotResolved)``, in bulk.
+    """
+    names = directory.current().resolve_many({bank_code for _, bank_code, _ in outcomes})
+    now = timezone.now()
+    verifications = []
+    accounts = {}
+    for account_number, bank_code, outcome in outcomes:
+        if isinstance(outcome, resolve.AccountNotResolved):
+            verifications.append(BankAccountVerification(
+                user=user, account_number=account_number, bank_code=bank_code,
+                status='failed', metadata={'error': outcome.message},
+            ))
+            continue
+        verifications.append(BankAccountVerification(
+            user=user, account_number=account_number, bank_code=bank_code,
+            account_name=outcome['data']['account_name'], status='verified',
+            verification_reference=outcome['data'].get('reference'), metadata=outcome,
+        ))
+        accounts[(account_number, bank_code)] = (
+            outcome['data']['account_name'], names.get(bank_code, f"Bank ({bank_code})")
+        )
+
+    with db_transaction.atomic():
+        BankAccountVerification.objects.bulk_create(
+            verifications,
+            update_conflicts=True,
+            unique_fields=['user', 'account_number', 'bank_code'],
+            update_fields=['account_name', 'status', 'verification_reference', 'metadata', 'updated_at'],
+        )
+        if not accounts:
+            return
+        existing = []
+        for bank_account in BankAccount.objects.filter(
+            user=user, account_number__in={account_number for account_number, _ in accounts}
+        ):
+            key = (bank_account.account_number, bank_account.bank_code)
+            if key not in accounts:
+                continue
+            bank_account.account_name, bank_account.bank_name = accounts[key]
+            bank_account.is_verified = True
+            # bulk_update does not touch auto_now fields
+            bank_account.updated_at = now
+            existing.append(bank_account)
+        BankAccount.objects.bulk_update(existing, ['account_name', 'bank_name', 'is_verified', 'updated_at'])
+        known = {(bank_account.account_number, bank_account.bank_code) for bank_account in existing}
+        new_accounts = [(key, value) for key, value in accounts.items() if key not in known]
+        needs_primary = not BankAccount.objects.filter(user=user, is_primary=True).exists()
+        BankAccount.objects.bulk_create([
+            BankAccount(
+                user=user, account_number=account_number, bank_code=bank_code,
+                account_name=account_name, bank_name=bank_name, is_verified=True,
+                is_primary=needs_primary and i == 0,
+            )
+            for i, ((account_number, bank_code), (account_name, bank_name)) in enumerate(new_accounts)
+        ])
+
+
+@aio.api_view(['POST'])
+async def verify_bank_accounts(request):
+    """
+    Verify a list of bank accounts at once, e.g. a payee list.
+    
+    Request body should contain:
+    - accounts: a list of {account_number, bank_code}
+    
+    Accounts are resolved with Paystack concurrently, under the
+    PAYSTACK_RESOLVE_CONCURRENCY and PAYSTACK_RESOLVE_RATE limits, and their
+    verifications and bank accounts are written in bulk. Accounts already
+    verified are not looked up again.
+    
+    Returns:
+    - 200: a result per account, with status verified, failed (Paystack
+      could not resolve it) or error (Paystack could not be asked; retry)
+    - 400: Invalid input
+    """
+    accounts = request.data.get('accounts') if isinstance(request.data, dict) else None
+    if not isinstance(accounts, list) or not accounts:
+        return aio.Response(
+            {'status': False, 'message': 'accounts must be a non-empty list'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(accounts) > settings.PAYSTACK_BATCH_VERIFY_MAX:
+        return aio.Response(
+            {'status': False, 'message': f'At most {settings.PAYSTACK_BATCH_VERIFY_MAX} accounts can be verified at once'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    serializer = VerifyAccountSerializer(data=accounts, many=True)
+    if not serializer.is_valid():
+        return aio.Response(
+            {'status': False, 'message': 'Validation error', 'errors': serializer.errors},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    # Duplicates are looked up once
+    accounts = list(dict.fromkeys(
+        (item['account_number'].strip(), item['bank_code'].strip()) for item in serializer.validated_data
+    ))
+    verified = await sync_to_async(_verified_accounts)(request.user, accounts)
+    pending = [account for account in accounts if account not in verified]
+    replies = dict(zip(pending, await resolve.aresolve_many(pending)))
+    
+    outcomes = [
+        (account_number, bank_code, reply)
+        for (account_number, bank_code), reply in replies.items()
+        if isinstance(reply, (dict, resolve.AccountNotResolved))
+    ]
+    if outcomes:
+        await sync_to_async(_record_batch)(request.user, outcomes)
+    
+    results = []
+    for account in accounts:
+        account_number, bank_code = account
+        item = {'account_number': account_number, 'bank_code': bank_code}
+        reply = replies.get(account)
+        if account in verified:
+            item.update(status='verified', already_verified=True)
+        elif isinstance(reply, dict):
+            item.update(status='verified', account_name=reply['data']['account_name'])
+        elif isinstance(reply, resolve.AccountNotResolved):
+            item.update(status='failed', message=reply.message)
+        else:
+            item.update(status='error', message=_lookup_error(reply))
+        results.append(item)
+    
+    summary = {'verified': 0, 'failed': 0, 'error': 0}
+    for item in results:
+        summary[item['status']] += 1
+    return aio.Response({
+        'status': True,
+        'message': f"Verified {summary['verified']} of {len(results)} accounts",
+        'summary': summary,
+        'results': results
+    })
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def create_virtual_account(request):
@@ -341,6 +472,21 @@ def get_virtual_account(request):
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@csrf_exempt
+@require_POST
+def paystack_webhook(request):
+    """
+    Paystack's webhook. The event is only verified and stored here; the
+    ``process_webhooks`` command applies it.
+    """
+    if not webhooks.verify_signature(request.body, request.META.get(webhooks.SIGNATURE_HEADER)):
+        return aio.Response({'error': 'Invalid signature'}, status=401)
+    try:
+        webhooks.ingest(request.body, request.META[webhooks.SIGNATURE_HEADER])
+    except ValueError:
+        return aio.Response({'error': 'Invalid JSON payload'}, status=400)
+    return aio.Response({'status': True})
+
 class BankAccountViewSet(mixins.CreateModelMixin,
                        mixins.ListModelMixin,
                        mixins.RetrieveModelMixin,
@@ -389,7 +535,7 @@ class BankAccountViewSet(mixins.CreateModelMixin,
 
 def get_bank_name(bank_code):
     """
-    Get bank name from local database, cache, or Paystack API.
+    Get bank name from the in-process bank directory.
     
     Args:
         bank_code (str): The bank code to look up
@@ -399,89 +545,4 @@ def get_bank_name(bank_code):
     """
     if not bank_code:
         return 'Unknown Bank'
-    
-    # Try to get from cache first
-    cache_key = f'bank_name_{bank_code}'
-    cached_name = cache.get(cache_key)
-    if cached_name:
-        return cached_name
-    
-    # Try to get from local database
-    bank = Bank.objects.filter(code=bank_code, is_active=True).first()
-    if bank:
-        # Cache for 24 hours
-        cache.set(cache_key, bank.name, 60 * 60 * 24)
-        return bank.name
-    
-    # Fallback to hardcoded mapping
-    bank_mapping = {
-        '044': 'Access Bank',
-        '023': 'Citibank',
-        '063': 'Diamond Bank',
-        '050': 'Ecobank',
-        '070': 'Fidelity Bank',
-        '011': 'First Bank',
-        '214': 'First City Monument Bank',
-        '058': 'Guaranty Trust Bank',
-        '030': 'Heritage Bank',
-        '301': 'Jaiz Bank',
-        '082': 'Keystone Bank',
-        '014': 'MainStreet Bank',
-        '076': 'Polaris Bank',
-        '101': 'Providus Bank',
-        '221': 'Stanbic IBTC',
-        '068': 'Standard Chartered',
-        '232': 'Sterling Bank',
-        '100': 'Suntrust Bank',
-        '032': 'Union Bank',
-        '033': 'United Bank for Africa',
-        '215': 'Unity Bank',
-        '035': 'Wema Bank',
-        '057': 'Zenith Bank',
-    }
-    
-    # If found in hardcoded mapping, cache it
-    if bank_code in bank_mapping:
-        cache.set(cache_key, bank_mapping[bank_code], 60 * 60 * 24)
-        return bank_mapping[bank_code]
-    
-    # As a last resort, try to fetch from Paystack
-    try:
-        headers = {
-            'Authorization': f'Bearer {PAYSTACK_SECRET_KEY}',
-            'Content-Type': 'application/json'
-        }
-        
-        response = requests.get(
-            f"{PAYSTACK_BASE_URL}/bank",
-            params={'country': 'Nigeria'},
-            headers=headers,
-            timeout=5
-        )
-        
-        if response.status_code == 200:
-            banks = response.json().get('data', [])
-            for bank_data in banks:
-                if str(bank_data.get('code')) == str(bank_code):
-                    bank_name = bank_data.get('name', 'Unknown Bank')
-                    # Update local database for future use
-                    Bank.objects.update_or_create(
-                        code=bank_code,
-                        defaults={
-                            'name': bank_name,
-                            'country': bank_data.get('country', 'Nigeria'),
-                            'currency': bank_data.get('currency', 'NGN'),
-                            'type': bank_data.get('type', 'nuban'),
-                            'is_active': bank_data.get('active', True)
-                        }
-                    )
-                    # Cache the result
-                    cache.set(cache_key, bank_name, 60 * 60 * 24)
-                    return bank_name
-    except Exception as e:
-        # Log the error but don't fail
-        import logging
-        logger = logging.getLogger(__name__)
-        logger.error(f"Error getting bank name for code {bank_code}: {str(e)}")
-    
-    return 'Unknown Bank'
+    return directory.current().resolve(bank_code, 'Unknown Bank')
@@ -0,0 +1,175 @@
+"""
+Paystack webhook ingestion and batch processing.
+
+The receiving view does no business logic: it checks the signature with
+``verify_signature`` and stores the raw event with ``ingest``, a single
+``INSERT ... ON CONFLICT DO NOTHING`` on ``WebhookEvent.event_id``, so
+redeliveries of an event are dropped by the database.
+
+``process_batch`` (the ``process_webhooks`` command) then claims up to
+``batch_size`` unprocessed events with ``SELECT ... FOR UPDATE SKIP LOCKED``,
+so several processors can run side by side, and hands them to the handler
+registered for their event name, one call per event name per batch. Events
+without a handler are simply marked processed. If a handler fails, its events
+are left unprocessed with the error recorded and retried by a later batch, up
+to ``MAX_ATTEMPTS`` times.
+"""
+import hashlib
+import hmac
+import json
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+PROVIDER = 'paystack'
+SIGNATURE_HEADER = 'HTTP_X_PAYSTACK_SIGNATURE'
+
+MAX_ATTEMPTS = 5
+
+# Paystack event name prefix -> WebhookEvent.event_type
+EVENT_TYPES = {
+    'charge': 'charge',
+    'transfer': 'transfer',
+    'dedicatedaccount': 'virtual_account',
+    'customeridentification': 'verification',
+}
+
+# event name -> function applying a list of its events
+_handlers = {}
+
+
+def handler(*events):
+    """
+    Register the decorated function as the handler of ``events``. It is
+    called with a list of ``WebhookEvent`` inside the batch's transaction.
+    """
+    def register(func):
+        for event in events:
+            _handlers[event] = func
+        return func
+    return register
+
+
+def verify_signature(body, signature):
+    """
+    Whether ``signature`` is Paystack's HMAC-SHA512 of ``body`` under our
+    secret key.
+    """
+    if not signature or not settings.PAYSTACK_SECRET_KEY:
+        return False
+    expected = hmac.new(settings.PAYSTACK_SECRET_KEY.encode(), body, hashlib.sha512).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def event_id(payload, body):
+    """
+    A key identifying the event across redeliveries: its name plus the id
+    (or reference) of the object it is about, or a digest of the body.
+    """
+    data = payload.get('data') if isinstance(payload.get('data'), dict) else {}
+    key = data.get('id') or data.get('reference')
+    if key is None:
+        return f"body:{hashlib.sha256(body).hexdigest()}"
+    return f"{payload.get('event', '')}:{key}"
+
+
+def ingest(body, signature):
+    """
+    Store the verified Paystack event in ``body``, unless it is already
+    stored. Returns its ``event_id``.
+
+    Raises ``ValueError`` if the body is not a JSON object.
+    """
+    payload = json.loads(body)
+    if not isinstance(payload, dict):
+        raise ValueError('Webhook body must be a JSON object')
+    event = str(payload.get('event', ''))[:100]
+    key = event_id(payload, body)
+    WebhookEvent.objects.bulk_create([
+        WebhookEvent(
+            event_type=EVENT_TYPES.get(event.split('.', 1)[0], 'other'),
+            provider=PROVIDER,
+            event=event,
+            event_id=key,
+            payload=payload,
+            signature=signature,
+        )
+    ], ignore_conflicts=True)
+    return key
+
+
+def process_batch(batch_size=100, skip=()):
+    """
+    Claim up to ``batch_size`` unprocessed events (other than the ids in
+    ``skip``) and apply them in one database transaction. Returns
+    ``{'processed': [ids], 'failed': [ids]}``.
+    """
+    now = timezone.now()
+    with db_transaction.atomic():
+        events = list(
+            WebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(processed=False, attempts__lt=MAX_ATTEMPTS)
+            .exclude(pk__in=skip)
+            .order_by('created_at', 'id')[:batch_size]
+        )
+        if not events:
+            return {'processed': [], 'failed': []}
+
+        groups = defaultdict(list)
+        for event in events:
+            groups[event.event].append(event)
+
+        processed = []
+        failed = []
+        for name, group in groups.items():
+            handle = _handlers.get(name)
+            if handle is None:
+                processed.extend(group)
+                continue
+            try:
+                # A failing handler only rolls back its own group
+                with db_transaction.atomic():
+                    handle(group)
+            except Exception as e:
+                logger.exception('Webhook handler for %s failed', name)
+                for event in group:
+                    event.last_error = str(e)[:1000]
+                failed.extend(group)
+            else:
+                processed.extend(group)
+
+        WebhookEvent.objects.filter(pk__in=[event.pk for event in processed]).update(
+            processed=True, processed_at=now
+        )
+        for event in failed:
+            event.attempts = F('attempts') + 1
+        WebhookEvent.objects.bulk_update(failed, ['attempts', 'last_error'])
+    return {'processed': [event.pk for event in processed], 'failed': [event.pk for event in failed]}
+
+
+def process_pending(batch_size=100, max_batches=None):
+    """
+    Process batches until no unprocessed events are left (or ``max_batches``
+    have run). Events that fail are retried by the next run, not this one.
+    Returns ``{'processed': n, 'failed': n}``.
+    """
+    totals = {'processed': 0, 'failed': 0}
+    failed = set()
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        result = process_batch(batch_size, skip=failed)
+        if not result['processed'] and not result['failed']:
+            break
+        batches += 1
+        failed.update(result['failed'])
+        totals['processed'] += len(result['processed'])
+        totals['failed'] += len(result['failed'])
+    return totals
@@ -0,0 +1,324 @@
+"""
+Stand-in HTTP server for the Paystack, Yanga and CoinGecko endpoints we call.
+
+One server answers for all three providers under a path prefix each:
+
+    /paystack   GET  /bank, GET /bank/resolve, POST /dedicated_account
+    /yanga      GET  /bill-payments/billers/<category>,
+                GET  /bill-payments/products/<biller_code>,
+                POST /bill-payments/pay,
+                GET  /bill-payments/status/<request_id>
+    /coingecko  GET  /simple/price
+
+Point the app at it with:
+
+    PAYSTACK_BASE_URL=http://127.0.0.1:8900/paystack
+    YANGA_API_BASE_URL=http://127.0.0.1:8900/yanga
+    COINGECKO_API_URL=http://127.0.0.1:8900/coingecko
+
+Latency, error rate, rate limit and the share of purchases Yanga reports as
+still processing can be set for every provider or one of them, e.g.
+``--latency 50 --latency yanga=400 --error-rate paystack=0.2``.
+
+Run with ``python -m benchmarks.fake_providers``.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+PROVIDERS = ['paystack', 'yanga', 'coingecko']
+
+BANKS = [
+    {'name': 'Access Bank', 'code': '044'},
+    {'name': 'First Bank', 'code': '011'},
+    {'name': 'Guaranty Trust Bank', 'code': '058'},
+    {'name': 'United Bank for Africa', 'code': '033'},
+    {'name': 'Wema Bank', 'code': '035'},
+    {'name': 'Zenith Bank', 'code': '057'},
+]
+
+BILLERS = {
+    'airtime': [
+        {'code': 'mtn', 'name': 'MTN', 'has_products': False, 'minimum': 50, 'maximum': 50000},
+        {'code': 'airtel', 'name': 'Airtel', 'has_products': False, 'minimum': 50, 'maximum': 50000},
+        {'code': 'glo', 'name': 'Glo', 'has_products': False, 'minimum': 50, 'maximum': 50000},
+    ],
+    'data_bundle': [
+        {'code': 'mtn-data', 'name': 'MTN Data', 'has_products': True},
+        {'code': 'airtel-data', 'name': 'Airtel Data', 'has_products': True},
+    ],
+}
+
+PRODUCTS = [
+    {'code': '500mb', 'name': '500MB', 'amount': 300, 'description': '500MB data', 'validity': '30 days'},
+    {'code': '1gb', 'name': '1GB', 'amount': 500, 'description': '1GB data', 'validity': '30 days'},
+    {'code': '5gb', 'name': '5GB', 'amount': 2000, 'description': '5GB data', 'validity': '30 days'},
+]
+
+PRICES = {
+    'btc': {'usd': 65000, 'ngn': 98000000},
+    'eth': {'usd': 3200, 'ngn': 4800000},
+    'usdt': {'usd': 1, 'ngn': 1500},
+}
+
+
+class Faults:
+    """
+    Latency, error and rate-limit settings for one provider.
+    """
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, rate_limit=0, pending_rate=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.pending_rate = pending_rate
+        self._lock = threading.Lock()
+        self._tokens = float(rate_limit)
+        self._refilled = time.monotonic()
+
+    def delay(self):
+        latency = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+    def limited(self):
+        """Token bucket of ``rate_limit`` requests per second; 0 is unlimited."""
+        if not self.rate_limit:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate_limit, self._tokens + (now - self._refilled) * self.rate_limit)
+            self._refilled = now
+            if self._tokens < 1:
+                return True
+            self._tokens -= 1
+            return False
+
+    def failed(self):
+        return random.random() < self.error_rate
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeProviders/1.0'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, body, status=200):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def handle_request(self, method):
+        parts = urlsplit(self.path)
+        provider, _, path = parts.path.lstrip('/').partition('/')
+        body = self.read_json() if method == 'POST' else {}
+        if provider not in PROVIDERS:
+            return self.send_json({'message': f'Unknown provider {provider!r}'}, 404)
+
+        faults = self.server.faults[provider]
+        self.server.count(provider)
+        if faults.limited():
+            return self.send_json({'status': False, 'success': False, 'message': 'Too many requests'}, 429)
+        faults.delay()
+        if faults.failed():
+            return self.send_json({'status': False, 'success': False, 'message': 'Injected failure'}, 503)
+
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        handler = getattr(self, provider)
+        status, reply = handler(method, '/' + path, query, body)
+        self.send_json(reply, status)
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def paystack(self, method, path, query, body):
+        if method == 'GET' and path == '/bank':
+            banks = [
+                {**bank, 'id': i, 'country': 'Nigeria', 'currency': 'NGN', 'type': 'nuban', 'active': True}
+                for i, bank in enumerate(BANKS, 1)
+            ]
+            return 200, {'status': True, 'message': 'Banks retrieved', 'data': banks}
+        if method == 'GET' and path == '/bank/resolve':
+            account_number = query.get('account_number', '')
+            if not re.fullmatch(r'\d{10}', account_number):
+                return 422, {'status': False, 'message': 'Could not resolve account name'}
+            return 200, {'status': True, 'message': 'Account number resolved', 'data': {
+                'account_number': account_number,
+                'account_name': f'TEST ACCOUNT {account_number[-4:]}',
+                'bank_id': 1,
+            }}
+        if method == 'POST' and path == '/dedicated_account':
+            account_number = f'{random.randrange(10 ** 10):010d}'
+            return 200, {'status': True, 'message': 'NUBAN successfully created', 'data': {
+                'bank': {'name': 'Wema Bank', 'id': 20, 'slug': 'wema-bank'},
+                'account_name': f"SPACEVEST/{body.get('customer', 'CUSTOMER')}",
+                'account_number': account_number,
+            }}
+        return 404, {'status': False, 'message': 'Not found'}
+
+    def yanga(self, method, path, query, body):
+        match = re.fullmatch(r'/bill-payments/(billers|products|status)/([^/]+)', path)
+        if method == 'GET' and match:
+            kind, name = match.groups()
+            if kind == 'billers':
+                return 200, {'success': True, 'data': {'billers': BILLERS.get(name, [])}}
+            if kind == 'products':
+                return 200, {'success': True, 'data': {'products': PRODUCTS if name.endswith('-data') else []}}
+            status = self.server.purchases.get(name)
+            if status is None:
+                return 404, {'success': False, 'message': 'Purchase not found'}
+            # Purchases reported as processing finish on the first lookup
+            self.server.purchases[name] = 'successful'
+            return 200, {'success': True, 'data': {'request_id': name, 'status': status}}
+        if method == 'POST' and path == '/bill-payments/pay':
+            request_id = body.get('request_id') or str(uuid.uuid4())
+            pending = random.random() < self.server.faults['yanga'].pending_rate
+            status = 'processing' if pending else 'successful'
+            self.server.purchases[request_id] = status
+            return 200, {'success': True, 'message': 'Purchase received', 'data': {
+                'request_id': request_id,
+                'reference': uuid.uuid4().hex,
+                'status': status,
+                'amount': body.get('amount'),
+                'recipient': body.get('recipient'),
+            }}
+        return 404, {'success': False, 'message': 'Not found'}
+
+    def coingecko(self, method, path, query, body):
+        if method == 'GET' and path == '/simple/price':
+            ids = [coin for coin in query.get('ids', '').split(',') if coin in PRICES]
+            currencies = query.get('vs_currencies', 'usd').split(',')
+            prices = {}
+            for coin in ids:
+                drift = random.uniform(0.99, 1.01)
+                prices[coin] = {c: round(PRICES[coin][c] * drift, 2) for c in currencies if c in PRICES[coin]}
+                if query.get('include_market_cap') == 'true':
+                    prices[coin]['usd_market_cap'] = PRICES[coin]['usd'] * 19_000_000
+                if query.get('include_24hr_vol') == 'true':
+                    prices[coin]['usd_24h_vol'] = PRICES[coin]['usd'] * 500_000
+                if query.get('include_24hr_change') == 'true':
+                    prices[coin]['usd_24h_change'] = round((drift - 1) * 100, 2)
+            return 200, prices
+        return 404, {'error': 'Not found'}
+
+
+class FakeProviderServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open many connections at once
+    request_queue_size = 1024
+
+    def __init__(self, address, faults, verbose=False):
+        super().__init__(address, Handler)
+        self.faults = faults
+        self.verbose = verbose
+        # request_id -> status reported by the Yanga status lookup
+        self.purchases = {}
+        self.requests = {provider: 0 for provider in PROVIDERS}
+        self._lock = threading.Lock()
+
+    def count(self, provider):
+        with self._lock:
+            self.requests[provider] += 1
+
+
+def _per_provider(values, cast, default):
+    """
+    Turn ``['50', 'yanga=400']`` into ``{'paystack': 50, 'yanga': 400, ...}``.
+    """
+    result = {provider: default for provider in PROVIDERS}
+    for value in values or []:
+        provider, sep, amount = value.rpartition('=')
+        if not sep:
+            result = {p: cast(amount) for p in PROVIDERS}
+        elif provider in PROVIDERS:
+            result[provider] = cast(amount)
+        else:
+            raise argparse.ArgumentTypeError(f'Unknown provider {provider!r}')
+    return result
+
+
+def build_faults(latency=None, jitter=None, error_rate=None, rate_limit=None, pending_rate=None):
+    settings = {
+        'latency_ms': _per_provider(latency, float, 0),
+        'jitter_ms': _per_provider(jitter, float, 0),
+        'error_rate': _per_provider(error_rate, float, 0.0),
+        'rate_limit': _per_provider(rate_limit, int, 0),
+    }
+    return {
+        provider: Faults(
+            pending_rate=pending_rate if provider == 'yanga' and pending_rate else 0.0,
+            **{name: values[provider] for name, values in settings.items()}
+        )
+        for provider in PROVIDERS
+    }
+
+
+def start(host='127.0.0.1', port=0, faults=None, verbose=False):
+    """
+    Start the server in a background thread and return it; ``port=0`` picks
+    a free port (see ``server.server_port``).
+    """
+    server = FakeProviderServer((host, port), faults or build_faults(), verbose=verbose)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', action='append', metavar='[PROVIDER=]MS',
+                        help='Added latency per request, in milliseconds')
+    parser.add_argument('--jitter', action='append', metavar='[PROVIDER=]MS',
+                        help='Random +/- variation of the latency, in milliseconds')
+    parser.add_argument('--error-rate', action='append', metavar='[PROVIDER=]RATE',
+                        help='Share of requests answered with 503 (0-1)')
+    parser.add_argument('--rate-limit', action='append', metavar='[PROVIDER=]RPS',
+                        help='Requests per second before answering 429 (0 is unlimited)')
+    parser.add_argument('--pending-rate', type=float, default=0.0,
+                        help='Share of Yanga purchases reported as still processing (0-1)')
+    parser.add_argument('--verbose', action='store_true', help='Log every request')
+    args = parser.parse_args()
+
+    faults = build_faults(args.latency, args.jitter, args.error_rate, args.rate_limit, args.pending_rate)
+    server = FakeProviderServer((args.host, args.port), faults, verbose=args.verbose)
+    base = f'http://{args.host}:{server.server_port}'
+    print(f'Fake providers listening on {base}')
+    for provider in PROVIDERS:
+        print(f'  {provider:<10} {base}/{provider}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f'Requests served: {server.requests}')
+
+
+if __name__ == '__main__':
+    main()
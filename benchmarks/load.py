@@ -0,0 +1,290 @@
+"""
+End-to-end load benchmark for the SpaceVest API.
+
+Drives a running server (``runserver``, gunicorn, ...) with a weighted mix of
+scenarios from ``--concurrency`` client threads for ``--duration`` seconds,
+then reports throughput and p50/p95/p99 latency per scenario.
+
+Scenarios:
+
+    transfer   POST /api/transactions/transfer/ to another benchmark user
+    topup      POST /api/transactions/top-up/ (airtime)
+    history    GET  /api/transactions/history/
+    quote      POST /api/crypto/quote/
+
+Before the run, ``--users`` benchmark users are created (or reused) in the
+server's database, funded, and logged in with a fresh session each, so this
+script needs the same settings and database as the server
+(``DJANGO_SETTINGS_MODULE``, ``DB_*``). Run the server against the fake
+providers (``python -m benchmarks.fake_providers``) so no real provider is
+called.
+
+Example:
+
+    python -m benchmarks.load --base-url http://127.0.0.1:8000 \\
+        --concurrency 16 --duration 30 --mix transfer=3,topup=1,history=4,quote=2
+"""
+import argparse
+import json
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+import requests
+
+SCENARIOS = ['transfer', 'topup', 'history', 'quote']
+
+USER_PREFIX = 'bench-user-'
+PASSWORD = 'bench-password'
+
+
+def setup(users, balance):
+    """
+    Create, fund and log in ``users`` benchmark users. Returns
+    ``([(email, session_key)], session_cookie_name, csrf_cookie_name)``.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'spacevest.settings')
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+    from django.utils import timezone
+    from importlib import import_module
+
+    from crypto.models import CryptoRate, SupportedCrypto
+    from transactions import wallet
+    from transactions.models import Transaction
+
+    User = get_user_model()
+    store = import_module(settings.SESSION_ENGINE).SessionStore
+    backend = settings.AUTHENTICATION_BACKENDS[0]
+
+    CryptoRate.objects.get_or_create(
+        cryptocurrency='BTC',
+        defaults={'symbol': 'BTC', 'current_price_ngn': Decimal('98000000'),
+                  'current_price_usd': Decimal('65000'), 'last_updated': timezone.now()},
+    )
+    SupportedCrypto.objects.get_or_create(symbol='BTC', defaults={'name': 'Bitcoin'})
+
+    sessions = []
+    for i in range(users):
+        username = f'{USER_PREFIX}{i}'
+        email = f'{username}@bench.spacevest.local'
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            user = User.objects.create_user(username=username, email=email, password=PASSWORD)
+            user.refresh_from_db()
+        if user.available_balance < balance:
+            amount = balance - user.available_balance
+            transaction = Transaction.objects.create(
+                user=user, transaction_type='credit', category='deposit', amount=amount,
+                description='Benchmark funding', status='completed',
+            )
+            wallet.credit(user, amount, transaction=transaction)
+
+        session = store()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = backend
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        sessions.append((email, session.session_key))
+
+    from django.db import connections
+    connections.close_all()
+    return sessions, settings.SESSION_COOKIE_NAME, settings.CSRF_COOKIE_NAME
+
+
+class Client:
+    """
+    One benchmark user's HTTP session, with its own keep-alive connection.
+    """
+
+    def __init__(self, base_url, email, session_key, session_cookie, csrf_cookie, emails):
+        self.base_url = base_url.rstrip('/')
+        self.email = email
+        self.others = [e for e in emails if e != email] or [email]
+        self.http = requests.Session()
+        # Any well-formed token passes the CSRF check as long as cookie and header match
+        token = secrets.token_hex(16)
+        self.http.cookies.set(session_cookie, session_key)
+        self.http.cookies.set(csrf_cookie, token)
+        self.http.headers.update({'X-CSRFToken': token, 'Referer': self.base_url + '/'})
+
+    def request(self, method, path, **kwargs):
+        return self.http.request(method, self.base_url + path, timeout=60, **kwargs)
+
+    def transfer(self):
+        return self.request('POST', '/api/transactions/transfer/', json={
+            'amount': '1.00',
+            'recipient_email': random.choice(self.others),
+            'description': 'Benchmark transfer',
+        })
+
+    def topup(self):
+        return self.request('POST', '/api/transactions/top-up/', json={
+            'type': 'airtime',
+            'network': 'mtn',
+            'phone_number': f'080{random.randrange(10 ** 8):08d}',
+            'amount': '50.00',
+        })
+
+    def history(self):
+        return self.request('GET', '/api/transactions/history/', params={'page_size': 20})
+
+    def quote(self):
+        return self.request('POST', '/api/crypto/quote/', json={
+            'cryptocurrency': 'BTC',
+            'amount_ngn': str(random.randrange(1000, 100000)),
+            'include_fees': True,
+        })
+
+
+class Results:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def add(self, scenario, seconds, status):
+        with self._lock:
+            self.latencies[scenario].append(seconds)
+            self.statuses[scenario][status] += 1
+            if not isinstance(status, int) or status >= 400:
+                self.errors[scenario] += 1
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def parse_mix(value):
+    weights = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f'Unknown scenario {name!r}; choose from {", ".join(SCENARIOS)}')
+        weights[name] = float(weight) if weight else 1.0
+    return weights
+
+
+def worker(client, mix, deadline, results):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    while time.monotonic() < deadline:
+        scenario = random.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            status = getattr(client, scenario)().status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        results.add(scenario, time.perf_counter() - started, status)
+
+
+def report(results, elapsed):
+    rows = []
+    everything = []
+    for scenario in SCENARIOS:
+        latencies = sorted(results.latencies.get(scenario, []))
+        if not latencies:
+            continue
+        everything.extend(latencies)
+        rows.append(_row(scenario, latencies, results.errors[scenario], elapsed, results.statuses[scenario]))
+    everything.sort()
+    rows.append(_row('total', everything, sum(results.errors.values()), elapsed, {}))
+    return rows
+
+
+def _row(name, latencies, errors, elapsed, statuses):
+    return {
+        'scenario': name,
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'statuses': {str(k): v for k, v in statuses.items()},
+    }
+
+
+def print_report(rows, elapsed, out=sys.stdout):
+    out.write(f'\n{"scenario":<10} {"requests":>9} {"errors":>7} {"req/s":>8} '
+              f'{"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}  statuses\n')
+    for row in rows:
+        statuses = ' '.join(f'{k}:{v}' for k, v in sorted(row['statuses'].items()))
+        out.write(f'{row["scenario"]:<10} {row["requests"]:>9} {row["errors"]:>7} {row["throughput"]:>8} '
+                  f'{row["p50_ms"]:>8} {row["p95_ms"]:>8} {row["p99_ms"]:>8}  {statuses}\n')
+    out.write(f'\n{elapsed:.1f}s elapsed\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--concurrency', type=int, default=8, help='Number of client threads')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to run')
+    parser.add_argument('--warmup', type=float, default=0, help='Seconds to run before measuring')
+    parser.add_argument('--users', type=int, default=20, help='Number of benchmark users')
+    parser.add_argument('--balance', type=Decimal, default=Decimal('1000000'),
+                        help='Available balance each user is topped up to before the run')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('transfer=3,topup=1,history=4,quote=2'),
+                        help='Weighted scenarios, e.g. transfer=3,history=1')
+    parser.add_argument('--json', dest='json_path', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    if args.concurrency < 1 or args.users < 1 or args.duration <= 0:
+        parser.error('--concurrency and --users must be at least 1 and --duration positive')
+
+    sessions, session_cookie, csrf_cookie = setup(args.users, args.balance)
+    emails = [email for email, _ in sessions]
+    clients = [
+        Client(args.base_url, *sessions[i % len(sessions)], session_cookie, csrf_cookie, emails)
+        for i in range(args.concurrency)
+    ]
+
+    def run(seconds):
+        results = Results()
+        deadline = time.monotonic() + seconds
+        threads = [
+            threading.Thread(target=worker, args=(client, args.mix, deadline, results))
+            for client in clients
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, time.monotonic() - started
+
+    if args.warmup:
+        print(f'Warming up for {args.warmup}s...')
+        run(args.warmup)
+    print(f'Running {args.concurrency} clients for {args.duration}s against {args.base_url}...')
+    results, elapsed = run(args.duration)
+
+    rows = report(results, elapsed)
+    print_report(rows, elapsed)
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({
+                'base_url': args.base_url,
+                'concurrency': args.concurrency,
+                'duration': elapsed,
+                'mix': args.mix,
+                'results': rows,
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
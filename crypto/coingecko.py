@@ -0,0 +1,38 @@
+"""
+Client for the CoinGecko price API.
+
+Calls go through the ``coingecko`` circuit breaker (``spacevest.circuit``), so
+a failing or rate-limiting CoinGecko is skipped quickly and the stored
+``CryptoRate`` rows keep being served. ``aget`` makes the same call from async
+views with a pooled ``httpx.AsyncClient`` (``spacevest.aio``).
+"""
+import httpx
+import requests
+from django.conf import settings
+
+from spacevest import aio, circuit
+
+
+def breaker():
+    return circuit.breaker('coingecko', settings.COINGECKO_MAX_CONCURRENT)
+
+
+def url(path):
+    return f"{settings.COINGECKO_API_URL}/{path.lstrip('/')}"
+
+
+def get(path, **kwargs):
+    kwargs.setdefault('timeout', settings.COINGECKO_TIMEOUT)
+    return breaker().call(requests.get, url(path), **kwargs)
+
+
+def _new_async_client():
+    return httpx.AsyncClient(
+        timeout=settings.COINGECKO_TIMEOUT,
+        limits=httpx.Limits(max_connections=settings.COINGECKO_MAX_CONCURRENT),
+    )
+
+
+async def aget(path, **kwargs):
+    client = aio.client('coingecko', _new_async_client)
+    return await breaker().acall(client.get, url(path), **kwargs)
@@ -2,13 +2,14 @@ from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
-import requests
-from decouple import config
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from spacevest import aio
+from spacevest.circuit import ProviderUnavailable
+from . import coingecko
 from .models import CryptoRate, SupportedCrypto
 from .serializers import CryptoRateSerializer, SupportedCryptoSerializer, CryptoConversionSerializer, CryptoPurchaseQuoteSerializer
 
-COINGECKO_API_URL = config('COINGECKO_API_URL', default='https://api.coingecko.com/api/v3')
-
 class CryptoRateListView(generics.ListAPIView):
     queryset = CryptoRate.objects.all().order_by('cryptocurrency')
     serializer_class = CryptoRateSerializer
@@ -103,22 +104,45 @@ def get_purchase_quote(request):
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-@api_view(['POST'])
-def update_crypto_rates(request):
+def _save_rates(data):
+    for coin_id, rates in data.items():
+        symbol = coin_id.upper()
+        
+        crypto_rate, created = CryptoRate.objects.update_or_create(
+            symbol=symbol,
+            defaults={
+                'cryptocurrency': symbol,
+                'current_price_usd': rates.get('usd', 0),
+                'current_price_ngn': rates.get('ngn', 0),
+                'market_cap': rates.get('usd_market_cap'),
+                'volume_24h': rates.get('usd_24h_vol'),
+                'price_change_24h': rates.get('usd_24h_change'),
+                'price_change_percentage_24h': rates.get('usd_24h_change'),
+                'last_updated': timezone.now(),
+            }
+        )
+
+
+def _supported_symbols():
+    return list(SupportedCrypto.objects.filter(is_active=True).values_list('symbol', flat=True))
+
+
+@aio.api_view(['POST'])
+async def update_crypto_rates(request):
     # This would typically be called by a scheduled task/cron job
     try:
         # Get supported cryptocurrencies
-        supported_symbols = list(SupportedCrypto.objects.filter(is_active=True).values_list('symbol', flat=True))
+        supported_symbols = await sync_to_async(_supported_symbols)()
         
         if not supported_symbols:
-            return Response({'error': 'No supported cryptocurrencies found'}, status=status.HTTP_400_BAD_REQUEST)
+            return aio.Response({'error': 'No supported cryptocurrencies found'}, status=status.HTTP_400_BAD_REQUEST)
         
         # Convert symbols to CoinGecko format (lowercase)
         coin_ids = [symbol.lower() for symbol in supported_symbols]
         
         # Make API call to CoinGecko
-        response = requests.get(
-            f"{COINGECKO_API_URL}/simple/price",
+        response = await coingecko.aget(
+            "simple/price",
             params={
                 'ids': ','.join(coin_ids),
                 'vs_currencies': 'usd,ngn',
@@ -130,29 +154,18 @@ def update_crypto_rates(request):
         
         if response.status_code == 200:
             data = response.json()
+            await sync_to_async(_save_rates)(data)
             
-            for coin_id, rates in data.items():
-                symbol = coin_id.upper()
-                
-                crypto_rate, created = CryptoRate.objects.update_or_create(
-                    symbol=symbol,
-                    defaults={
-                        'cryptocurrency': symbol,
-                        'current_price_usd': rates.get('usd', 0),
-                        'current_price_ngn': rates.get('ngn', 0),
-                        'market_cap': rates.get('usd_market_cap'),
-                        'volume_24h': rates.get('usd_24h_vol'),
-                        'price_change_24h': rates.get('usd_24h_change'),
-                        'price_change_percentage_24h': rates.get('usd_24h_change'),
-                    }
-                )
-            
-            return Response({'message': f'Updated rates for {len(data)} cryptocurrencies'})
+            return aio.Response({'message': f'Updated rates for {len(data)} cryptocurrencies'})
         else:
-            return Response({'error': 'Failed to fetch rates from CoinGecko'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return aio.Response({'error': 'Failed to fetch rates from CoinGecko'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
             
+    except ProviderUnavailable:
+        # The stored rates stay in use until CoinGecko recovers
+        return aio.Response({'error': 'CoinGecko is temporarily unavailable; stored rates were kept'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
     except Exception as e:
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return aio.Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 @api_view(['POST'])
 @permission_classes([])
@@ -0,0 +1,93 @@
+"""
+Helpers for async views that mostly wait on third-party providers.
+
+``client(name, factory)`` returns a pooled ``httpx.AsyncClient`` for a provider.
+Clients are bound to an event loop, so one is kept per provider per loop:
+under ASGI that is one client per process, and every in-flight call is a
+coroutine instead of a blocked worker thread. Under WSGI each async view
+runs in its own short-lived loop, so ``release`` closes the loop's clients
+when the view returns; ``api_view`` does this for its views.
+
+``api_view`` is a small async counterpart of DRF's ``@api_view``, which does
+not support ``async def`` views: it checks the method and, by default, that
+the user is authenticated, parses a JSON body into ``request.data``, and lets
+views return plain dicts via ``Response``.
+"""
+import asyncio
+import json
+import weakref
+from functools import wraps
+
+import httpx
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, QueryDict
+
+# event loop -> {name: AsyncClient}
+_clients = weakref.WeakKeyDictionary()
+
+
+def client(name, factory):
+    """
+    Return the ``httpx.AsyncClient`` for provider ``name`` on the running
+    event loop, calling ``factory()`` to create it on first use.
+    """
+    loop = asyncio.get_running_loop()
+    clients = _clients.setdefault(loop, {})
+    if name not in clients:
+        clients[name] = factory()
+    return clients[name]
+
+
+async def release(request):
+    """
+    Close the clients of the running event loop unless it outlives
+    ``request``, i.e. unless the request is served over ASGI.
+    """
+    if isinstance(request, ASGIRequest):
+        return
+    clients = _clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
+
+
+def Response(data, status=200):
+    return JsonResponse(data, status=status, safe=False, encoder=DjangoJSONEncoder)
+
+
+def _parse(request):
+    if request.method in ('GET', 'HEAD', 'DELETE'):
+        return request.GET
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+    return request.POST or QueryDict()
+
+
+def api_view(methods, authenticated=True):
+    """
+    Decorate an ``async def`` view taking ``(request, ...)``. With
+    ``authenticated`` set, anonymous requests get the same 403 DRF returns.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return Response({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+            if authenticated:
+                user = await request.auser()
+                if not user.is_authenticated:
+                    return Response({'detail': 'Authentication credentials were not provided.'}, status=403)
+                request.user = user
+            data = _parse(request)
+            if data is None:
+                return Response({'detail': 'JSON parse error'}, status=400)
+            request.data = data
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                await release(request)
+        return wrapper
+    return decorator
@@ -0,0 +1,198 @@
+"""
+Circuit breakers and bulkheads for calls to third-party providers.
+
+Each provider (Paystack, Yanga, CoinGecko) gets one ``CircuitBreaker`` per
+process. It does two things:
+
+- **Bulkhead.** At most ``max_concurrent`` calls to the provider run at once.
+  Further calls are rejected straight away instead of queueing, so a slow
+  provider can only tie up that many request workers.
+- **Circuit breaker.** The outcome of the last ``window`` calls is kept. Once
+  at least ``min_calls`` have been made and the share of failed calls, or of
+  calls slower than ``slow_call_seconds``, reaches its rate, the circuit
+  opens and every call is rejected for ``open_seconds``. After that the
+  circuit is half-open: ``half_open_calls`` probe calls are let through, and
+  the circuit closes if they all succeed or opens again if one fails.
+
+Rejected calls raise ``ProviderUnavailable``, which is a
+``requests.RequestException``, so callers that already handle network errors
+(and fall back to stored data) also handle an open circuit. A call turned
+away by a full bulkhead raises the subclass ``BulkheadFull``; the provider
+may well be healthy, so callers can retry it shortly.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import requests
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderUnavailable(requests.exceptions.RequestException):
+    """Raised instead of calling a provider whose circuit is open or whose bulkhead is full."""
+
+
+class BulkheadFull(ProviderUnavailable):
+    """Raised instead of calling a provider that already has ``max_concurrent`` calls in flight."""
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def failed_response(response):
+    """
+    Whether a provider's reply counts as a failure: overload or server errors.
+    """
+    return response.status_code == 429 or response.status_code >= 500
+
+
+class CircuitBreaker:
+    def __init__(self, name, max_concurrent, failure_rate=None, slow_call_rate=None,
+                 slow_call_seconds=None, window=20, min_calls=10, open_seconds=None,
+                 half_open_calls=1):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.failure_rate = failure_rate if failure_rate is not None else settings.CIRCUIT_FAILURE_RATE
+        self.slow_call_rate = slow_call_rate if slow_call_rate is not None else settings.CIRCUIT_SLOW_CALL_RATE
+        self.slow_call_seconds = (
+            slow_call_seconds if slow_call_seconds is not None else settings.CIRCUIT_SLOW_CALL_SECONDS
+        )
+        self.window = window
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds if open_seconds is not None else settings.CIRCUIT_OPEN_SECONDS
+        self.half_open_calls = half_open_calls
+        self.reset()
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._calls = threading.BoundedSemaphore(self.max_concurrent)
+        # (failed, slow) for the most recent calls
+        self._outcomes = deque(maxlen=self.window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def _admit(self):
+        if not self._calls.acquire(blocking=False):
+            raise BulkheadFull(f'{self.name} is unavailable (too many calls in flight)')
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._state = HALF_OPEN
+                self._probes = 0
+                self._probe_successes = 0
+            if self._state == OPEN or (self._state == HALF_OPEN and self._probes >= self.half_open_calls):
+                self._calls.release()
+                raise ProviderUnavailable(f'{self.name} is unavailable (circuit {self._state})')
+            if self._state == HALF_OPEN:
+                self._probes += 1
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        logger.warning('Circuit for %s opened', self.name)
+
+    def _record(self, failed, slow):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                if failed or slow:
+                    self._open()
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_calls:
+                    self._state = CLOSED
+                    logger.info('Circuit for %s closed', self.name)
+                return
+            if self._state != CLOSED:
+                return
+            self._outcomes.append((failed, slow))
+            calls = len(self._outcomes)
+            if calls < self.min_calls:
+                return
+            failures = sum(1 for f, _ in self._outcomes if f)
+            slow_calls = sum(1 for _, s in self._outcomes if s)
+            if failures / calls >= self.failure_rate or slow_calls / calls >= self.slow_call_rate:
+                self._open()
+
+    def call(self, func, *args, **kwargs):
+        """
+        Call ``func`` through the breaker and return its result.
+
+        Exceptions count as failures, as do responses that
+        ``failed_response`` rejects; those are still returned to the caller.
+        """
+        self._admit()
+        started = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self._record(True, False)
+            raise
+        finally:
+            self._calls.release()
+        self._finish(result, started)
+        return result
+
+    async def acall(self, func, *args, **kwargs):
+        """
+        Like ``call``, for a coroutine function such as an
+        ``httpx.AsyncClient`` method.
+        """
+        self._admit()
+        started = time.monotonic()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception:
+            self._record(True, False)
+            raise
+        finally:
+            self._calls.release()
+        self._finish(result, started)
+        return result
+
+    def _finish(self, result, started):
+        # requests and httpx responses both have status_code
+        failed = hasattr(result, 'status_code') and failed_response(result)
+        self._record(failed, time.monotonic() - started >= self.slow_call_seconds)
+
+
+_breakers = {}
+_lock = threading.Lock()
+
+
+def _reset():
+    global _lock
+    _lock = threading.Lock()
+    for breaker in _breakers.values():
+        breaker.reset()
+
+
+# A forked worker starts with closed circuits and fresh locks
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset)
+
+
+def breaker(name, max_concurrent):
+    """
+    Return the process-wide breaker for provider ``name``, creating it on
+    first use.
+    """
+    if name not in _breakers:
+        with _lock:
+            if name not in _breakers:
+                _breakers[name] = CircuitBreaker(name, max_concurrent)
+    return _breakers[name]
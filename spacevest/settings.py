@@ -176,10 +176,43 @@ FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:3000')
 # Paystack settings
 PAYSTACK_SECRET_KEY = config('PAYSTACK_SECRET_KEY', default='')
 PAYSTACK_PUBLIC_KEY = config('PAYSTACK_PUBLIC_KEY', default='')
+PAYSTACK_BASE_URL = config('PAYSTACK_BASE_URL', default='https://api.paystack.co')
+PAYSTACK_CONNECT_TIMEOUT = config('PAYSTACK_CONNECT_TIMEOUT', default=3.05, cast=float)
+PAYSTACK_READ_TIMEOUT = config('PAYSTACK_READ_TIMEOUT', default=10, cast=float)
+PAYSTACK_MAX_CONCURRENT = config('PAYSTACK_MAX_CONCURRENT', default=10, cast=int)  # Paystack calls in flight per process
+PAYSTACK_RESOLVE_TTL = config('PAYSTACK_RESOLVE_TTL', default=60 * 60 * 24, cast=int)  # Seconds a resolved account name is reused
+PAYSTACK_RESOLVE_NEGATIVE_TTL = config('PAYSTACK_RESOLVE_NEGATIVE_TTL', default=60, cast=int)  # Seconds an unresolvable account is remembered
+PAYSTACK_RESOLVE_CONCURRENCY = config('PAYSTACK_RESOLVE_CONCURRENCY', default=5, cast=int)  # Lookups in flight per batch verification
+PAYSTACK_RESOLVE_RATE = config('PAYSTACK_RESOLVE_RATE', default=20, cast=float)  # Lookups started per second per batch verification
+PAYSTACK_BATCH_VERIFY_MAX = config('PAYSTACK_BATCH_VERIFY_MAX', default=500, cast=int)  # Accounts per batch verification
+BANK_DIRECTORY_TTL = config('BANK_DIRECTORY_TTL', default=300, cast=int)  # Seconds between checks for bank directory changes
 
 # Yanga API settings
-YANGA_API_BASE_URL = 'https://sandbox-api.yangaplugbusiness.com/api/v1'
+YANGA_API_BASE_URL = config('YANGA_API_BASE_URL', default='https://sandbox-api.yangaplugbusiness.com/api/v1')
 YANGA_API_KEY = config('YANGA_API_KEY', default='yanga_sk_test_9288fe9990a8699da8d4_4871249b7487ff02cf3a')
+YANGA_CONNECT_TIMEOUT = config('YANGA_CONNECT_TIMEOUT', default=3.05, cast=float)
+YANGA_READ_TIMEOUT = config('YANGA_READ_TIMEOUT', default=20, cast=float)
+YANGA_POOL_SIZE = config('YANGA_POOL_SIZE', default=20, cast=int)  # Keep-alive connections per process
+YANGA_CATALOG_TTL = config('YANGA_CATALOG_TTL', default=900, cast=int)  # Seconds before billers/products are refetched
+YANGA_TOPUP_WORKERS = config('YANGA_TOPUP_WORKERS', default=8, cast=int)  # Async top-ups in flight per process
+YANGA_MAX_CONCURRENT = config('YANGA_MAX_CONCURRENT', default=20, cast=int)  # Yanga calls in flight per process
+YANGA_BULK_WORKERS = config('YANGA_BULK_WORKERS', default=8, cast=int)  # Bulk top-up rows in flight per process
+YANGA_BULK_MAX_ROWS = config('YANGA_BULK_MAX_ROWS', default=5000, cast=int)  # Rows accepted per bulk top-up
+YANGA_BULK_IDLE_TIMEOUT = config('YANGA_BULK_IDLE_TIMEOUT', default=900, cast=int)  # Seconds before a stalled batch is given up
+YANGA_UNSENT_TIMEOUT = config('YANGA_UNSENT_TIMEOUT', default=900, cast=int)  # Seconds before a top-up never sent is failed
+YANGA_STATUS_PATH = config('YANGA_STATUS_PATH', default='')  # Status lookup path with {} for the request_id; empty disables lookups
+YANGA_REVIEW_AFTER = config('YANGA_REVIEW_AFTER', default=3600, cast=int)  # Seconds a sent top-up may stay pending before it is flagged for review
+
+# CoinGecko settings
+COINGECKO_API_URL = config('COINGECKO_API_URL', default='https://api.coingecko.com/api/v3')
+COINGECKO_TIMEOUT = config('COINGECKO_TIMEOUT', default=10, cast=float)
+COINGECKO_MAX_CONCURRENT = config('COINGECKO_MAX_CONCURRENT', default=2, cast=int)
+
+# Circuit breakers for the providers above (see spacevest/circuit.py)
+CIRCUIT_FAILURE_RATE = config('CIRCUIT_FAILURE_RATE', default=0.5, cast=float)  # Share of failed calls that opens a circuit
+CIRCUIT_SLOW_CALL_RATE = config('CIRCUIT_SLOW_CALL_RATE', default=0.5, cast=float)  # Share of slow calls that opens a circuit
+CIRCUIT_SLOW_CALL_SECONDS = config('CIRCUIT_SLOW_CALL_SECONDS', default=8, cast=float)
+CIRCUIT_OPEN_SECONDS = config('CIRCUIT_OPEN_SECONDS', default=30, cast=float)  # How long an open circuit rejects calls
 
 # REST Framework settings
 REST_FRAMEWORK = {
@@ -231,6 +264,21 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': False,
         },
+        'transactions': {
+            'handlers': ['console', 'file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'spacevest': {
+            'handlers': ['console', 'file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'banking': {
+            'handlers': ['console', 'file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
 
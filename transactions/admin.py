@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import Transaction, TransactionFee, CryptoTransaction, AirtimeTransaction, DataTransaction
+from . import topups
+from .models import (
+    Transaction, TransactionFee, CryptoTransaction, AirtimeTransaction, DataTransaction,
+    LedgerEntry, BalanceCheckpoint, DailySpend, Biller, BillerProduct, WalletHold
+)
 
 class TransactionFeeInline(admin.TabularInline):
     model = TransactionFee
@@ -17,9 +21,21 @@ class DataTransactionInline(admin.TabularInline):
     model = DataTransaction
     extra = 0
 
+class NeedsReviewFilter(admin.SimpleListFilter):
+    title = 'needs review'
+    parameter_name = 'review'
+
+    def lookups(self, request, model_admin):
+        return (('yes', 'Yes'),)
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.filter(status='pending', metadata__review=True)
+        return queryset
+
 class TransactionAdmin(admin.ModelAdmin):
     list_display = ('reference', 'user', 'transaction_type', 'category', 'amount', 'status', 'created_at')
-    list_filter = ('transaction_type', 'category', 'status', 'created_at')
+    list_filter = ('transaction_type', 'category', 'status', NeedsReviewFilter, 'created_at')
     search_fields = ('reference', 'user__email', 'user__username', 'description')
     readonly_fields = ('created_at', 'updated_at', 'completed_at')
     inlines = [TransactionFeeInline, CryptoTransactionInline, AirtimeTransactionInline, DataTransactionInline]
@@ -41,6 +57,22 @@ class TransactionAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+    actions = ['complete_top_ups', 'fail_top_ups']
+
+    def _settle_top_ups(self, request, queryset, completed):
+        settled = 0
+        for pk in queryset.filter(status='pending', category__in=topups.CATEGORIES).values_list('pk', flat=True):
+            if topups.settle_manually(pk, completed, request.user.get_username()) is not None:
+                settled += 1
+        self.message_user(request, f"{settled} pending top-up(s) marked {'completed' if completed else 'failed'}")
+
+    @admin.action(description='Mark pending top-ups completed (capture held funds)')
+    def complete_top_ups(self, request, queryset):
+        self._settle_top_ups(request, queryset, True)
+
+    @admin.action(description='Mark pending top-ups failed (release held funds)')
+    def fail_top_ups(self, request, queryset):
+        self._settle_top_ups(request, queryset, False)
 
 class TransactionFeeAdmin(admin.ModelAdmin):
     list_display = ('transaction', 'amount', 'description', 'created_at')
@@ -62,8 +94,53 @@ class DataTransactionAdmin(admin.ModelAdmin):
     list_filter = ('network',)
     search_fields = ('transaction__reference', 'phone_number', 'data_plan')
 
+class LedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ('journal', 'user', 'account', 'entry_type', 'amount', 'transaction', 'created_at')
+    list_filter = ('account', 'entry_type', 'created_at')
+    search_fields = ('user__email', 'user__username', 'transaction__reference')
+    readonly_fields = ('user', 'account', 'entry_type', 'amount', 'journal', 'transaction', 'created_at')
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+class BalanceCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('user', 'balance', 'last_entry_id', 'created_at')
+    list_filter = ('created_at',)
+    search_fields = ('user__email', 'user__username')
+    readonly_fields = ('created_at',)
+
+class DailySpendAdmin(admin.ModelAdmin):
+    list_display = ('user', 'day', 'category', 'transaction_type', 'count', 'total')
+    list_filter = ('category', 'transaction_type', 'day')
+    search_fields = ('user__email', 'user__username')
+
+class BillerAdmin(admin.ModelAdmin):
+    list_display = ('code', 'name', 'category', 'has_products', 'minimum', 'maximum')
+    list_filter = ('category', 'has_products')
+    search_fields = ('code', 'name')
+
+class BillerProductAdmin(admin.ModelAdmin):
+    list_display = ('biller_code', 'code', 'name', 'amount', 'validity')
+    list_filter = ('biller_code',)
+    search_fields = ('code', 'name')
+
+class WalletHoldAdmin(admin.ModelAdmin):
+    list_display = ('user', 'amount', 'status', 'transaction', 'created_at', 'settled_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('user__email', 'user__username', 'transaction__reference')
+    readonly_fields = ('user', 'amount', 'status', 'transaction', 'created_at', 'settled_at')
+
 admin.site.register(Transaction, TransactionAdmin)
 admin.site.register(TransactionFee, TransactionFeeAdmin)
 admin.site.register(CryptoTransaction, CryptoTransactionAdmin)
 admin.site.register(AirtimeTransaction, AirtimeTransactionAdmin)
 admin.site.register(DataTransaction, DataTransactionAdmin)
+admin.site.register(LedgerEntry, LedgerEntryAdmin)
+admin.site.register(BalanceCheckpoint, BalanceCheckpointAdmin)
+admin.site.register(DailySpend, DailySpendAdmin)
+admin.site.register(Biller, BillerAdmin)
+admin.site.register(BillerProduct, BillerProductAdmin)
+admin.site.register(WalletHold, WalletHoldAdmin)
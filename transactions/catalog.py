@@ -0,0 +1,291 @@
+"""
+Local catalog of Yanga billers and products.
+
+Billers (per category) and products (per biller) are stored in the ``Biller``
+and ``BillerProduct`` tables and held in a per-process in-memory index of
+ready-to-serve lists. Reads are stale-while-revalidate: once an entry is older
+than ``YANGA_CATALOG_TTL`` it is still served, and a background thread
+refreshes it. Only a cold miss (nothing stored yet) waits on Yanga.
+
+A refresh first checks whether another process has already refreshed the
+entry, and if so reloads it from the database instead of calling Yanga.
+
+``abillers``/``aproducts`` are the same reads for async views: a warm entry
+is served from memory, and a cold miss calls Yanga without blocking a thread.
+
+Products are only fetched for biller codes found in the biller lists, so a
+made-up code is never stored (and then refreshed along with the rest).
+"""
+import logging
+import threading
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction as db_transaction
+from django.utils import timezone
+
+from . import yanga
+from .models import Biller, BillerProduct, CatalogRefresh
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES = ['airtime', 'data_bundle']
+
+
+class CatalogError(Exception):
+    """Raised when Yanga answers a catalog request with ``success: false``."""
+
+
+# key -> (refreshed_at, entries)
+_index = {}
+_refreshing = set()
+_lock = threading.Lock()
+
+
+def _ttl():
+    return timedelta(seconds=settings.YANGA_CATALOG_TTL)
+
+
+def _decimal(value):
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        return None
+
+
+def _payload_list(response, name):
+    response.raise_for_status()
+    data = response.json()
+    if not isinstance(data, dict):
+        raise ValueError(f"Expected dict response, got {type(data).__name__}")
+    if not data.get('success'):
+        raise CatalogError(data.get('message', f'Yanga returned no {name} ({response.status_code})'))
+    payload = data.get('data') or []
+    if isinstance(payload, dict):
+        payload = payload.get(name, [])
+    return [item for item in payload if isinstance(item, dict)]
+
+
+def _number(value):
+    # Entries are served as JSON, where Yanga's amounts are numbers, not strings
+    return None if value is None else float(value)
+
+
+def _biller_entry(biller):
+    return {
+        'code': biller.code,
+        'name': biller.name,
+        'has_products': biller.has_products,
+        'minimum': _number(biller.minimum),
+        'maximum': _number(biller.maximum),
+        'category': biller.category,
+    }
+
+
+def _product_entry(product):
+    return {
+        'code': product.code,
+        'name': product.name,
+        'amount': _number(product.amount),
+        'description': product.description,
+        'validity': product.validity,
+    }
+
+
+def _save_billers(category, items):
+    billers = [
+        Biller(
+            code=item.get('code', ''),
+            name=item.get('name', ''),
+            category=category,
+            has_products=bool(item.get('has_products', False)),
+            minimum=_decimal(item.get('minimum')),
+            maximum=_decimal(item.get('maximum')),
+        )
+        for item in items if item.get('code')
+    ]
+    Biller.objects.filter(category=category).exclude(code__in=[b.code for b in billers]).delete()
+    Biller.objects.bulk_create(
+        billers,
+        update_conflicts=True,
+        unique_fields=['category', 'code'],
+        update_fields=['name', 'has_products', 'minimum', 'maximum'],
+    )
+
+
+def _save_products(biller_code, items):
+    products = [
+        BillerProduct(
+            biller_code=biller_code,
+            code=item.get('code', ''),
+            name=item.get('name', ''),
+            amount=_decimal(item.get('amount')) or 0,
+            description=item.get('description') or '',
+            validity=item.get('validity') or '',
+        )
+        for item in items if item.get('code')
+    ]
+    BillerProduct.objects.filter(biller_code=biller_code).exclude(code__in=[p.code for p in products]).delete()
+    BillerProduct.objects.bulk_create(
+        products,
+        update_conflicts=True,
+        unique_fields=['biller_code', 'code'],
+        update_fields=['name', 'amount', 'description', 'validity'],
+    )
+
+
+# key prefix -> (Yanga path, payload name, save, load)
+_KINDS = {
+    'billers': (
+        'bill-payments/billers/{}', 'billers', _save_billers,
+        lambda category: [_biller_entry(b) for b in Biller.objects.filter(category=category)],
+    ),
+    'products': (
+        'bill-payments/products/{}', 'products', _save_products,
+        lambda biller_code: [_product_entry(p) for p in BillerProduct.objects.filter(biller_code=biller_code)],
+    ),
+}
+
+
+def _load(key):
+    """
+    Load ``key`` from the database into the index. Returns the entry, or
+    ``None`` if it has never been fetched.
+    """
+    marker = CatalogRefresh.objects.filter(key=key).first()
+    if marker is None:
+        return None
+    kind, name = key.split(':', 1)
+    entry = (marker.refreshed_at, _KINDS[kind][3](name))
+    _index[key] = entry
+    return entry
+
+
+def _store(key, items):
+    kind, name = key.split(':', 1)
+    now = timezone.now()
+    with db_transaction.atomic():
+        _KINDS[kind][2](name, items)
+        CatalogRefresh.objects.update_or_create(key=key, defaults={'refreshed_at': now})
+    return _load(key)[1]
+
+
+def refresh(key):
+    """
+    Fetch ``key`` from Yanga and store it. Returns the entries.
+    """
+    kind, name = key.split(':', 1)
+    path, payload_name, _, _ = _KINDS[kind]
+    return _store(key, _payload_list(yanga.get(path.format(name)), payload_name))
+
+
+async def arefresh(key):
+    """
+    Async ``refresh``.
+    """
+    kind, name = key.split(':', 1)
+    path, payload_name, _, _ = _KINDS[kind]
+    items = _payload_list(await yanga.aget(path.format(name)), payload_name)
+    return await sync_to_async(_store)(key, items)
+
+
+def _revalidate(key):
+    try:
+        # Another process may have refreshed it already
+        entry = _load(key)
+        if entry is None or timezone.now() - entry[0] > _ttl():
+            refresh(key)
+    except Exception:
+        logger.exception('Catalog refresh failed for %s', key)
+    finally:
+        with _lock:
+            _refreshing.discard(key)
+        connection.close()
+
+
+def _serve(key, entry):
+    refreshed_at, entries = entry
+    if timezone.now() - refreshed_at > _ttl():
+        with _lock:
+            start = key not in _refreshing
+            _refreshing.add(key)
+        if start:
+            threading.Thread(target=_revalidate, args=(key,), daemon=True).start()
+    return entries
+
+
+def _unknown_biller(biller_code):
+    return CatalogError(f'Unknown biller {biller_code}')
+
+
+def _get(key):
+    entry = _index.get(key) or _load(key)
+    if entry is None:
+        kind, name = key.split(':', 1)
+        if kind == 'products' and not is_biller(name):
+            raise _unknown_biller(name)
+        return refresh(key)
+    return _serve(key, entry)
+
+
+async def _aget(key):
+    entry = _index.get(key) or await sync_to_async(_load)(key)
+    if entry is None:
+        kind, name = key.split(':', 1)
+        if kind == 'products' and not await ais_biller(name):
+            raise _unknown_biller(name)
+        return await arefresh(key)
+    return _serve(key, entry)
+
+
+def billers(category):
+    """
+    Return the billers of ``category`` as dicts ready to serialize.
+    """
+    return _get(f'billers:{category}')
+
+
+def products(biller_code):
+    """
+    Return the products of ``biller_code`` as dicts ready to serialize.
+    """
+    return _get(f'products:{biller_code}')
+
+
+async def abillers(category):
+    return await _aget(f'billers:{category}')
+
+
+async def aproducts(biller_code):
+    return await _aget(f'products:{biller_code}')
+
+
+def is_biller(biller_code):
+    """
+    Whether ``biller_code`` is in the biller list of one of ``CATEGORIES``.
+    """
+    return any(biller['code'] == biller_code for category in CATEGORIES for biller in billers(category))
+
+
+async def ais_biller(biller_code):
+    for category in CATEGORIES:
+        if any(biller['code'] == biller_code for biller in await abillers(category)):
+            return True
+    return False
+
+
+def requires_product_code(biller_code):
+    """
+    Whether purchases from ``biller_code`` must name one of its products.
+    """
+    for category in CATEGORIES:
+        entry = _index.get(f'billers:{category}')
+        for biller in entry[1] if entry else []:
+            if biller['code'] == biller_code and not biller['has_products']:
+                # The catalog already says there is nothing to choose from
+                return False
+    return bool(products(biller_code))
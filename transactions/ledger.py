@@ -0,0 +1,132 @@
+"""
+Append-only double-entry ledger for wallet funds.
+
+``post`` writes a balanced set of ``LedgerEntry`` legs in one INSERT, and
+``post_many`` writes many such journals in one INSERT. Entries
+are never updated, so concurrent postings do not contend on any shared row.
+``checkpoint`` periodically records per-user balances so that ``balance_as_of``
+only has to sum the entries written since the last checkpoint. Balances held
+before the ledger existed were posted as opening journals against the
+``external`` account (migration 0014).
+"""
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db.models import Case, DecimalField, F, Max, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import BalanceCheckpoint, LedgerEntry
+
+# Entries younger than this are left for the next checkpoint run, so that a
+# posting still in flight when the run starts is never skipped over.
+CHECKPOINT_LAG = timedelta(minutes=5)
+
+_SIGNED_AMOUNT = Case(
+    When(entry_type='credit', then=F('amount')),
+    default=-F('amount'),
+    output_field=DecimalField(max_digits=15, decimal_places=2),
+)
+
+
+def _journal(legs, transaction):
+    journal = uuid.uuid4()
+    entries = [
+        LedgerEntry(
+            user=user,
+            account=account,
+            entry_type=entry_type,
+            amount=amount,
+            journal=journal,
+            transaction=transaction,
+        )
+        for user, account, entry_type, amount in legs
+    ]
+    debits = sum(e.amount for e in entries if e.entry_type == 'debit')
+    credits = sum(e.amount for e in entries if e.entry_type == 'credit')
+    if debits != credits:
+        raise ValueError(f'Unbalanced journal: debits {debits} != credits {credits}')
+    return entries
+
+
+def post(legs, transaction=None):
+    """
+    Write one balanced journal.
+
+    ``legs`` is an iterable of ``(user, account, entry_type, amount)`` tuples.
+    Raises ``ValueError`` if debits and credits do not net to zero.
+    """
+    return LedgerEntry.objects.bulk_create(_journal(legs, transaction))
+
+
+def post_many(journals):
+    """
+    Write several balanced journals, given as ``(legs, transaction)`` pairs.
+
+    Raises ``ValueError`` (and writes nothing) if any of them is unbalanced.
+    """
+    entries = [entry for legs, transaction in journals for entry in _journal(legs, transaction)]
+    return LedgerEntry.objects.bulk_create(entries)
+
+
+def _latest_checkpoint(user, when=None):
+    checkpoints = BalanceCheckpoint.objects.filter(user=user)
+    if when is not None:
+        checkpoints = checkpoints.filter(created_at__lte=when)
+    return checkpoints.order_by('-last_entry_id').first()
+
+
+def balance_as_of(user, when=None):
+    """
+    Wallet balance of ``user`` according to the ledger at ``when`` (default: now).
+    """
+    checkpoint = _latest_checkpoint(user, when)
+    entries = LedgerEntry.objects.filter(user=user, account='wallet')
+    if checkpoint:
+        entries = entries.filter(id__gt=checkpoint.last_entry_id)
+    if when is not None:
+        entries = entries.filter(created_at__lte=when)
+    delta = entries.aggregate(total=Sum(_SIGNED_AMOUNT))['total'] or 0
+    return (checkpoint.balance if checkpoint else 0) + delta
+
+
+def checkpoint(user_ids):
+    """
+    Record a checkpoint for each of ``user_ids`` that has new wallet entries.
+
+    Returns the number of checkpoints written.
+    """
+    upto = LedgerEntry.objects.filter(
+        created_at__lt=timezone.now() - CHECKPOINT_LAG
+    ).aggregate(upto=Max('id'))['upto']
+    if upto is None:
+        return 0
+
+    latest = BalanceCheckpoint.objects.filter(user=OuterRef('user')).order_by('-last_entry_id')
+    deltas = (
+        LedgerEntry.objects.filter(user_id__in=user_ids, account='wallet', id__lte=upto)
+        .annotate(since=Coalesce(Subquery(latest.values('last_entry_id')[:1]), Value(0)))
+        .filter(id__gt=F('since'))
+        .values('user_id')
+        .annotate(delta=Sum(_SIGNED_AMOUNT))
+        .order_by()
+    )
+    deltas = {row['user_id']: row['delta'] for row in deltas}
+    if not deltas:
+        return 0
+
+    previous = dict(
+        get_user_model().objects.filter(pk__in=deltas)
+        .annotate(balance=Subquery(
+            BalanceCheckpoint.objects.filter(user=OuterRef('pk'))
+            .order_by('-last_entry_id').values('balance')[:1]
+        ))
+        .values_list('pk', 'balance')
+    )
+
+    BalanceCheckpoint.objects.bulk_create([
+        BalanceCheckpoint(user_id=user_id, balance=(previous.get(user_id) or 0) + delta, last_entry_id=upto)
+        for user_id, delta in deltas.items()
+    ])
+    return len(deltas)
@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from transactions import ledger
+from transactions.models import LedgerEntry
+
+
+class Command(BaseCommand):
+    help = 'Record wallet balance checkpoints for users with new ledger entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of users to checkpoint per batch')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        # Walk users in primary-key order so each batch is a short transaction.
+        user_ids = (
+            get_user_model().objects.filter(
+                pk__in=LedgerEntry.objects.values('user_id')
+            ).order_by('pk').values_list('pk', flat=True)
+        )
+        written = 0
+        last_id = 0
+        while True:
+            chunk = list(user_ids.filter(pk__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            written += ledger.checkpoint(chunk)
+            last_id = chunk[-1]
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} balance checkpoints'))
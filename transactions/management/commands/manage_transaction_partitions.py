@@ -0,0 +1,34 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions import partitions
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming monthly transaction partitions and archive old ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=partitions.AHEAD_MONTHS,
+                            help='Number of future months to keep partitions for')
+        parser.add_argument('--retain-months', type=int, default=None,
+                            help='Archive partitions older than this many months '
+                                 '(default: archive nothing)')
+
+    def handle(self, *args, **options):
+        if options['ahead'] < 0:
+            raise CommandError('--ahead must not be negative')
+
+        created = partitions.create_partitions(ahead=options['ahead'])
+        for name in created:
+            self.stdout.write(f'Created partition {name}')
+
+        retain = options['retain_months']
+        if retain is not None:
+            if retain < 1:
+                raise CommandError('--retain-months must be at least 1')
+            cutoff = partitions.add_months(date.today().replace(day=1), -retain + 1)
+            for name, rows in partitions.archive_before(cutoff).items():
+                self.stdout.write(f'Archived {rows} transactions from {name}')
+
+        self.stdout.write(self.style.SUCCESS('Done'))
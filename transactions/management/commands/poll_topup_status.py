@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions import topups
+
+
+class Command(BaseCommand):
+    help = 'Fail unsent airtime and data purchases, and look up pending ones with Yanga to settle the finished ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Number of pending purchases looked up and settled together')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Maximum number of status lookups in flight')
+        parser.add_argument('--min-age', type=int, default=60,
+                            help='Only look up purchases pending for at least this many seconds')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['workers'] < 1 or options['min_age'] < 0:
+            raise CommandError('--batch-size and --workers must be at least 1 and --min-age not negative')
+
+        totals = topups.poll_pending(
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            min_age=timedelta(seconds=options['min_age']),
+        )
+        if not settings.YANGA_STATUS_PATH:
+            self.stdout.write(self.style.WARNING(
+                'YANGA_STATUS_PATH is not set; only top-ups that were never sent were settled'
+            ))
+        if totals['review']:
+            self.stdout.write(self.style.ERROR(
+                f"Flagged {totals['review']} top-ups pending for over {settings.YANGA_REVIEW_AFTER}s "
+                f"for review; settle them from the transactions admin"
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f"Completed {totals['completed']}, failed {totals['failed']}, "
+            f"still pending {totals['pending']}"
+        ))
@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from transactions import rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily spend rollups from the transaction history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of users to rebuild per batch')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        user_ids = get_user_model().objects.order_by('pk').values_list('pk', flat=True)
+        rebuilt = 0
+        last_id = 0
+        while True:
+            chunk = list(user_ids.filter(pk__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            rollups.rebuild(chunk)
+            rebuilt += len(chunk)
+            last_id = chunk[-1]
+            self.stdout.write(f'Rebuilt rollups for {rebuilt} users')
+        self.stdout.write(self.style.SUCCESS(f'Done: {rebuilt} users'))
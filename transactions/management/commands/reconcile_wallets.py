@@ -0,0 +1,105 @@
+import csv
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from transactions import reconcile
+
+
+def _init_worker():
+    # Forked workers must not reuse the parent's database connection
+    connections.close_all()
+
+
+def _reconcile_range(start, end):
+    return start, reconcile.drift(start, end)
+
+
+class Command(BaseCommand):
+    help = 'Compare wallet balances with the transaction history and report drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Number of user ids per range')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of worker processes')
+        parser.add_argument('--report', default='wallet_drift.csv',
+                            help='CSV file the drifting users are appended to')
+        parser.add_argument('--checkpoint', default='wallet_drift.checkpoint.json',
+                            help='File recording the ranges already reconciled')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore any checkpoint and start a new report')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1 or options['workers'] < 1:
+            raise CommandError('--chunk-size and --workers must be at least 1')
+
+        state = self.load_checkpoint(options)
+        if state is None:
+            bounds = reconcile.id_bounds()
+            if bounds is None:
+                self.stdout.write(self.style.SUCCESS('No users to reconcile'))
+                return
+            # Users created after the run starts are left for the next run
+            state = {'chunk_size': chunk_size, 'min_id': bounds[0], 'max_id': bounds[1], 'done': []}
+            with open(options['report'], 'w', newline='') as report:
+                csv.writer(report).writerow(['user_id', 'wallet_balance', 'expected_balance', 'drift'])
+            self.save_checkpoint(options['checkpoint'], state)
+        elif state['chunk_size'] != chunk_size:
+            raise CommandError(
+                f"Checkpoint was written with --chunk-size {state['chunk_size']}; "
+                f"use the same size or pass --restart"
+            )
+
+        done = set(state['done'])
+        starts = [
+            start for start in range(state['min_id'], state['max_id'] + 1, chunk_size)
+            if start not in done
+        ]
+        self.stdout.write(f'{len(starts)} ranges to reconcile ({len(done)} already done)')
+
+        drifting = 0
+        total_drift = Decimal('0')
+        connections.close_all()
+        executor = ProcessPoolExecutor(
+            max_workers=options['workers'],
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_init_worker,
+        )
+        with executor, open(options['report'], 'a', newline='') as report:
+            writer = csv.writer(report)
+            futures = [executor.submit(_reconcile_range, start, start + chunk_size) for start in starts]
+            for future in as_completed(futures):
+                start, rows = future.result()
+                for user_id, balance, expected in rows:
+                    writer.writerow([user_id, balance, expected, balance - expected])
+                    total_drift += abs(balance - expected)
+                drifting += len(rows)
+                # Only mark the range done once its rows are on disk
+                report.flush()
+                os.fsync(report.fileno())
+                state['done'].append(start)
+                self.save_checkpoint(options['checkpoint'], state)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Done: {drifting} drifting users in this run (total absolute drift {total_drift}); '
+            f"report in {options['report']}"
+        ))
+
+    def load_checkpoint(self, options):
+        if options['restart'] or not os.path.exists(options['checkpoint']):
+            return None
+        with open(options['checkpoint']) as f:
+            return json.load(f)
+
+    def save_checkpoint(self, path, state):
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
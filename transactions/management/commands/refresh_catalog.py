@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+
+from transactions import catalog
+from transactions.models import Biller, BillerProduct, CatalogRefresh
+
+
+class Command(BaseCommand):
+    help = 'Refresh the local Yanga biller and product catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--category', action='append', choices=catalog.CATEGORIES,
+                            help='Only refresh this category (repeatable)')
+
+    def handle(self, *args, **options):
+        categories = options['category'] or catalog.CATEGORIES
+        failed = 0
+        for category in categories:
+            try:
+                billers = catalog.refresh(f'billers:{category}')
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'Failed to refresh {category} billers: {e}')
+                continue
+            self.stdout.write(f'Refreshed {len(billers)} {category} billers')
+
+        # Products of billers that list them, plus any known biller already looked up
+        known = set(Biller.objects.values_list('code', flat=True))
+        biller_codes = set(Biller.objects.filter(category__in=categories, has_products=True).values_list('code', flat=True))
+        looked_up = {
+            key.split(':', 1)[1]
+            for key in CatalogRefresh.objects.filter(key__startswith='products:').values_list('key', flat=True)
+        }
+        biller_codes.update(looked_up & known)
+        gone = looked_up - known
+        if gone:
+            CatalogRefresh.objects.filter(key__in=[f'products:{code}' for code in gone]).delete()
+            BillerProduct.objects.filter(biller_code__in=gone).delete()
+            self.stdout.write(f'Dropped products of {len(gone)} unknown billers')
+        for biller_code in sorted(biller_codes):
+            try:
+                products = catalog.refresh(f'products:{biller_code}')
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'Failed to refresh products for {biller_code}: {e}')
+                continue
+            self.stdout.write(f'Refreshed {len(products)} products for {biller_code}')
+
+        if failed:
+            self.stdout.write(self.style.WARNING(f'Done with {failed} failures'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Done'))
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Index builds run CONCURRENTLY so the table stays writable during deploys.
+    atomic = False
+
+    dependencies = [
+        ('transactions', '0003_ledgerentry_balancecheckpoint'),
+        ('users', '0003_add_is_verified_field'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        RemoveIndexConcurrently(
+            model_name='transaction',
+            name='transaction_referen_923a88_idx',
+        ),
+        RemoveIndexConcurrently(
+            model_name='transaction',
+            name='transaction_status_71abbb_idx',
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to=settings.AUTH_USER_MODEL),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'category', 'created_at'], name='tx_user_category_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'status', 'created_at'], name='tx_user_status_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'transaction_type', 'created_at'], name='tx_user_type_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['created_at'], name='tx_pending_created_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0004_transaction_history_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySpend',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category', models.CharField(choices=[('transfer', 'Transfer'), ('withdrawal', 'Withdrawal'), ('deposit', 'Deposit'), ('airtime', 'Airtime Purchase'), ('data', 'Data Purchase'), ('cable_tv', 'Cable TV'), ('crypto_sell', 'Crypto Sale'), ('crypto_buy', 'Crypto Purchase'), ('bill_payment', 'Bill Payment')], max_length=20)),
+                ('transaction_type', models.CharField(choices=[('credit', 'Credit'), ('debit', 'Debit')], max_length=10)),
+                ('count', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_spend', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'daily spend',
+                'ordering': ['-day'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'day', 'category', 'transaction_type'), name='daily_spend_unique_key')],
+            },
+        ),
+    ]
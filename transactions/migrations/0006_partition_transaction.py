@@ -0,0 +1,149 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:42
+#
+# Converts transactions_transaction into a table range-partitioned by month on
+# created_at. PostgreSQL requires every unique constraint on a partitioned
+# table to include the partition key, so the primary key becomes
+# (id, created_at), reference is unique together with created_at, and the
+# tables pointing at a transaction lose their database-level foreign keys
+# (Django still enforces on_delete in Python).
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+PARTITION_SQL = """
+ALTER TABLE transactions_transaction RENAME TO transactions_transaction_unpartitioned;
+
+CREATE TABLE transactions_transaction (
+    LIKE transactions_transaction_unpartitioned INCLUDING DEFAULTS INCLUDING IDENTITY
+) PARTITION BY RANGE (created_at);
+
+-- One partition per month from the oldest row to a year ahead;
+-- manage_transaction_partitions keeps creating them after that.
+DO $$
+DECLARE
+    month_start timestamptz := date_trunc('month', coalesce(
+        (SELECT min(created_at) FROM transactions_transaction_unpartitioned), now()
+    ));
+    last_month timestamptz := date_trunc('month', now()) + interval '12 months';
+BEGIN
+    WHILE month_start <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF transactions_transaction FOR VALUES FROM (%L) TO (%L)',
+            'transactions_transaction_p' || to_char(month_start, 'YYYYMM'),
+            month_start,
+            month_start + interval '1 month'
+        );
+        month_start := month_start + interval '1 month';
+    END LOOP;
+END $$;
+
+INSERT INTO transactions_transaction SELECT * FROM transactions_transaction_unpartitioned;
+DROP TABLE transactions_transaction_unpartitioned;
+
+ALTER TABLE transactions_transaction
+    ADD CONSTRAINT transactions_transaction_pkey PRIMARY KEY (id, created_at),
+    ADD CONSTRAINT tx_reference_created_uniq UNIQUE (reference, created_at),
+    ADD CONSTRAINT transactions_transac_user_id_b9ecc248_fk_users_cus
+        FOREIGN KEY (user_id) REFERENCES users_customuser (id) DEFERRABLE INITIALLY DEFERRED,
+    ADD CONSTRAINT transactions_transac_recipient_id_d1fdbf2f_fk_users_cus
+        FOREIGN KEY (recipient_id) REFERENCES users_customuser (id) DEFERRABLE INITIALLY DEFERRED,
+    ADD CONSTRAINT transactions_transac_bank_account_id_82683e60_fk_users_ban
+        FOREIGN KEY (bank_account_id) REFERENCES users_bankaccount (id) DEFERRABLE INITIALLY DEFERRED;
+
+CREATE INDEX transaction_user_id_f5864b_idx ON transactions_transaction (user_id, created_at);
+CREATE INDEX tx_user_category_created_idx ON transactions_transaction (user_id, category, created_at);
+CREATE INDEX tx_user_status_created_idx ON transactions_transaction (user_id, status, created_at);
+CREATE INDEX tx_user_type_created_idx ON transactions_transaction (user_id, transaction_type, created_at);
+CREATE INDEX tx_pending_created_idx ON transactions_transaction (created_at) WHERE status = 'pending';
+CREATE INDEX transactions_transaction_recipient_id_d1fdbf2f ON transactions_transaction (recipient_id);
+CREATE INDEX transactions_transaction_bank_account_id_82683e60 ON transactions_transaction (bank_account_id);
+
+SELECT setval(pg_get_serial_sequence('transactions_transaction', 'id'), coalesce(max(id), 0) + 1, false)
+FROM transactions_transaction;
+"""
+
+UNPARTITION_SQL = """
+ALTER TABLE transactions_transaction RENAME TO transactions_transaction_partitioned;
+
+CREATE TABLE transactions_transaction (
+    LIKE transactions_transaction_partitioned INCLUDING DEFAULTS INCLUDING IDENTITY
+);
+
+INSERT INTO transactions_transaction SELECT * FROM transactions_transaction_partitioned;
+DROP TABLE transactions_transaction_partitioned;
+
+ALTER TABLE transactions_transaction
+    ADD CONSTRAINT transactions_transaction_pkey PRIMARY KEY (id),
+    ADD CONSTRAINT transactions_transaction_reference_key UNIQUE (reference),
+    ADD CONSTRAINT transactions_transac_user_id_b9ecc248_fk_users_cus
+        FOREIGN KEY (user_id) REFERENCES users_customuser (id) DEFERRABLE INITIALLY DEFERRED,
+    ADD CONSTRAINT transactions_transac_recipient_id_d1fdbf2f_fk_users_cus
+        FOREIGN KEY (recipient_id) REFERENCES users_customuser (id) DEFERRABLE INITIALLY DEFERRED,
+    ADD CONSTRAINT transactions_transac_bank_account_id_82683e60_fk_users_ban
+        FOREIGN KEY (bank_account_id) REFERENCES users_bankaccount (id) DEFERRABLE INITIALLY DEFERRED;
+
+CREATE INDEX transactions_transaction_reference_65ce6e73_like
+    ON transactions_transaction (reference varchar_pattern_ops);
+CREATE INDEX transaction_user_id_f5864b_idx ON transactions_transaction (user_id, created_at);
+CREATE INDEX tx_user_category_created_idx ON transactions_transaction (user_id, category, created_at);
+CREATE INDEX tx_user_status_created_idx ON transactions_transaction (user_id, status, created_at);
+CREATE INDEX tx_user_type_created_idx ON transactions_transaction (user_id, transaction_type, created_at);
+CREATE INDEX tx_pending_created_idx ON transactions_transaction (created_at) WHERE status = 'pending';
+CREATE INDEX transactions_transaction_recipient_id_d1fdbf2f ON transactions_transaction (recipient_id);
+CREATE INDEX transactions_transaction_bank_account_id_82683e60 ON transactions_transaction (bank_account_id);
+
+SELECT setval(pg_get_serial_sequence('transactions_transaction', 'id'), coalesce(max(id), 0) + 1, false)
+FROM transactions_transaction;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0005_dailyspend'),
+        ('users', '0003_add_is_verified_field'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='airtimetransaction',
+            name='transaction',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='airtime_details', to='transactions.transaction'),
+        ),
+        migrations.AlterField(
+            model_name='cryptotransaction',
+            name='transaction',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='crypto_details', to='transactions.transaction'),
+        ),
+        migrations.AlterField(
+            model_name='datatransaction',
+            name='transaction',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='data_details', to='transactions.transaction'),
+        ),
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='transaction',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='transactions.transaction'),
+        ),
+        migrations.AlterField(
+            model_name='transactionfee',
+            name='transaction',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='fee', to='transactions.transaction'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(PARTITION_SQL, reverse_sql=UNPARTITION_SQL),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='transaction',
+                    name='reference',
+                    field=models.CharField(blank=True, max_length=255, null=True),
+                ),
+                migrations.AddConstraint(
+                    model_name='transaction',
+                    constraint=models.UniqueConstraint(fields=('reference', 'created_at'), name='tx_reference_created_uniq'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0006_partition_transaction'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTransaction',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('transaction_type', models.CharField(choices=[('credit', 'Credit'), ('debit', 'Debit')], max_length=10)),
+                ('category', models.CharField(choices=[('transfer', 'Transfer'), ('withdrawal', 'Withdrawal'), ('deposit', 'Deposit'), ('airtime', 'Airtime Purchase'), ('data', 'Data Purchase'), ('cable_tv', 'Cable TV'), ('crypto_sell', 'Crypto Sale'), ('crypto_buy', 'Crypto Purchase'), ('bill_payment', 'Bill Payment')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], max_length=10)),
+                ('description', models.TextField()),
+                ('reference', models.CharField(blank=True, max_length=255, null=True)),
+                ('metadata', models.JSONField(blank=True, default=dict)),
+                ('recipient_id', models.BigIntegerField(blank=True, null=True)),
+                ('recipient_email', models.EmailField(blank=True, max_length=254, null=True)),
+                ('bank_account_id', models.BigIntegerField(blank=True, null=True)),
+                ('details', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_transactions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', 'created_at'], name='archived_tx_user_created_idx')],
+            },
+        ),
+        # Keep the wide columns compressed inline, and try compression on any
+        # row over 128 bytes rather than the default ~2kB.
+        migrations.RunSQL(
+            """
+            ALTER TABLE transactions_archivedtransaction
+                ALTER COLUMN description SET STORAGE MAIN,
+                ALTER COLUMN metadata SET STORAGE MAIN,
+                ALTER COLUMN details SET STORAGE MAIN,
+                SET (toast_tuple_target = 128);
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:45
+
+import transactions.references
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0007_archivedtransaction'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='reference',
+            field=models.CharField(blank=True, default=transactions.references.new_reference, max_length=255, null=True),
+        ),
+    ]
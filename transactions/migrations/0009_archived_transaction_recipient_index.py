@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0008_transaction_reference_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedtransaction',
+            index=models.Index(condition=models.Q(('category', 'transfer')), fields=['recipient_id'], name='archived_tx_recipient_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0009_archived_transaction_recipient_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogRefresh',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Biller',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=50)),
+                ('name', models.CharField(max_length=255)),
+                ('category', models.CharField(max_length=50)),
+                ('has_products', models.BooleanField(default=False)),
+                ('minimum', models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True)),
+                ('maximum', models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True)),
+            ],
+            options={
+                'ordering': ['category', 'name'],
+                'constraints': [models.UniqueConstraint(fields=('category', 'code'), name='biller_unique_code')],
+            },
+        ),
+        migrations.CreateModel(
+            name='BillerProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('biller_code', models.CharField(max_length=50)),
+                ('code', models.CharField(max_length=100)),
+                ('name', models.CharField(max_length=255)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('description', models.TextField(blank=True)),
+                ('validity', models.CharField(blank=True, max_length=100)),
+            ],
+            options={
+                'ordering': ['biller_code', 'amount'],
+                'constraints': [models.UniqueConstraint(fields=('biller_code', 'code'), name='biller_product_unique_code')],
+            },
+        ),
+    ]
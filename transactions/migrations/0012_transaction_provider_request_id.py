@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0011_wallethold'),
+        ('users', '0004_user_held_balance'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='provider_request_id',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='provider_request_id',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        # Top-ups reserved before this column kept the id only in their metadata
+        migrations.RunSQL(
+            "UPDATE transactions_transaction "
+            "SET provider_request_id = metadata->'request'->>'request_id' "
+            "WHERE metadata ? 'request' AND provider_request_id IS NULL",
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('provider_request_id__isnull', False)), fields=['provider_request_id'], name='tx_provider_request_idx'),
+        ),
+    ]
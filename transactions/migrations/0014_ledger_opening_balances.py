@@ -0,0 +1,61 @@
+import uuid
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Case, DecimalField, F, Sum, When
+
+
+def post_opening_balances(apps, schema_editor):
+    """
+    Post one opening journal per wallet whose balance the ledger does not yet
+    account for (wallets that existed before the ledger), against the
+    ``external`` account, so that the ledger and ``wallet_balance`` agree.
+    """
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    LedgerEntry = apps.get_model('transactions', 'LedgerEntry')
+    signed = Case(
+        When(entry_type='credit', then=F('amount')),
+        default=-F('amount'),
+        output_field=DecimalField(max_digits=15, decimal_places=2),
+    )
+
+    last_id = 0
+    while True:
+        users = list(
+            User.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', 'wallet_balance')[:1000]
+        )
+        if not users:
+            break
+        last_id = users[-1][0]
+        posted = dict(
+            LedgerEntry.objects.filter(user_id__in=[pk for pk, _ in users], account='wallet')
+            .values('user_id').annotate(total=Sum(signed)).order_by()
+            .values_list('user_id', 'total')
+        )
+        entries = []
+        for user_id, balance in users:
+            opening = balance - (posted.get(user_id) or 0)
+            if not opening:
+                continue
+            journal = uuid.uuid4()
+            wallet_leg, external_leg = ('credit', 'debit') if opening > 0 else ('debit', 'credit')
+            entries += [
+                LedgerEntry(user_id=user_id, account='external', entry_type=external_leg,
+                            amount=abs(opening), journal=journal),
+                LedgerEntry(user_id=user_id, account='wallet', entry_type=wallet_leg,
+                            amount=abs(opening), journal=journal),
+            ]
+        LedgerEntry.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0013_topupbatch'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Ledger entries are append-only, so there is nothing to undo
+        migrations.RunPython(post_opening_balances, migrations.RunPython.noop),
+    ]
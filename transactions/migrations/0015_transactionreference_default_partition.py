@@ -0,0 +1,72 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:33
+#
+# Two safety nets for the partitioned transactions table:
+#
+# - A DEFAULT partition, so that inserts still succeed if
+#   manage_transaction_partitions has not created the month's partition
+#   (the cron stopped, or the clock is off). create_partitions moves such rows
+#   into their month's partition once it is created.
+# - Global uniqueness of reference, which the partitioned table can only
+#   enforce together with created_at: a trigger records every reference in
+#   transactions_transactionreference, whose primary key rejects duplicates.
+
+from django.db import migrations, models
+
+DEFAULT_PARTITION_SQL = """
+CREATE TABLE transactions_transaction_default PARTITION OF transactions_transaction DEFAULT;
+"""
+
+DROP_DEFAULT_PARTITION_SQL = """
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM transactions_transaction_default) THEN
+        RAISE EXCEPTION 'transactions_transaction_default still holds rows; run manage_transaction_partitions first';
+    END IF;
+END $$;
+DROP TABLE transactions_transaction_default;
+"""
+
+REFERENCE_TRIGGER_SQL = """
+-- References that were already duplicated (per created_at) are kept once
+INSERT INTO transactions_transactionreference (reference)
+SELECT reference FROM transactions_transaction WHERE reference IS NOT NULL
+UNION
+SELECT reference FROM transactions_archivedtransaction WHERE reference IS NOT NULL
+ON CONFLICT DO NOTHING;
+
+CREATE FUNCTION transactions_record_reference() RETURNS trigger AS $$
+BEGIN
+    IF NEW.reference IS NOT NULL AND (TG_OP = 'INSERT' OR NEW.reference IS DISTINCT FROM OLD.reference) THEN
+        INSERT INTO transactions_transactionreference (reference) VALUES (NEW.reference);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER transactions_transaction_reference_uniq
+    AFTER INSERT OR UPDATE OF reference ON transactions_transaction
+    FOR EACH ROW EXECUTE FUNCTION transactions_record_reference();
+"""
+
+DROP_REFERENCE_TRIGGER_SQL = """
+DROP TRIGGER transactions_transaction_reference_uniq ON transactions_transaction;
+DROP FUNCTION transactions_record_reference();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0014_ledger_opening_balances'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionReference',
+            fields=[
+                ('reference', models.CharField(max_length=255, primary_key=True, serialize=False)),
+            ],
+        ),
+        migrations.RunSQL(DEFAULT_PARTITION_SQL, reverse_sql=DROP_DEFAULT_PARTITION_SQL),
+        migrations.RunSQL(REFERENCE_TRIGGER_SQL, reverse_sql=DROP_REFERENCE_TRIGGER_SQL),
+    ]
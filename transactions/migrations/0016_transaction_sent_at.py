@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:36
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_pending_sent(apps, schema_editor):
+    # Top-ups already pending may have reached Yanga; look them up, never fail them unsent
+    Transaction = apps.get_model('transactions', 'Transaction')
+    Transaction.objects.filter(status='pending', provider_request_id__isnull=False).update(sent_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0015_transactionreference_default_partition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_pending_sent, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# An UPDATE of created_at that moves a row to another partition is run as a
+# DELETE and an INSERT, so the reference trigger from 0015 saw the row's own
+# reference again and rejected it. A reference already recorded is now only
+# refused when another transaction, live or archived, holds it.
+
+from django.db import migrations
+
+RECORD_REFERENCE_SQL = """
+CREATE OR REPLACE FUNCTION transactions_record_reference() RETURNS trigger AS $$
+BEGIN
+    IF NEW.reference IS NOT NULL AND (TG_OP = 'INSERT' OR NEW.reference IS DISTINCT FROM OLD.reference) THEN
+        INSERT INTO transactions_transactionreference (reference) VALUES (NEW.reference)
+            ON CONFLICT DO NOTHING;
+        IF NOT FOUND AND (
+            EXISTS (SELECT 1 FROM transactions_transaction WHERE reference = NEW.reference AND id <> NEW.id)
+            OR EXISTS (SELECT 1 FROM transactions_archivedtransaction WHERE reference = NEW.reference AND id <> NEW.id)
+        ) THEN
+            RAISE unique_violation USING MESSAGE = format('Transaction reference %s is already used', NEW.reference);
+        END IF;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+PREVIOUS_RECORD_REFERENCE_SQL = """
+CREATE OR REPLACE FUNCTION transactions_record_reference() RETURNS trigger AS $$
+BEGIN
+    IF NEW.reference IS NOT NULL AND (TG_OP = 'INSERT' OR NEW.reference IS DISTINCT FROM OLD.reference) THEN
+        INSERT INTO transactions_transactionreference (reference) VALUES (NEW.reference);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0016_transaction_sent_at'),
+    ]
+
+    operations = [
+        migrations.RunSQL(RECORD_REFERENCE_SQL, reverse_sql=PREVIOUS_RECORD_REFERENCE_SQL),
+    ]
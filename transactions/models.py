@@ -2,6 +2,17 @@ from django.db import models
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 
+from .references import new_reference
+
+class TransactionQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # Rows built with an explicit empty reference still get one
+        objs = list(objs)
+        for obj in objs:
+            if not obj.reference:
+                obj.reference = new_reference()
+        return super().bulk_create(objs, *args, **kwargs)
+
 class Transaction(models.Model):
     TRANSACTION_TYPES = [
         ('credit', 'Credit'),
@@ -27,14 +38,20 @@ class Transaction(models.Model):
         ('bill_payment', 'Bill Payment'),
     ]
     
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='transactions')
+    # Covered by the (user, created_at) index below
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='transactions', db_index=False)
     transaction_type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
     category = models.CharField(max_length=20, choices=TRANSACTION_CATEGORIES)
     amount = models.DecimalField(max_digits=15, decimal_places=2)
     status = models.CharField(max_length=10, choices=TRANSACTION_STATUS, default='pending')
     description = models.TextField()
-    reference = models.CharField(max_length=255, unique=True, blank=True, null=True)
+    # Unique together with created_at (see Meta), as required by partitioning
+    reference = models.CharField(max_length=255, blank=True, null=True, default=new_reference)
     metadata = models.JSONField(default=dict, blank=True)
+    # The request_id sent to the bill-payment provider, for status lookups
+    provider_request_id = models.CharField(max_length=64, blank=True, null=True)
+    # When the purchase was (about to be) posted to the provider; see topups.claim
+    sent_at = models.DateTimeField(null=True, blank=True)
     
     # For transfers
     recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='received_transactions')
@@ -49,25 +66,60 @@ class Transaction(models.Model):
     completed_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
+        # The table is range-partitioned by month on created_at (migration
+        # 0006). Its primary key is (id, created_at) in the database, so rows
+        # pointing at a transaction cannot carry a database-level foreign key.
+        # For the same reason the constraint below only makes reference
+        # unique per created_at; TransactionReference keeps it unique.
         ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['reference', 'created_at'], name='tx_reference_created_uniq'),
+        ]
         indexes = [
             models.Index(fields=['user', 'created_at']),
-            models.Index(fields=['reference']),
-            models.Index(fields=['status']),
+            # Filtered history: one range scan per (user, filter value)
+            models.Index(fields=['user', 'category', 'created_at'], name='tx_user_category_created_idx'),
+            models.Index(fields=['user', 'status', 'created_at'], name='tx_user_status_created_idx'),
+            models.Index(fields=['user', 'transaction_type', 'created_at'], name='tx_user_type_created_idx'),
+            # Only pending rows, for sweepers looking for stuck transactions
+            models.Index(fields=['created_at'], condition=models.Q(status='pending'), name='tx_pending_created_idx'),
+            models.Index(fields=['provider_request_id'], condition=models.Q(provider_request_id__isnull=False), name='tx_provider_request_idx'),
         ]
     
+    objects = TransactionQuerySet.as_manager()
+    
     def __str__(self):
         return f"{self.user.username} - {self.transaction_type} - {self.amount} - {self.status}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so post_save can tell when it changes
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+    
     def save(self, *args, **kwargs):
         if not self.reference:
-            # Generate a unique reference if not provided
-            import uuid
-            self.reference = f"TX{str(uuid.uuid4()).replace('-', '').upper()[:12]}"
+            # Callers may pass reference=None explicitly
+            self.reference = new_reference()
         super().save(*args, **kwargs)
 
+class TransactionReference(models.Model):
+    """
+    Every reference ever given to a transaction, live or archived.
+
+    A partitioned table cannot have a unique constraint without the partition
+    key, so a trigger on ``Transaction`` (migration 0015) inserts each new
+    reference here, and a reused reference fails the insert with an
+    ``IntegrityError``.
+    """
+    reference = models.CharField(max_length=255, primary_key=True)
+
+    def __str__(self):
+        return self.reference
+
 class TransactionFee(models.Model):
-    transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE, related_name='fee')
+    transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE, related_name='fee', db_constraint=False)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -76,7 +128,7 @@ class TransactionFee(models.Model):
         return f"Fee for {self.transaction.reference}: {self.amount}"
 
 class CryptoTransaction(models.Model):
-    transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE, related_name='crypto_details')
+    transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE, related_name='crypto_details', db_constraint=False)
     cryptocurrency = models.CharField(max_length=50)  # BTC, ETH, USDT, etc.
     amount_crypto = models.DecimalField(max_digits=20, decimal_places=8)
     exchange_rate = models.DecimalField(max_digits=15, decimal_places=2)
@@ -87,7 +139,7 @@ class CryptoTransaction(models.Model):
         return f"{self.cryptocurrency} - {self.amount_crypto}"
 
 class AirtimeTransaction(models.Model):
-    transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE, related_name='airtime_details')
+    transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE, related_name='airtime_details', db_constraint=False)
     phone_number = models.CharField(max_length=15)
     network = models.CharField(max_length=50)
     plan_name = models.CharField(max_length=100, blank=True, null=True)
@@ -96,7 +148,7 @@ class AirtimeTransaction(models.Model):
         return f"{self.network} - {self.phone_number}"
 
 class DataTransaction(models.Model):
-    transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE, related_name='data_details')
+    transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE, related_name='data_details', db_constraint=False)
     phone_number = models.CharField(max_length=15)
     network = models.CharField(max_length=50)
     data_plan = models.CharField(max_length=100)
@@ -104,3 +156,250 @@ class DataTransaction(models.Model):
     
     def __str__(self):
         return f"{self.network} - {self.data_plan}"
+
+class LedgerEntryQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        raise TypeError('Ledger entries are append-only and cannot be updated')
+
+    def delete(self):
+        raise TypeError('Ledger entries are append-only and cannot be deleted')
+
+class LedgerEntry(models.Model):
+    """
+    One leg of a double-entry posting against a user's funds.
+
+    Entries are only ever inserted. Every posting writes a balanced set of legs
+    sharing a ``journal`` id: money leaving a wallet is a debit on the
+    ``wallet`` account, and the matching credit lands either on another wallet
+    (transfers) or on the ``external`` account (deposits, withdrawals,
+    purchases from providers).
+    """
+    ENTRY_TYPES = [
+        ('debit', 'Debit'),
+        ('credit', 'Credit'),
+    ]
+
+    ACCOUNTS = [
+        ('wallet', 'Wallet'),
+        ('external', 'External'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='ledger_entries')
+    account = models.CharField(max_length=10, choices=ACCOUNTS, default='wallet')
+    entry_type = models.CharField(max_length=10, choices=ENTRY_TYPES)
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    journal = models.UUIDField()
+    transaction = models.ForeignKey(Transaction, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries', db_constraint=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = LedgerEntryQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['id']
+        verbose_name_plural = 'ledger entries'
+        indexes = [
+            models.Index(fields=['user', 'account', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.account} {self.entry_type} - {self.amount}"
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise TypeError('Ledger entries are append-only and cannot be updated')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise TypeError('Ledger entries are append-only and cannot be deleted')
+
+class BalanceCheckpoint(models.Model):
+    """
+    Wallet balance of a user as of a given ledger entry.
+
+    Balance-as-of-time queries start from the latest checkpoint and only sum
+    the entries written after it.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='balance_checkpoints')
+    balance = models.DecimalField(max_digits=15, decimal_places=2)
+    last_entry_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.balance} at {self.created_at}"
+
+class DailySpend(models.Model):
+    """
+    Per-user daily totals of completed transactions.
+
+    Maintained incrementally by ``transactions.rollups`` as transactions
+    complete, so spending summaries read a handful of rows instead of
+    aggregating the user's whole history.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_spend')
+    day = models.DateField()
+    category = models.CharField(max_length=20, choices=Transaction.TRANSACTION_CATEGORIES)
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    count = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=17, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['-day']
+        verbose_name_plural = 'daily spend'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day', 'category', 'transaction_type'], name='daily_spend_unique_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.day} - {self.category} {self.transaction_type} - {self.total}"
+
+class ArchivedTransaction(models.Model):
+    """
+    Cold transaction history moved out of detached monthly partitions.
+
+    Rows keep their original id. The fee and purchase detail rows are folded
+    into ``details``, and the wide columns are stored compressed.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_transactions', db_index=False)
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    category = models.CharField(max_length=20, choices=Transaction.TRANSACTION_CATEGORIES)
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    status = models.CharField(max_length=10, choices=Transaction.TRANSACTION_STATUS)
+    description = models.TextField()
+    reference = models.CharField(max_length=255, blank=True, null=True)
+    metadata = models.JSONField(default=dict, blank=True)
+    provider_request_id = models.CharField(max_length=64, blank=True, null=True)
+    recipient_id = models.BigIntegerField(null=True, blank=True)
+    recipient_email = models.EmailField(blank=True, null=True)
+    bank_account_id = models.BigIntegerField(null=True, blank=True)
+    details = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='archived_tx_user_created_idx'),
+            # Incoming transfers, for wallet reconciliation
+            models.Index(fields=['recipient_id'], condition=models.Q(category='transfer'), name='archived_tx_recipient_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.transaction_type} - {self.amount} - {self.status}"
+
+class Biller(models.Model):
+    """
+    A Yanga biller, as last fetched by ``transactions.catalog``.
+    """
+    code = models.CharField(max_length=50)
+    name = models.CharField(max_length=255)
+    category = models.CharField(max_length=50)
+    has_products = models.BooleanField(default=False)
+    minimum = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+    maximum = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        ordering = ['category', 'name']
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'code'], name='biller_unique_code'),
+        ]
+
+    def __str__(self):
+        return f"{self.category} - {self.name}"
+
+class BillerProduct(models.Model):
+    """
+    A product offered by a biller, as last fetched by ``transactions.catalog``.
+    """
+    biller_code = models.CharField(max_length=50)
+    code = models.CharField(max_length=100)
+    name = models.CharField(max_length=255)
+    amount = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    description = models.TextField(blank=True)
+    validity = models.CharField(max_length=100, blank=True)
+
+    class Meta:
+        ordering = ['biller_code', 'amount']
+        constraints = [
+            models.UniqueConstraint(fields=['biller_code', 'code'], name='biller_product_unique_code'),
+        ]
+
+    def __str__(self):
+        return f"{self.biller_code} - {self.name}"
+
+class CatalogRefresh(models.Model):
+    """
+    When a slice of the catalog (``billers:<category>`` or
+    ``products:<biller_code>``) was last fetched from Yanga.
+    """
+    key = models.CharField(max_length=100, unique=True)
+    refreshed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.key} @ {self.refreshed_at}"
+
+class WalletHold(models.Model):
+    """
+    Funds reserved against a user's wallet while a provider call is in flight.
+
+    An open hold counts against the user's available balance. It ends either
+    captured (the funds are debited) or released (they become spendable again).
+    """
+    HOLD_STATUS = [
+        ('open', 'Open'),
+        ('captured', 'Captured'),
+        ('released', 'Released'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='wallet_holds')
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    status = models.CharField(max_length=10, choices=HOLD_STATUS, default='open')
+    transaction = models.ForeignKey(Transaction, on_delete=models.SET_NULL, null=True, blank=True, related_name='holds', db_constraint=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    settled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Open holds, for sweeping abandoned ones
+            models.Index(fields=['created_at'], condition=models.Q(status='open'), name='wallet_hold_open_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.amount} - {self.status}"
+
+class TopUpBatch(models.Model):
+    """
+    A bulk airtime/data purchase. Its rows are ordinary pending top-up
+    transactions tagged with ``metadata['batch']``; their total is held once
+    when the batch is accepted and they are sent to Yanga in the background.
+
+    ``updated_at`` moves on as the rows are sent, so a batch whose dispatch
+    died with its worker can be told apart from one that is still running.
+    """
+    BATCH_STATUS = [
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('interrupted', 'Interrupted'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='topup_batches')
+    row_count = models.PositiveIntegerField()
+    total_amount = models.DecimalField(max_digits=15, decimal_places=2)
+    status = models.CharField(max_length=12, choices=BATCH_STATUS, default='processing')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.user_id} - {self.row_count} top-ups - {self.status}"
@@ -0,0 +1,235 @@
+"""
+Monthly partitions of the ``transactions_transaction`` table.
+
+``create_partitions`` makes sure partitions exist for the months ahead so
+inserts never miss. Should they miss anyway, rows land in the DEFAULT
+partition, and the next ``create_partitions`` moves them into their month's
+partition. ``archive_partition`` moves a cold month out of the hot
+table: the partition is detached, its rows (with the
+fee and purchase details folded into JSON) are copied into
+``ArchivedTransaction``, and the partition is dropped.
+
+Ledger entries keep their ``transaction_id``; after archival it refers to the
+``ArchivedTransaction`` row with the same id.
+"""
+import re
+from datetime import date
+
+from django.db import connection, transaction as db_transaction
+
+from .models import (
+    AirtimeTransaction, ArchivedTransaction, CryptoTransaction, DataTransaction,
+    Transaction, TransactionFee,
+)
+
+PARTITION_PREFIX = f'{Transaction._meta.db_table}_p'
+DEFAULT_PARTITION = f'{Transaction._meta.db_table}_default'
+# Months of partitions kept ahead; migration 0006 created the same number
+AHEAD_MONTHS = 12
+# How long a detach may wait for the table lock before giving up
+DETACH_LOCK_TIMEOUT = '5s'
+PARTITION_NAME_RE = re.compile(rf'^{PARTITION_PREFIX}(\d{{4}})(\d{{2}})$')
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{PARTITION_PREFIX}{month:%Y%m}'
+
+
+def attached_partitions():
+    """
+    Return ``{month: detach_pending}`` for the partitions currently attached.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, i.inhdetachpending FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [Transaction._meta.db_table],
+        )
+        rows = cursor.fetchall()
+    partitions = {}
+    for name, detach_pending in rows:
+        match = PARTITION_NAME_RE.match(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = detach_pending
+    return partitions
+
+
+def detached_partitions():
+    """
+    Return the months whose partition table exists but is no longer attached,
+    i.e. an archive run that stopped after detaching.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_class c "
+            "WHERE c.relkind = 'r' AND c.relname LIKE %s "
+            "AND NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid)",
+            [PARTITION_PREFIX + '%'],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    months = []
+    for name in names:
+        match = PARTITION_NAME_RE.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def has_default_partition():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT partdefid <> 0 FROM pg_partitioned_table WHERE partrelid = %s::regclass",
+            [Transaction._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def _detach(month, pending):
+    """
+    Detach the partition for ``month``. PostgreSQL cannot detach
+    CONCURRENTLY while a DEFAULT partition exists, so the detach then takes
+    the table lock briefly, failing after ``DETACH_LOCK_TIMEOUT`` rather than
+    queueing writers behind it.
+    """
+    quoted = connection.ops.quote_name(partition_name(month))
+    table = connection.ops.quote_name(Transaction._meta.db_table)
+    if pending:
+        with connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {quoted} FINALIZE")
+    elif has_default_partition():
+        with db_transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('lock_timeout', %s, true)", [DETACH_LOCK_TIMEOUT])
+            cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {quoted}")
+    else:
+        with connection.cursor() as cursor:
+            # CONCURRENTLY cannot run inside a transaction block
+            cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {quoted} CONCURRENTLY")
+
+
+def _default_months():
+    table = connection.ops.quote_name(DEFAULT_PARTITION)
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT DISTINCT date_trunc('month', created_at)::date FROM {table}")
+        return {row[0] for row in cursor.fetchall()}
+
+
+def _split_default(month):
+    """
+    Create the partition for ``month`` from the rows the DEFAULT partition
+    holds for it. PostgreSQL refuses to create a partition whose range
+    overlaps rows in the DEFAULT partition, so the rows are moved into a
+    plain table first, which is then attached.
+    """
+    name = connection.ops.quote_name(partition_name(month))
+    table = connection.ops.quote_name(Transaction._meta.db_table)
+    default = connection.ops.quote_name(DEFAULT_PARTITION)
+    bounds = [month, add_months(month, 1)]
+    with db_transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {default} WHERE created_at >= %s AND created_at < %s RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved",
+            bounds,
+        )
+        cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", bounds)
+
+
+def create_partitions(ahead=AHEAD_MONTHS, today=None):
+    """
+    Create the partitions for the current month and ``ahead`` months after it,
+    and for any month with rows in the DEFAULT partition.
+
+    Returns the names of the partitions that were created.
+    """
+    today = today or date.today()
+    current = today.replace(day=1)
+    existing = attached_partitions()
+    stray = _default_months()
+    months = {add_months(current, offset) for offset in range(ahead + 1)} | stray
+    table = connection.ops.quote_name(Transaction._meta.db_table)
+    created = []
+    with connection.cursor() as cursor:
+        for month in sorted(months):
+            if month in existing:
+                continue
+            name = partition_name(month)
+            if month in stray:
+                _split_default(month)
+            else:
+                cursor.execute(
+                    f"CREATE TABLE IF NOT EXISTS {connection.ops.quote_name(name)} "
+                    f"PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)",
+                    [month, add_months(month, 1)],
+                )
+            created.append(name)
+    return created
+
+
+def archive_partition(month):
+    """
+    Move the partition for ``month`` into ``ArchivedTransaction``.
+
+    Safe to re-run: a partition left detached (or half-detached) by an
+    interrupted run is picked up where it stopped, and rows already copied
+    are skipped.
+    """
+    month = month.replace(day=1)
+    name = partition_name(month)
+    quoted = connection.ops.quote_name(name)
+
+    attached = attached_partitions()
+    if month in attached:
+        _detach(month, attached[month])
+    elif month not in detached_partitions():
+        return 0
+
+    archive = connection.ops.quote_name(ArchivedTransaction._meta.db_table)
+    fee = connection.ops.quote_name(TransactionFee._meta.db_table)
+    crypto = connection.ops.quote_name(CryptoTransaction._meta.db_table)
+    airtime = connection.ops.quote_name(AirtimeTransaction._meta.db_table)
+    data = connection.ops.quote_name(DataTransaction._meta.db_table)
+
+    with db_transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {archive} (id, user_id, transaction_type, category, amount, status, "
+            f"description, reference, metadata, provider_request_id, recipient_id, recipient_email, bank_account_id, "
+            f"details, created_at, updated_at, completed_at) "
+            f"SELECT t.id, t.user_id, t.transaction_type, t.category, t.amount, t.status, "
+            f"t.description, t.reference, t.metadata, t.provider_request_id, t.recipient_id, t.recipient_email, "
+            f"t.bank_account_id, jsonb_strip_nulls(jsonb_build_object("
+            f"'fee', to_jsonb(f) - 'id' - 'transaction_id', "
+            f"'crypto_details', to_jsonb(c) - 'id' - 'transaction_id', "
+            f"'airtime_details', to_jsonb(a) - 'id' - 'transaction_id', "
+            f"'data_details', to_jsonb(d) - 'id' - 'transaction_id')), "
+            f"t.created_at, t.updated_at, t.completed_at "
+            f"FROM {quoted} t "
+            f"LEFT JOIN {fee} f ON f.transaction_id = t.id "
+            f"LEFT JOIN {crypto} c ON c.transaction_id = t.id "
+            f"LEFT JOIN {airtime} a ON a.transaction_id = t.id "
+            f"LEFT JOIN {data} d ON d.transaction_id = t.id "
+            f"ON CONFLICT (id) DO NOTHING"
+        )
+        archived = cursor.rowcount
+        for detail in (fee, crypto, airtime, data):
+            cursor.execute(
+                f"DELETE FROM {detail} WHERE transaction_id IN (SELECT id FROM {quoted})"
+            )
+        cursor.execute(f"DROP TABLE {quoted}")
+    return archived
+
+
+def archive_before(month):
+    """
+    Archive every partition older than ``month``. Returns ``{name: rows}``.
+    """
+    month = month.replace(day=1)
+    cold = {m for m in attached_partitions() if m < month}
+    cold.update(m for m in detached_partitions() if m < month)
+    return {partition_name(m): archive_partition(m) for m in sorted(cold)}
@@ -0,0 +1,67 @@
+"""
+Wallet balance reconciliation.
+
+``drift(start, end)`` compares ``wallet_balance`` with the balance implied by
+the transaction history for the users whose id falls in ``[start, end)``, and
+returns only the users where the two disagree. The comparison happens in one
+aggregate query, so a range is a single short read and only drifting users
+leave the database.
+
+The implied balance counts, from both live and archived transactions:
+
+- completed credits, minus completed debits;
+- pending debits, whose funds are taken when they are created (withdrawals),
+  unless their funds are only held (``WalletHold``) until the provider replies;
+- completed transfers received, which only exist as the sender's debit row.
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+from .models import ArchivedTransaction, Transaction, WalletHold
+
+
+def _movements(table):
+    holds = connection.ops.quote_name(WalletHold._meta.db_table)
+    return (
+        f"SELECT user_id, CASE WHEN transaction_type = 'credit' THEN amount ELSE -amount END AS delta "
+        f"FROM {table} t WHERE user_id >= %(start)s AND user_id < %(end)s "
+        f"AND (status = 'completed' OR (status = 'pending' AND transaction_type = 'debit' "
+        f"AND NOT EXISTS (SELECT 1 FROM {holds} h WHERE h.transaction_id = t.id AND h.status = 'open'))) "
+        f"UNION ALL "
+        f"SELECT recipient_id, amount FROM {table} "
+        f"WHERE recipient_id >= %(start)s AND recipient_id < %(end)s "
+        f"AND category = 'transfer' AND transaction_type = 'debit' AND status = 'completed'"
+    )
+
+
+def id_bounds():
+    """
+    Return the ``(min, max)`` user id, or ``None`` when there are no users.
+    """
+    users = connection.ops.quote_name(get_user_model()._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT min(id), max(id) FROM {users}")
+        low, high = cursor.fetchone()
+    return None if low is None else (low, high)
+
+
+def drift(start, end):
+    """
+    Return ``[(user_id, wallet_balance, expected_balance)]`` for the users in
+    ``[start, end)`` whose wallet balance does not match their history.
+    """
+    users = connection.ops.quote_name(get_user_model()._meta.db_table)
+    live = connection.ops.quote_name(Transaction._meta.db_table)
+    archive = connection.ops.quote_name(ArchivedTransaction._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT u.id, u.wallet_balance, COALESCE(SUM(m.delta), 0) "
+            f"FROM {users} u "
+            f"LEFT JOIN ({_movements(live)} UNION ALL {_movements(archive)}) m ON m.user_id = u.id "
+            f"WHERE u.id >= %(start)s AND u.id < %(end)s "
+            f"GROUP BY u.id, u.wallet_balance "
+            f"HAVING u.wallet_balance <> COALESCE(SUM(m.delta), 0) "
+            f"ORDER BY u.id",
+            {'start': start, 'end': end},
+        )
+        return cursor.fetchall()
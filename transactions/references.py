@@ -0,0 +1,63 @@
+"""
+Transaction reference generator.
+
+References are ``TX`` followed by a 26 character ULID: a 48-bit millisecond
+timestamp and 80 random bits, written in Crockford base32. They sort by
+creation time, so new rows land at the right-hand edge of the reference index
+instead of on a random leaf page. Within a process, references generated in
+the same millisecond increment the random part, so they stay strictly
+increasing. The random part makes collisions between processes negligible.
+"""
+import os
+import secrets
+import threading
+import time
+
+PREFIX = 'TX'
+ENCODING = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+RANDOM_BITS = 80
+RANDOM_MAX = (1 << RANDOM_BITS) - 1
+
+_lock = threading.Lock()
+_last_ms = 0
+_last_random = 0
+
+
+def _reset():
+    global _last_ms, _last_random
+    _last_ms = 0
+    _last_random = 0
+
+
+# A forked worker must not continue the parent's sequence
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset)
+
+
+def _encode(value, length):
+    chars = []
+    for _ in range(length):
+        value, index = divmod(value, 32)
+        chars.append(ENCODING[index])
+    return ''.join(reversed(chars))
+
+
+def new_reference():
+    """
+    Return a new, strictly increasing (per process) transaction reference.
+    """
+    global _last_ms, _last_random
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms <= _last_ms:
+            # Same millisecond, or the clock stepped back: keep counting up
+            if _last_random == RANDOM_MAX:
+                _last_ms += 1
+                _last_random = secrets.randbits(RANDOM_BITS)
+            else:
+                _last_random += 1
+        else:
+            _last_ms = now_ms
+            _last_random = secrets.randbits(RANDOM_BITS)
+        value = (_last_ms << RANDOM_BITS) | _last_random
+    return PREFIX + _encode(value, 26)
@@ -0,0 +1,68 @@
+"""
+Incremental maintenance of the ``DailySpend`` rollup table.
+
+``record`` folds completed transactions into their (user, day, category,
+transaction_type) rows with a single upsert. ``rebuild`` recomputes the rows
+for a batch of users from the raw ``Transaction`` and ``ArchivedTransaction``
+tables and is used by the ``rebuild_daily_spend`` backfill command.
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction as db_transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ArchivedTransaction, DailySpend, Transaction
+
+
+def record(transactions, sign=1):
+    """
+    Add ``transactions`` to the rollups, or remove them when ``sign`` is -1.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for tx in transactions:
+        key = (tx.user_id, timezone.localdate(tx.created_at), tx.category, tx.transaction_type)
+        totals[key][0] += sign
+        totals[key][1] += sign * tx.amount
+    if not totals:
+        return
+
+    table = connection.ops.quote_name(DailySpend._meta.db_table)
+    rows = [(*key, count, total) for key, (count, total) in totals.items()]
+    placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(rows))
+    params = [value for row in rows for value in row]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (user_id, day, category, transaction_type, count, total) "
+            f"VALUES {placeholders} "
+            f"ON CONFLICT (user_id, day, category, transaction_type) DO UPDATE SET "
+            f"count = {table}.count + EXCLUDED.count, total = {table}.total + EXCLUDED.total",
+            params,
+        )
+
+
+def rebuild(user_ids):
+    """
+    Recompute the rollups of ``user_ids`` from their completed transactions,
+    live and archived.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for model in (Transaction, ArchivedTransaction):
+        aggregates = (
+            model.objects.filter(user_id__in=user_ids, status='completed')
+            .annotate(day=TruncDate('created_at'))
+            .values_list('user_id', 'day', 'category', 'transaction_type')
+            .annotate(count=Count('id'), total=Sum('amount'))
+            .order_by()
+        )
+        for *key, count, total in aggregates:
+            totals[tuple(key)][0] += count
+            totals[tuple(key)][1] += total
+    with db_transaction.atomic():
+        DailySpend.objects.filter(user_id__in=user_ids).delete()
+        DailySpend.objects.bulk_create([
+            DailySpend(user_id=user_id, day=day, category=category, transaction_type=transaction_type,
+                       count=count, total=total)
+            for (user_id, day, category, transaction_type), (count, total) in totals.items()
+        ], batch_size=1000)
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Transaction, TransactionFee, CryptoTransaction, AirtimeTransaction, DataTransaction
+from .models import Transaction, TransactionFee, CryptoTransaction, AirtimeTransaction, DataTransaction, ArchivedTransaction, TopUpBatch
 
 class TransactionFeeSerializer(serializers.ModelSerializer):
     class Meta:
@@ -21,7 +21,24 @@ class DataTransactionSerializer(serializers.ModelSerializer):
         model = DataTransaction
         fields = ['id', 'phone_number', 'network', 'data_plan', 'validity']
 
-class TransactionSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Accepts a ``fields`` argument listing the declared fields to keep.
+
+    ``expandable_fields`` are the heavy fields a compact representation
+    leaves out unless the client asks for them.
+    """
+    expandable_fields = []
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+class TransactionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = ['metadata', 'fee', 'crypto_details', 'airtime_details', 'data_details']
+
     fee = TransactionFeeSerializer(read_only=True)
     crypto_details = CryptoTransactionSerializer(read_only=True)
     airtime_details = AirtimeTransactionSerializer(read_only=True)
@@ -37,6 +54,21 @@ class TransactionSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['reference', 'created_at', 'updated_at', 'completed_at']
 
+class ArchivedTransactionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = ['metadata', 'details']
+
+    recipient = serializers.IntegerField(source='recipient_id', read_only=True)
+    bank_account = serializers.IntegerField(source='bank_account_id', read_only=True)
+
+    class Meta:
+        model = ArchivedTransaction
+        fields = [
+            'id', 'transaction_type', 'category', 'amount', 'status', 'description',
+            'reference', 'metadata', 'recipient', 'recipient_email', 'bank_account',
+            'created_at', 'updated_at', 'completed_at', 'details'
+        ]
+        read_only_fields = fields
+
 class CreateTransactionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Transaction
@@ -70,3 +102,20 @@ class DataPurchaseSerializer(serializers.Serializer):
     network = serializers.CharField(max_length=50)
     data_plan = serializers.CharField(max_length=100)
     amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+class TransactionFilterSerializer(serializers.Serializer):
+    category = serializers.ChoiceField(choices=Transaction.TRANSACTION_CATEGORIES, required=False)
+    status = serializers.ChoiceField(choices=Transaction.TRANSACTION_STATUS, required=False)
+    transaction_type = serializers.ChoiceField(choices=Transaction.TRANSACTION_TYPES, required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if attrs.get('date_from') and attrs.get('date_to') and attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError('date_from must be on or before date_to')
+        return attrs
+
+class TopUpBatchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TopUpBatch
+        fields = ['id', 'row_count', 'total_amount', 'status', 'created_at', 'updated_at', 'completed_at']
@@ -0,0 +1,21 @@
+"""
+Signal handlers for the transactions app.
+"""
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import rollups
+from .models import Transaction
+
+
+@receiver(post_save, sender=Transaction)
+def update_daily_spend(sender, instance=None, created=False, **kwargs):
+    """
+    Keep the daily spend rollups in step with transaction completion.
+    """
+    previous = None if created else getattr(instance, '_loaded_status', None)
+    if previous != 'completed' and instance.status == 'completed':
+        rollups.record([instance])
+    elif previous == 'completed' and instance.status != 'completed':
+        rollups.record([instance], sign=-1)
+    instance._loaded_status = instance.status
@@ -1,3 +1,584 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from spacevest import circuit
+
+from . import catalog, partitions, references, rollups, topups, wallet
+from .models import (
+    AirtimeTransaction, ArchivedTransaction, CatalogRefresh, DailySpend, LedgerEntry, Transaction,
+    TransactionFee,
+)
+
+User = get_user_model()
+
+
+class WalletDebitRaceTests(TransactionTestCase):
+    def test_concurrent_debits_never_overdraw(self):
+        user = User.objects.create_user(username='racer', email='racer@example.com', password='pass')
+        User.objects.filter(pk=user.pk).update(wallet_balance=Decimal('100.00'))
+        results = []
+        start = threading.Barrier(10)
+
+        def debit():
+            try:
+                start.wait()
+                wallet.debit(User.objects.get(pk=user.pk), Decimal('30.00'))
+                results.append('ok')
+            except wallet.InsufficientFunds:
+                results.append('insufficient')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=debit) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        user.refresh_from_db()
+        self.assertEqual(results.count('ok'), 3)
+        self.assertEqual(results.count('insufficient'), 7)
+        self.assertEqual(user.wallet_balance, Decimal('10.00'))
+        self.assertEqual(LedgerEntry.objects.filter(user=user, account='wallet').count(), 3)
+
+
+class StatementExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='pass')
+        other = User.objects.create_user(username='other', email='other@example.com', password='pass')
+        for amount in ('10.00', '20.00'):
+            Transaction.objects.create(user=self.user, transaction_type='credit', category='deposit',
+                                       amount=Decimal(amount), status='completed', description='Deposit')
+        Transaction.objects.create(user=other, transaction_type='credit', category='deposit',
+                                   amount=Decimal('99.00'), status='completed', description='Deposit')
+        self.client.force_login(self.user)
+
+    def test_csv_streams_own_rows_oldest_first(self):
+        response = self.client.get('/api/transactions/statement/csv/')
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row['amount'] for row in rows], ['10.00', '20.00'])
+
+    def test_ndjson(self):
+        response = self.client.get('/api/transactions/statement/ndjson/')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['amount'] for line in lines], ['10.00', '20.00'])
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get('/api/transactions/statement/xml/').status_code, 404)
+
+
+class ReferenceTests(TestCase):
+    def test_references_increase_within_a_millisecond_and_across_a_clock_step_back(self):
+        with mock.patch.object(references.time, 'time_ns', return_value=1_700_000_000_000_000_000):
+            generated = [references.new_reference() for _ in range(100)]
+        with mock.patch.object(references.time, 'time_ns', return_value=1_600_000_000_000_000_000):
+            generated.append(references.new_reference())
+
+        self.assertEqual(generated, sorted(set(generated)))
+        self.assertTrue(all(len(ref) == 28 and ref.startswith('TX') for ref in generated))
+
+    def test_bulk_create_fills_in_references(self):
+        user = User.objects.create_user(username='bulk', email='bulk@example.com', password='pass')
+        created = Transaction.objects.bulk_create([
+            Transaction(user=user, transaction_type='credit', category='deposit', amount=Decimal('1.00'),
+                        description='Deposit', reference=None)
+            for _ in range(3)
+        ])
+        stored = list(Transaction.objects.filter(user=user).order_by('id').values_list('reference', flat=True))
+        self.assertEqual(stored, [t.reference for t in created])
+        self.assertEqual(stored, sorted(set(stored)))
+
+
+class ImmediateThread:
+    def __init__(self, target, args=(), **kwargs):
+        self.target, self.args = target, args
+
+    def start(self):
+        self.target(*self.args)
+
+
+class CatalogTests(TransactionTestCase):
+    def setUp(self):
+        catalog._index.clear()
+        self.addCleanup(catalog._index.clear)
+
+    def billers_reply(self, *names):
+        reply = mock.Mock(status_code=200)
+        reply.json.return_value = {'success': True, 'data': {'billers': [
+            {'code': name.lower(), 'name': name, 'has_products': False, 'minimum': '50', 'maximum': '5000'}
+            for name in names
+        ]}}
+        return reply
+
+    def test_stale_billers_are_served_when_the_refresh_fails(self):
+        with mock.patch.object(catalog.yanga, 'get', return_value=self.billers_reply('MTN', 'Glo')):
+            fresh = catalog.billers('airtime')
+        self.assertEqual([(b['code'], b['minimum']) for b in fresh], [('glo', 50.0), ('mtn', 50.0)])
+
+        CatalogRefresh.objects.update(refreshed_at=timezone.now() - timedelta(days=1))
+        catalog._index.clear()
+        with mock.patch.object(catalog.yanga, 'get', side_effect=requests.ConnectionError('down')) as get, \
+                mock.patch.object(catalog.threading, 'Thread', ImmediateThread), \
+                self.assertLogs('transactions.catalog', 'ERROR'):
+            self.assertEqual(catalog.billers('airtime'), fresh)
+        get.assert_called_once()
+
+        # The next successful refresh replaces the stale entries
+        with mock.patch.object(catalog.yanga, 'get', return_value=self.billers_reply('MTN')), \
+                mock.patch.object(catalog.threading, 'Thread', ImmediateThread):
+            catalog.billers('airtime')
+        self.assertEqual([b['code'] for b in catalog.billers('airtime')], ['mtn'])
+
+    def test_cold_miss_fails_with_the_provider(self):
+        with mock.patch.object(catalog.yanga, 'get', side_effect=requests.ConnectionError('down')), \
+                self.assertRaises(requests.ConnectionError):
+            catalog.billers('airtime')
+        self.assertFalse(CatalogRefresh.objects.exists())
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='pager', email='pager@example.com', password='pass')
+        self.ids = [
+            Transaction.objects.create(user=self.user, transaction_type='credit', category='deposit',
+                                       amount=Decimal('1.00'), status='completed', description='Deposit').pk
+            for _ in range(5)
+        ]
+        # Rows created in the same instant are ordered by id
+        Transaction.objects.filter(user=self.user).update(created_at=timezone.now())
+        self.client.force_login(self.user)
+
+    def test_pages_cover_rows_with_equal_created_at_once(self):
+        seen = []
+        url = '/api/transactions/?page_size=2'
+        while url:
+            body = self.client.get(url).json()
+            seen += [row['id'] for row in body['results']]
+            url = body['next']
+        self.assertEqual(seen, sorted(self.ids, reverse=True))
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/transactions/?cursor=bm9wZQ').status_code, 404)
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='sparse', email='sparse@example.com', password='pass')
+        self.transaction = Transaction.objects.create(
+            user=self.user, transaction_type='debit', category='transfer', amount=Decimal('5.00'),
+            status='completed', description='Transfer', metadata={'note': 'rent'},
+        )
+        TransactionFee.objects.create(transaction=self.transaction, amount=Decimal('0.50'), description='Fee')
+        self.client.force_login(self.user)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_list_is_compact_unless_expanded(self):
+        row = self.get('/api/transactions/')['results'][0]
+        self.assertNotIn('metadata', row)
+        self.assertNotIn('fee', row)
+
+        row = self.get('/api/transactions/?expand=metadata,fee')['results'][0]
+        self.assertEqual(row['metadata'], {'note': 'rent'})
+        self.assertEqual(row['fee']['amount'], '0.50')
+
+    def test_fields_pick_fields_outright(self):
+        self.assertEqual(self.get('/api/transactions/?fields=id,amount')['results'], [
+            {'id': self.transaction.pk, 'amount': '5.00'},
+        ])
+        detail = self.get(f'/api/transactions/{self.transaction.pk}/')
+        self.assertEqual(detail['metadata'], {'note': 'rent'})
+
+    def test_unknown_field(self):
+        self.assertEqual(self.client.get('/api/transactions/?fields=id,secret').status_code, 400)
+
+
+class HistoryFilterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='filterer', email='filterer@example.com', password='pass')
+        self.client.force_login(self.user)
+        self.today = timezone.localdate()
+        self.airtime = self.create('airtime', 'completed')
+        self.failed = self.create('airtime', 'failed')
+        self.old = self.create('data', 'completed')
+        Transaction.objects.filter(pk=self.old.pk).update(created_at=timezone.now() - timedelta(days=3))
+
+    def create(self, category, status):
+        return Transaction.objects.create(user=self.user, transaction_type='debit', category=category,
+                                          amount=Decimal('10.00'), status=status, description='Spend')
+
+    def ids(self, query):
+        response = self.client.get(f'/api/transactions/history/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return {row['id'] for row in response.json()['results']}
+
+    def test_filters(self):
+        self.assertEqual(self.ids('category=airtime&status=completed'), {self.airtime.pk})
+        self.assertEqual(self.ids(f'date_from={self.today}&date_to={self.today}'), {self.airtime.pk, self.failed.pk})
+        self.assertEqual(self.ids(f'date_to={self.today - timedelta(days=1)}'), {self.old.pk})
+
+    def test_inverted_date_range(self):
+        response = self.client.get(f'/api/transactions/history/?date_from={self.today}&date_to={self.today - timedelta(days=1)}')
+        self.assertEqual(response.status_code, 400)
+
+
+class SpendingSummaryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='spender', email='spender@example.com', password='pass')
+        self.client.force_login(self.user)
+
+    def spend(self, category, amount):
+        return Transaction.objects.create(user=self.user, transaction_type='debit', category=category,
+                                          amount=Decimal(amount), status='completed', description='Spend')
+
+    def rollups(self):
+        return sorted(DailySpend.objects.filter(user=self.user).values_list('day', 'category', 'count', 'total'))
+
+    def test_refund_is_taken_out_of_the_summary(self):
+        self.spend('airtime', '100.00')
+        self.spend('data', '50.00')
+        refunded = self.spend('airtime', '30.00')
+        refunded.status = 'cancelled'
+        refunded.save()
+
+        body = self.client.get('/api/transactions/summary/').json()
+        self.assertEqual(
+            [(row['category'], row['count'], Decimal(str(row['total']))) for row in body['by_category']],
+            [('airtime', 1, Decimal('100.00')), ('data', 1, Decimal('50.00'))],
+        )
+        self.assertEqual([(row['count'], Decimal(str(row['total']))) for row in body['by_day']],
+                         [(2, Decimal('150.00'))])
+
+        # The incremental rollups match a rebuild from the transactions
+        incremental = self.rollups()
+        rollups.rebuild([self.user.pk])
+        self.assertEqual(self.rollups(), incremental)
+
+
+class WalletHoldTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='holder', email='holder@example.com', password='pass')
+        User.objects.filter(pk=self.user.pk).update(wallet_balance=Decimal('100.00'))
+
+    def balances(self):
+        self.user.refresh_from_db()
+        return self.user.wallet_balance, self.user.held_balance
+
+    def test_hold_counts_against_available_balance(self):
+        wallet.hold(self.user, Decimal('80.00'))
+        with self.assertRaises(wallet.InsufficientFunds):
+            wallet.debit(self.user, Decimal('30.00'))
+        self.assertEqual(self.balances(), (Decimal('100.00'), Decimal('80.00')))
+
+    def test_settled_hold_cannot_be_settled_again(self):
+        hold = wallet.hold(self.user, Decimal('40.00'))
+        wallet.capture(hold)
+        with self.assertRaises(wallet.HoldSettled):
+            wallet.capture(hold)
+        with self.assertRaises(wallet.HoldSettled):
+            wallet.release(hold)
+        self.assertEqual(self.balances(), (Decimal('60.00'), Decimal('0.00')))
+
+    def test_settle_many_settles_nothing_if_one_hold_is_settled(self):
+        first, second = wallet.hold_many(self.user, [(Decimal('10.00'), None), (Decimal('20.00'), None)])
+        wallet.release(first)
+        with self.assertRaises(wallet.HoldSettled):
+            wallet.settle_many(captured=[second], released=[first])
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'open')
+        self.assertEqual(self.balances(), (Decimal('100.00'), Decimal('20.00')))
+
+
+class ReconcileWalletsTests(TransactionTestCase):
+    def setUp(self):
+        self.users = []
+        for name, balance, deposited in (('even', '100.00', '100.00'), ('drift', '70.00', '50.00'),
+                                         ('empty', '0.00', None)):
+            user = User.objects.create_user(username=name, email=f'{name}@example.com', password='pass')
+            User.objects.filter(pk=user.pk).update(wallet_balance=Decimal(balance))
+            if deposited:
+                Transaction.objects.create(user=user, transaction_type='credit', category='deposit',
+                                           amount=Decimal(deposited), status='completed', description='Deposit')
+            self.users.append(user)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.report = os.path.join(directory.name, 'drift.csv')
+        self.checkpoint = os.path.join(directory.name, 'drift.json')
+
+    def reconcile(self, **options):
+        call_command('reconcile_wallets', chunk_size=1, workers=2, report=self.report,
+                     checkpoint=self.checkpoint, stdout=io.StringIO(), **options)
+        with open(self.report) as report:
+            return list(csv.reader(report))
+
+    def test_drifting_user_is_reported(self):
+        drift = self.users[1]
+        self.assertEqual(self.reconcile(), [
+            ['user_id', 'wallet_balance', 'expected_balance', 'drift'],
+            [str(drift.pk), '70.00', '50.00', '20.00'],
+        ])
+        # A finished run is not repeated
+        self.assertEqual(len(self.reconcile()), 2)
+
+    def test_resume_skips_ranges_already_done(self):
+        first, drift, last = (user.pk for user in self.users)
+        with open(self.report, 'w') as report:
+            report.write('user_id,wallet_balance,expected_balance,drift\r\n')
+        with open(self.checkpoint, 'w') as checkpoint:
+            json.dump({'chunk_size': 1, 'min_id': first, 'max_id': last, 'done': [drift]}, checkpoint)
+
+        self.assertEqual(len(self.reconcile()), 1)
+        with open(self.checkpoint) as checkpoint:
+            self.assertEqual(sorted(json.load(checkpoint)['done']), [first, drift, last])
+        with self.assertRaises(CommandError):
+            call_command('reconcile_wallets', chunk_size=5, report=self.report, checkpoint=self.checkpoint,
+                         stdout=io.StringIO())
+
+
+class ArchivePartitionTests(TransactionTestCase):
+    def test_past_month_is_moved_to_the_archive(self):
+        user = User.objects.create_user(username='archived', email='archived@example.com', password='pass')
+        month = date(2001, 1, 1)
+        transaction = Transaction.objects.create(user=user, transaction_type='debit', category='transfer',
+                                                 amount=Decimal('40.00'), status='completed', description='Old')
+        TransactionFee.objects.create(transaction=transaction, amount=Decimal('1.50'), description='Transfer fee')
+        # No partition covers 2001, so the row lands in the DEFAULT partition
+        Transaction.objects.filter(pk=transaction.pk).update(created_at=datetime(2001, 1, 15, tzinfo=dt_timezone.utc))
+
+        partitions.create_partitions()
+        self.assertIn(month, partitions.attached_partitions())
+        self.assertEqual(partitions.archive_before(date(2001, 2, 1)), {partitions.partition_name(month): 1})
+
+        self.assertFalse(Transaction.objects.filter(pk=transaction.pk).exists())
+        self.assertFalse(TransactionFee.objects.exists())
+        self.assertNotIn(month, partitions.attached_partitions())
+        self.assertEqual(partitions.detached_partitions(), [])
+        archived = ArchivedTransaction.objects.get(pk=transaction.pk)
+        self.assertEqual((archived.amount, archived.reference), (Decimal('40.00'), transaction.reference))
+        self.assertEqual(archived.details['fee']['amount'], 1.5)
+
+
+def reserve_top_up(user, request_id, amount='100.00'):
+    return topups.reserve(user, 'airtime', Decimal(amount), 'Airtime', {'request_id': request_id},
+                          AirtimeTransaction, {'phone_number': '08030000000', 'network': 'mtn'})
+
+
+def status_reply(state):
+    return 200, {'success': True, 'data': {'status': state}}
+
+
+class PollPendingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='poller', email='poller@example.com', password='pass')
+        User.objects.filter(pk=self.user.pk).update(wallet_balance=Decimal('1000.00'))
+        self.sent = {}
+        for request_id in ('done', 'declined', 'unknown'):
+            transaction = reserve_top_up(self.user, request_id)
+            topups.claim([transaction.pk])
+            self.sent[request_id] = transaction
+
+    def balances(self):
+        self.user.refresh_from_db()
+        return self.user.wallet_balance, self.user.held_balance
+
+    def status(self, request_id):
+        return Transaction.objects.get(pk=self.sent[request_id].pk).status
+
+    @override_settings(YANGA_STATUS_PATH='bill-payments/status/{}')
+    def test_sent_top_ups_are_settled_from_their_status(self):
+        replies = {'done': status_reply('successful'), 'declined': status_reply('failed'),
+                   'unknown': (404, {'success': False, 'message': 'Purchase not found'})}
+        with mock.patch.object(topups, 'check', side_effect=replies.get), \
+                self.assertLogs('transactions.topups', 'WARNING'):
+            totals = topups.poll_pending(min_age=timedelta(0))
+
+        self.assertEqual(totals, {'completed': 1, 'failed': 1, 'pending': 1, 'review': 0})
+        self.assertEqual([self.status(r) for r in ('done', 'declined', 'unknown')],
+                         ['completed', 'failed', 'pending'])
+        self.assertEqual(self.balances(), (Decimal('900.00'), Decimal('100.00')))
+
+    @override_settings(YANGA_STATUS_PATH='', YANGA_REVIEW_AFTER=600)
+    def test_stale_top_ups_are_flagged_and_settled_by_staff(self):
+        Transaction.objects.filter(pk=self.sent['done'].pk).update(sent_at=timezone.now() - timedelta(hours=1))
+        with mock.patch.object(topups, 'check') as check, self.assertLogs('transactions.topups', 'ERROR'):
+            self.assertEqual(topups.poll_pending()['review'], 1)
+        check.assert_not_called()
+        self.assertTrue(Transaction.objects.get(pk=self.sent['done'].pk).metadata['review'])
+        # Already flagged rows are not reported again
+        self.assertEqual(topups.poll_pending()['review'], 0)
+
+        admin = User.objects.create_superuser(username='staff', email='staff@example.com', password='pass')
+        self.client.force_login(admin)
+        response = self.client.post('/admin/transactions/transaction/', {
+            'action': 'fail_top_ups', '_selected_action': [self.sent['done'].pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.status('done'), 'failed')
+        self.assertEqual(self.balances(), (Decimal('1000.00'), Decimal('200.00')))
+
+
+class BulkTopUpTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='vendor', email='vendor@example.com', password='pass')
+        User.objects.filter(pk=self.user.pk).update(wallet_balance=Decimal('1000.00'))
+        self.client.force_login(self.user)
+
+    def test_batch_with_mixed_outcomes(self):
+        upload = io.BytesIO(
+            b'network,phone_number,amount\n'
+            b'mtn,08030000001,100\n'
+            b'mtn,08030000002,200\n'
+            b'glo,08050000003,300\n'
+        )
+        upload.name = 'rows.csv'
+        with mock.patch('transactions.views._requires_product_code', return_value=False), \
+                mock.patch.object(topups, 'start_batch') as start_batch:
+            response = self.client.post('/api/transactions/top-up/bulk/', {'type': 'airtime', 'file': upload})
+        self.assertEqual(response.status_code, 202)
+        batch_id = response.json()['id']
+        start_batch.assert_called_once_with(batch_id)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.held_balance, Decimal('600.00'))
+
+        replies = {
+            '08030000001': status_reply('successful'),
+            '08030000002': (400, {'success': False, 'message': 'Invalid recipient'}),
+            '08050000003': status_reply('processing'),
+        }
+        with mock.patch.object(topups, 'send', side_effect=lambda payload: replies[payload['recipient']]):
+            totals = topups.dispatch_batch(batch_id)
+        self.assertEqual(totals, {'completed': 1, 'failed': 1, 'pending': 1})
+
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.wallet_balance, self.user.held_balance), (Decimal('900.00'), Decimal('300.00')))
+        body = self.client.get(f'/api/transactions/top-up/bulk/{batch_id}/').json()
+        self.assertEqual(body['status'], 'completed')
+        self.assertEqual({status: row['count'] for status, row in body['rows'].items()},
+                         {'completed': 1, 'failed': 1, 'pending': 1})
+        self.assertEqual([(row['row'], row['message']) for row in body['failed_rows']], [(2, 'Invalid recipient')])
+
+    def test_invalid_row_rejects_the_batch(self):
+        with mock.patch('transactions.views._requires_product_code', return_value=False):
+            response = self.client.post('/api/transactions/top-up/bulk/', {'type': 'airtime', 'rows': [
+                {'network': 'mtn', 'phone_number': '08030000001', 'amount': '100'},
+                {'network': 'mtn', 'amount': '100'},
+            ]}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([row['row'] for row in response.json()['rows']], [2])
+        self.assertFalse(Transaction.objects.exists())
+
+
+class Reply:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('spacevest.circuit.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = circuit.CircuitBreaker(
+            'yanga-test', 2, failure_rate=0.5, slow_call_rate=1, slow_call_seconds=10,
+            window=4, min_calls=2, open_seconds=30,
+        )
+
+    def test_opens_then_closes_after_a_successful_probe(self):
+        self.breaker.call(Reply, 200)
+        with self.assertLogs('spacevest.circuit', 'WARNING'):
+            self.breaker.call(Reply, 503)
+        self.assertEqual(self.breaker.state, circuit.OPEN)
+        provider = mock.Mock(return_value=Reply(200))
+        with self.assertRaises(circuit.ProviderUnavailable):
+            self.breaker.call(provider)
+        provider.assert_not_called()
+
+        self.now += 30
+        self.assertEqual(self.breaker.state, circuit.HALF_OPEN)
+        self.assertEqual(self.breaker.call(provider).status_code, 200)
+        self.assertEqual(self.breaker.state, circuit.CLOSED)
+        self.breaker.call(provider)
+        self.assertEqual(provider.call_count, 2)
+
+    def test_failed_probe_opens_again(self):
+        with self.assertLogs('spacevest.circuit', 'WARNING'):
+            for _ in range(2):
+                with self.assertRaises(requests.ConnectionError):
+                    self.breaker.call(mock.Mock(side_effect=requests.ConnectionError))
+        self.now += 30
+        with self.assertLogs('spacevest.circuit', 'WARNING'):
+            self.breaker.call(Reply, 500)
+        self.assertEqual(self.breaker.state, circuit.OPEN)
+
+    def test_full_bulkhead_is_retryable(self):
+        entered, leave = threading.Event(), threading.Event()
+
+        def slow_call():
+            entered.set()
+            leave.wait(5)
+            return Reply(200)
+
+        workers = [threading.Thread(target=self.breaker.call, args=(slow_call,)) for _ in range(2)]
+        for worker in workers:
+            entered.clear()
+            worker.start()
+            entered.wait(5)
+        try:
+            with self.assertRaises(circuit.BulkheadFull):
+                self.breaker.call(Reply, 200)
+        finally:
+            leave.set()
+            for worker in workers:
+                worker.join()
+        self.assertEqual(self.breaker.state, circuit.CLOSED)
+        self.assertEqual(self.breaker.call(Reply, 200).status_code, 200)
+
+
+class BusyBulkheadTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='busy', email='busy@example.com', password='pass')
+        User.objects.filter(pk=self.user.pk).update(wallet_balance=Decimal('500.00'))
+        self.transaction = reserve_top_up(self.user, 'busy-1')
+
+    def test_turned_away_purchase_is_retried(self):
+        reply = mock.Mock(status_code=200)
+        reply.json.return_value = {'success': True, 'data': {'status': 'successful'}}
+        with mock.patch('transactions.yanga.post', side_effect=[circuit.BulkheadFull('full'), reply]) as post, \
+                mock.patch.object(topups.time, 'sleep'):
+            topups.dispatch(self.transaction.pk)
+
+        self.assertEqual(post.call_count, 2)
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'completed')
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.wallet_balance, self.user.held_balance), (Decimal('400.00'), Decimal('0.00')))
+
+    def test_purchase_left_unsent_while_bulkhead_stays_full(self):
+        with mock.patch('transactions.yanga.post', side_effect=circuit.BulkheadFull('full')) as post, \
+                mock.patch.object(topups.time, 'sleep'), self.assertLogs('transactions.topups', 'WARNING'):
+            self.assertIsNone(topups.dispatch(self.transaction.pk))
+
+        self.assertEqual(post.call_count, topups.BUSY_RETRIES + 1)
+        self.transaction.refresh_from_db()
+        self.assertEqual((self.transaction.status, self.transaction.sent_at), ('pending', None))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.held_balance, Decimal('100.00'))
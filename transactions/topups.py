@@ -0,0 +1,623 @@
+"""
+Airtime and data top-ups against Yanga.
+
+A top-up runs in three steps so that no database transaction or row lock is
+held while Yanga is working:
+
+1. ``reserve`` writes a pending ``Transaction`` (with the Yanga request kept in
+   ``metadata['request']``) and places a wallet hold for its amount.
+2. ``send`` posts the purchase to Yanga.
+3. ``settle`` captures the hold and completes the transaction, or releases
+   the hold and fails it. When Yanga has only accepted the purchase (or the
+   reply was lost after it was sent) the transaction stays pending with its
+   hold open.
+
+Synchronous top-ups run the three steps in the request. Asynchronous ones
+reserve in the request, then ``submit`` hands the transaction to a small
+per-process thread pool once the reservation commits. The pool size
+(``YANGA_TOPUP_WORKERS``) bounds how many purchases are in flight to Yanga.
+
+Bulk purchases (``TopUpBatch``) reserve every row in one database
+transaction with a single wallet hold update (``reserve_batch``), then
+``start_batch`` runs ``dispatch_batch`` in a background thread once the
+reservation commits. It sends the rows ``BATCH_CHUNK`` at a time through a
+per-process pool of ``YANGA_BULK_WORKERS`` threads shared by all batches, and
+settles each chunk in one database transaction.
+
+Every path marks a top-up as sent (``claim``, which sets ``sent_at``) before
+posting it to Yanga, and only posts it if the mark took. Request threads and
+both pools share the Yanga bulkhead (``YANGA_MAX_CONCURRENT``); a purchase it
+turns away was never sent, so it is unmarked and retried after a backoff
+(``post_claimed``) instead of failed; the request path queues it as an
+asynchronous top-up.
+
+Purchases left pending are finished by ``poll_pending`` (the
+``poll_topup_status`` command). Top-ups that were never sent are failed once
+they are ``YANGA_UNSENT_TIMEOUT`` seconds old: nothing reached Yanga, and the
+failure and the ``claim`` exclude each other. Sent ones are looked up by the
+``request_id`` we sent, stored in ``Transaction.provider_request_id``, at
+``YANGA_STATUS_PATH``, when that is configured. A lookup only fails a top-up
+when Yanga names a failed status; any other reply (a 404, an unknown status)
+leaves it pending. Sent top-ups still pending ``YANGA_REVIEW_AFTER`` seconds
+after they were sent (always the case while no status path is configured)
+are flagged with ``metadata['review']`` and logged as errors; staff settle
+them from the admin, which captures or releases their hold. A batch that has
+made no progress for ``YANGA_BULK_IDLE_TIMEOUT`` seconds is marked
+interrupted, which lets its unsent rows be failed.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import connection, transaction as db_transaction
+from django.db.models import Q
+from django.utils import timezone
+from urllib3.exceptions import NewConnectionError
+
+from spacevest import circuit
+
+from . import rollups, wallet, yanga
+from .models import TopUpBatch, Transaction, WalletHold
+
+logger = logging.getLogger(__name__)
+
+PENDING_STATUSES = {'pending', 'processing', 'queued', 'initiated'}
+FAILED_STATUSES = {'failed', 'declined', 'cancelled', 'reversed', 'refunded'}
+COMPLETED_STATUSES = {'successful', 'success', 'completed', 'delivered'}
+
+# Transaction categories of top-ups (not Yanga's biller categories)
+CATEGORIES = ['airtime', 'data']
+
+# Rows of a bulk purchase sent and settled together
+BATCH_CHUNK = 100
+
+# Retries of purchases turned away by a full bulkhead, and the first backoff
+# in seconds (doubled on each retry)
+BUSY_RETRIES = 5
+BUSY_BACKOFF = 0.5
+
+_lock = threading.Lock()
+_executor = None
+_bulk_executor = None
+
+
+def _reset():
+    global _executor, _bulk_executor
+    _executor = None
+    _bulk_executor = None
+
+
+# A forked worker must start its own threads
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.YANGA_TOPUP_WORKERS,
+                    thread_name_prefix='topup',
+                )
+    return _executor
+
+
+def _get_bulk_executor():
+    global _bulk_executor
+    if _bulk_executor is None:
+        with _lock:
+            if _bulk_executor is None:
+                _bulk_executor = ThreadPoolExecutor(
+                    max_workers=settings.YANGA_BULK_WORKERS,
+                    thread_name_prefix='topup-bulk',
+                )
+    return _bulk_executor
+
+
+def reserve(user, category, amount, description, payload, details_model, details):
+    """
+    Record a pending top-up and hold its amount. Returns the transaction.
+
+    Raises ``InsufficientFunds`` if the available balance is too low.
+    """
+    with db_transaction.atomic():
+        transaction = Transaction.objects.create(
+            user=user,
+            transaction_type='debit',
+            category=category,
+            amount=amount,
+            description=description,
+            metadata={'request': payload},
+            provider_request_id=payload['request_id'],
+        )
+        details_model.objects.create(transaction=transaction, **details)
+        wallet.hold(user, amount, transaction=transaction)
+    return transaction
+
+
+def reserve_batch(user, orders):
+    """
+    Record a pending top-up for each of ``orders`` and hold their total.
+    Returns the ``TopUpBatch``.
+
+    ``orders`` are ``(category, amount, description, payload, details_model,
+    details)`` tuples, as for ``reserve``. Raises ``InsufficientFunds`` (and
+    records nothing) if the available balance does not cover the total.
+    """
+    with db_transaction.atomic():
+        batch = TopUpBatch.objects.create(
+            user=user,
+            row_count=len(orders),
+            total_amount=sum(order[1] for order in orders),
+        )
+        transactions = Transaction.objects.bulk_create([
+            Transaction(
+                user=user,
+                transaction_type='debit',
+                category=category,
+                amount=amount,
+                description=description,
+                metadata={'request': payload, 'batch': batch.pk, 'row': row},
+                provider_request_id=payload['request_id'],
+            )
+            for row, (category, amount, description, payload, _, _) in enumerate(orders, start=1)
+        ])
+        details = {}
+        for transaction, (_, _, _, _, details_model, fields) in zip(transactions, orders):
+            details.setdefault(details_model, []).append(details_model(transaction=transaction, **fields))
+        for details_model, rows in details.items():
+            details_model.objects.bulk_create(rows)
+        wallet.hold_many(user, [(transaction.amount, transaction) for transaction in transactions])
+    return batch
+
+
+def batch_transactions(batch):
+    """
+    The top-up transactions of ``batch``.
+    """
+    # Rows are created after their batch, which lets the partitions before it be skipped
+    return Transaction.objects.filter(
+        user_id=batch.user_id,
+        created_at__gte=batch.created_at,
+        metadata__batch=batch.pk,
+    )
+
+
+def _result(response):
+    try:
+        result = response.json()
+    except ValueError:
+        result = None
+    if not isinstance(result, dict):
+        result = {'success': False, 'message': response.text[:500]}
+    return result
+
+
+def send(payload):
+    """
+    Post a purchase to Yanga. Returns ``(status_code, result)``;
+    ``status_code`` is ``None`` when no reply was received. ``result`` is then
+    marked ``unconfirmed`` if the purchase may still have gone through, or
+    ``busy`` if the bulkhead turned it away before it was sent.
+    """
+    try:
+        response = yanga.post("bill-payments/pay", json=payload)
+    except circuit.BulkheadFull as e:
+        return None, {'success': False, 'message': str(e), 'busy': True}
+    except requests.exceptions.RequestException as e:
+        reason = getattr(e.args[0], 'reason', None) if e.args else None
+        if isinstance(e, (requests.exceptions.ConnectTimeout, circuit.ProviderUnavailable)) or \
+                isinstance(reason, NewConnectionError):
+            # No connection was made (or the circuit is open), so nothing was sent
+            return None, {'success': False, 'message': str(e)}
+        return None, {'success': False, 'message': str(e), 'unconfirmed': True}
+    return response.status_code, _result(response)
+
+
+def check(request_id):
+    """
+    Look up the purchase sent with ``request_id`` at ``YANGA_STATUS_PATH``.
+    Returns ``(status_code, result)`` like ``send``; lookups that fail are
+    always ``unconfirmed``.
+    """
+    try:
+        response = yanga.get(settings.YANGA_STATUS_PATH.format(request_id))
+    except requests.exceptions.RequestException as e:
+        return None, {'success': False, 'message': str(e), 'unconfirmed': True}
+    if response.status_code == 429 or response.status_code >= 500:
+        return None, {'success': False, 'message': response.text[:500], 'unconfirmed': True}
+    return response.status_code, _result(response)
+
+
+def _state(result):
+    data = result.get('data')
+    return str(data.get('status', '')).lower() if isinstance(data, dict) else ''
+
+
+def outcome(status_code, result):
+    """
+    Classify a Yanga reply to a purchase as ``'completed'``, ``'failed'`` or
+    ``'pending'``.
+    """
+    if result.get('unconfirmed'):
+        return 'pending'
+    if status_code != 200 or not result.get('success'):
+        return 'failed'
+    state = _state(result)
+    if state in PENDING_STATUSES:
+        return 'pending'
+    if state in FAILED_STATUSES:
+        return 'failed'
+    return 'completed'
+
+
+def lookup_outcome(status_code, result):
+    """
+    Classify a reply to a status lookup (``check``). Only an explicit status
+    settles the top-up; anything else leaves it pending.
+    """
+    if result.get('unconfirmed') or status_code != 200:
+        return 'pending'
+    state = _state(result)
+    if state in FAILED_STATUSES:
+        return 'failed'
+    if state in COMPLETED_STATUSES and result.get('success'):
+        return 'completed'
+    return 'pending'
+
+
+def _apply(transaction, status_code, result, now, classify=outcome):
+    """
+    Set the fields of a pending ``transaction`` according to Yanga's reply,
+    as classified by ``classify``. Returns the outcome.
+    """
+    result_outcome = classify(status_code, result)
+    transaction.metadata = {**transaction.metadata, 'response': result}
+    if result_outcome == 'completed':
+        transaction.status = 'completed'
+        transaction.completed_at = now
+    elif result_outcome == 'failed':
+        transaction.status = 'failed'
+    return result_outcome
+
+
+def settle(transaction_id, status_code, result):
+    """
+    Complete or fail the pending top-up ``transaction_id`` from Yanga's reply,
+    or record the reply and leave it pending if Yanga has not finished.
+
+    Returns the transaction, or ``None`` if it was already settled.
+    """
+    with db_transaction.atomic():
+        transaction = (
+            Transaction.objects.select_for_update()
+            .select_related('user')
+            .filter(pk=transaction_id, status='pending')
+            .first()
+        )
+        if transaction is None:
+            return None
+        hold = WalletHold.objects.filter(transaction_id=transaction.pk, status='open').first()
+        result_outcome = _apply(transaction, status_code, result, timezone.now())
+        if result_outcome == 'pending':
+            transaction.save(update_fields=['metadata', 'updated_at'])
+            return transaction
+        if hold is not None:
+            if result_outcome == 'completed':
+                hold.user = transaction.user
+                hold.transaction = transaction
+                wallet.capture(hold)
+            else:
+                wallet.release(hold)
+        transaction.save()
+    return transaction
+
+
+def settle_manually(transaction_id, completed, by):
+    """
+    Complete or fail the pending top-up ``transaction_id`` once staff have
+    confirmed its outcome with Yanga. ``by`` is recorded in the reply.
+
+    Returns the transaction, or ``None`` if it was already settled.
+    """
+    if completed:
+        return settle(transaction_id, 200, {
+            'success': True, 'data': {'status': 'successful'}, 'message': f'Marked completed by {by}',
+        })
+    return settle(transaction_id, None, {'success': False, 'message': f'Marked failed by {by}'})
+
+
+def claim(transaction_ids):
+    """
+    Mark the pending, unsent top-ups among ``transaction_ids`` as sent.
+    Returns the ids marked; only those may be posted to Yanga.
+    """
+    with db_transaction.atomic():
+        claimed = list(
+            Transaction.objects.select_for_update(of=('self',))
+            .filter(pk__in=list(transaction_ids), status='pending', sent_at__isnull=True)
+            .values_list('id', flat=True)
+        )
+        Transaction.objects.filter(pk__in=claimed).update(sent_at=timezone.now())
+    return claimed
+
+
+def unclaim(transaction_ids):
+    """
+    Undo ``claim`` for top-ups that were not posted after all.
+    """
+    Transaction.objects.filter(pk__in=list(transaction_ids), status='pending').update(sent_at=None)
+
+
+def post_claimed(payloads, send_all=map):
+    """
+    Claim and post the top-ups in ``payloads`` (``{transaction_id:
+    request}``), with ``send_all`` mapping ``send`` over the requests. Rows
+    the bulkhead turns away are unclaimed and retried up to ``BUSY_RETRIES``
+    times; any still turned away are left unsent.
+
+    Returns ``{transaction_id: (status_code, result)}`` for the rows posted.
+    """
+    replies = {}
+    ids = list(payloads)
+    for attempt in range(BUSY_RETRIES + 1):
+        if attempt:
+            time.sleep(BUSY_BACKOFF * 2 ** (attempt - 1))
+        claimed = claim(ids)
+        ids = []
+        for pk, reply in zip(claimed, send_all(send, [payloads[pk] for pk in claimed])):
+            if reply[1].get('busy'):
+                ids.append(pk)
+            else:
+                replies[pk] = reply
+        if not ids:
+            break
+        unclaim(ids)
+    if ids:
+        logger.warning('Yanga bulkhead still full; top-ups %s left unsent', ids)
+    return replies
+
+
+def submit(transaction_id):
+    """
+    Queue the reserved top-up ``transaction_id`` for dispatch.
+    """
+    return _get_executor().submit(dispatch, transaction_id)
+
+
+def dispatch(transaction_id):
+    """
+    Send the purchase for ``transaction_id`` to Yanga and settle it.
+    """
+    try:
+        metadata = Transaction.objects.filter(pk=transaction_id).values_list('metadata', flat=True).get()
+        replies = post_claimed({transaction_id: metadata['request']})
+        if transaction_id not in replies:
+            return None
+        status_code, result = replies[transaction_id]
+        if status_code is None:
+            logger.warning('Top-up dispatch failed for transaction %s: %s', transaction_id, result['message'])
+        return settle(transaction_id, status_code, result)
+    finally:
+        connection.close()
+
+
+def _settle_batch(replies, classify=outcome, unsent=False):
+    """
+    Settle the pending top-ups in ``replies`` (``{transaction_id:
+    (status_code, result)}``, classified by ``classify``) in one database
+    transaction. Rows another worker has locked are skipped and left for the
+    next poll, as are, with ``unsent`` set, rows that have been sent since.
+
+    Returns ``{outcome: count}``.
+    """
+    counts = {'completed': 0, 'failed': 0, 'pending': 0}
+    now = timezone.now()
+    with db_transaction.atomic():
+        transactions = (
+            Transaction.objects.select_for_update(skip_locked=True, of=('self',))
+            .select_related('user')
+            .filter(pk__in=list(replies), status='pending')
+        )
+        if unsent:
+            transactions = transactions.filter(sent_at__isnull=True)
+        transactions = list(transactions)
+        holds = {
+            hold.transaction_id: hold
+            for hold in WalletHold.objects.filter(
+                transaction_id__in=[t.pk for t in transactions], status='open'
+            )
+        }
+        completed = []
+        captured, released = [], []
+        for transaction in transactions:
+            status_code, result = replies[transaction.pk]
+            result_outcome = _apply(transaction, status_code, result, now, classify)
+            # bulk_update does not touch auto_now fields
+            transaction.updated_at = now
+            counts[result_outcome] += 1
+            hold = holds.get(transaction.pk)
+            if result_outcome == 'completed':
+                completed.append(transaction)
+                if hold is not None:
+                    hold.user = transaction.user
+                    hold.transaction = transaction
+                    captured.append(hold)
+            elif result_outcome == 'failed' and hold is not None:
+                released.append(hold)
+        wallet.settle_many(captured, released)
+        Transaction.objects.bulk_update(transactions, ['status', 'completed_at', 'metadata', 'updated_at'])
+        # bulk_update skips post_save, which keeps the rollups for single saves
+        rollups.record(completed)
+    return counts
+
+
+def start_batch(batch_id):
+    """
+    Dispatch the reserved batch ``batch_id`` in a background thread.
+    """
+    thread = threading.Thread(
+        target=dispatch_batch, args=(batch_id,), name=f'topup-batch-{batch_id}', daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def dispatch_batch(batch_id):
+    """
+    Send the pending rows of batch ``batch_id`` to Yanga and settle them,
+    ``BATCH_CHUNK`` rows at a time. Returns ``{outcome: count}``.
+    """
+    totals = {'completed': 0, 'failed': 0, 'pending': 0}
+    try:
+        batch = TopUpBatch.objects.filter(pk=batch_id, status='processing').first()
+        if batch is None:
+            return totals
+        pending = batch_transactions(batch).filter(status='pending').order_by('id')
+        executor = _get_bulk_executor()
+        last = 0
+        while True:
+            rows = list(pending.filter(id__gt=last).values_list('id', 'metadata')[:BATCH_CHUNK])
+            if not rows:
+                break
+            last = rows[-1][0]
+            # Also marks the batch as alive; stop if it has been given up on meanwhile
+            if not TopUpBatch.objects.filter(pk=batch_id, status='processing').update(updated_at=timezone.now()):
+                return totals
+            replies = post_claimed({row[0]: row[1]['request'] for row in rows}, executor.map)
+            for result_outcome, count in _settle_batch(replies).items():
+                totals[result_outcome] += count
+        TopUpBatch.objects.filter(pk=batch_id, status='processing').update(
+            status='completed', completed_at=timezone.now(), updated_at=timezone.now()
+        )
+        return totals
+    finally:
+        connection.close()
+
+
+def expire_batches(idle):
+    """
+    Mark the batches that have made no progress for ``idle`` as interrupted,
+    so that ``poll_pending`` picks up their remaining rows. Returns how many
+    were marked.
+    """
+    return TopUpBatch.objects.filter(status='processing', updated_at__lt=timezone.now() - idle).update(
+        status='interrupted', updated_at=timezone.now()
+    )
+
+
+def _pending_top_ups(**filters):
+    return Transaction.objects.filter(
+        status='pending',
+        category__in=CATEGORIES,
+        provider_request_id__isnull=False,
+        **filters,
+    ).order_by('created_at', 'id')
+
+
+def _walk(pending, batch_size):
+    """
+    Yield ``pending`` in pages of ``(id, created_at, provider_request_id)``,
+    in ``created_at`` order.
+    """
+    last = None
+    while True:
+        page = pending
+        if last is not None:
+            page = page.filter(Q(created_at__gt=last[0]) | Q(created_at=last[0], id__gt=last[1]))
+        rows = list(page.values_list('id', 'created_at', 'provider_request_id')[:batch_size])
+        if not rows:
+            return
+        last = (rows[-1][1], rows[-1][0])
+        yield rows
+
+
+def fail_unsent(age, batch_size=100):
+    """
+    Fail the top-ups that have not been sent to Yanga within ``age``, except
+    rows of batches still being dispatched. Returns ``{outcome: count}``.
+    """
+    totals = {'completed': 0, 'failed': 0, 'pending': 0}
+    pending = _pending_top_ups(sent_at__isnull=True, created_at__lt=timezone.now() - age)
+    dispatching = list(TopUpBatch.objects.filter(status='processing').values_list('pk', flat=True))
+    if dispatching:
+        pending = pending.filter(Q(metadata__batch__isnull=True) | ~Q(metadata__batch__in=dispatching))
+    reply = (None, {'success': False, 'message': 'Not sent to Yanga in time'})
+    for rows in _walk(pending, batch_size):
+        for result_outcome, count in _settle_batch({row[0]: reply for row in rows}, unsent=True).items():
+            totals[result_outcome] += count
+    return totals
+
+
+def flag_stale(age, batch_size=100):
+    """
+    Flag the top-ups sent more than ``age`` ago that are still pending for
+    manual review. Returns how many were newly flagged.
+    """
+    pending = _pending_top_ups(sent_at__lt=timezone.now() - age, metadata__review__isnull=True)
+    flagged = []
+    for rows in _walk(pending, batch_size):
+        with db_transaction.atomic():
+            transactions = list(
+                Transaction.objects.select_for_update(skip_locked=True)
+                .filter(pk__in=[row[0] for row in rows], status='pending')
+            )
+            for transaction in transactions:
+                transaction.metadata = {**transaction.metadata, 'review': True}
+            Transaction.objects.bulk_update(transactions, ['metadata'])
+        flagged += [transaction.pk for transaction in transactions]
+    if flagged:
+        logger.error('Top-ups %s have been pending with Yanga for over %s; flagged for manual review',
+                     flagged, age)
+    return len(flagged)
+
+
+def poll_pending(batch_size=100, workers=8, min_age=timedelta(minutes=1)):
+    """
+    Fail the top-ups that were never sent (see ``fail_unsent``), then look up
+    every sent top-up that has been pending for at least ``min_age`` and
+    settle the ones Yanga has finished. Lookups are skipped while
+    ``YANGA_STATUS_PATH`` is not set. Finally, the sent top-ups still pending
+    after ``YANGA_REVIEW_AFTER`` are flagged (see ``flag_stale``).
+
+    Sent rows are walked ``batch_size`` at a time in ``created_at`` order;
+    each batch is looked up with at most ``workers`` requests in flight and
+    then settled in one database transaction. Returns ``{outcome: count}``,
+    with the number newly flagged under ``'review'``.
+    """
+    expire_batches(timedelta(seconds=settings.YANGA_BULK_IDLE_TIMEOUT))
+    totals = fail_unsent(timedelta(seconds=settings.YANGA_UNSENT_TIMEOUT), batch_size)
+    if settings.YANGA_STATUS_PATH:
+        for result_outcome, count in _look_up(batch_size, workers, min_age).items():
+            totals[result_outcome] += count
+    totals['review'] = flag_stale(timedelta(seconds=settings.YANGA_REVIEW_AFTER), batch_size)
+    return totals
+
+
+def _look_up(batch_size, workers, min_age):
+    totals = {'completed': 0, 'failed': 0, 'pending': 0}
+    pending = _pending_top_ups(sent_at__isnull=False, created_at__lte=timezone.now() - min_age)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='topup-poll') as executor:
+        for rows in _walk(pending, batch_size):
+            replies = dict(zip(
+                [row[0] for row in rows],
+                executor.map(check, [row[2] for row in rows]),
+            ))
+            for result_outcome, count in _settle_batch(replies, classify=lookup_outcome).items():
+                totals[result_outcome] += count
+            unrecognised = [
+                pk for pk, (status_code, result) in replies.items()
+                if not result.get('unconfirmed') and lookup_outcome(status_code, result) == 'pending'
+                and _state(result) not in PENDING_STATUSES
+            ]
+            if unrecognised:
+                logger.warning('Unrecognised Yanga status replies for top-ups %s; left pending for review',
+                               unrecognised)
+    return totals
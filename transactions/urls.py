@@ -4,6 +4,8 @@ from . import views
 urlpatterns = [
     path('', views.TransactionListView.as_view(), name='transaction-list'),
     path('history/', views.TransactionListView.as_view(), name='transaction-history'),
+    path('statement/<str:export_format>/', views.export_statement, name='export-statement'),
+    path('summary/', views.spending_summary, name='spending-summary'),
     path('<int:pk>/', views.TransactionDetailView.as_view(), name='transaction-detail'),
     path('transfer/', views.transfer_funds, name='transfer-funds'),
     path('withdraw/', views.withdraw_funds, name='withdraw-funds'),
@@ -11,6 +13,8 @@ urlpatterns = [
     path('purchase/airtime/', views.purchase_airtime, name='purchase-airtime'),
     path('purchase/data/', views.purchase_data, name='purchase-data'),
     path('top-up/', views.top_up, name='top-up'),
+    path('top-up/bulk/', views.bulk_top_up, name='bulk-top-up'),
+    path('top-up/bulk/<int:pk>/', views.top_up_batch_detail, name='top-up-batch-detail'),
     path('add-funds/', views.add_funds, name='add-funds'),  # New endpoint for adding funds
     path('billers/<str:category>/', views.get_billers, name='get-billers'),
     path('products/<str:biller_code>/', views.get_products, name='get-products'),
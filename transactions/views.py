@@ -2,42 +2,241 @@ from django.conf import settings
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from django.db import transaction as db_transaction
+from django.db.models import Count, Sum
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.http import StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+import httpx
 import requests
-from requests.adapters import HTTPAdapter
 import uuid
-import time
-import random
-from datetime import timedelta
-from urllib3.util.retry import Retry
-from .models import Transaction, TransactionFee, CryptoTransaction, AirtimeTransaction, DataTransaction
+from decimal import Decimal
+import codecs
+import csv
+import functools
+import itertools
+import json
+import logging
+import re
+from datetime import datetime, timedelta
+from .models import Transaction, TransactionFee, CryptoTransaction, AirtimeTransaction, DataTransaction, DailySpend, ArchivedTransaction, TopUpBatch
+from .pagination import KeysetPagination
 from .serializers import (
     TransactionSerializer, CreateTransactionSerializer, TransferSerializer,
     WithdrawalSerializer, CryptoPurchaseSerializer, AirtimePurchaseSerializer,
-    DataPurchaseSerializer
+    DataPurchaseSerializer, TransactionFilterSerializer, ArchivedTransactionSerializer,
+    TopUpBatchSerializer
 )
 from users.models import BankAccount
+from spacevest import aio, circuit
+from . import catalog, topups, wallet, yanga
+from .wallet import InsufficientFunds
+
+logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
-class TransactionListView(generics.ListAPIView):
+def filter_transactions(queryset, params):
+    """
+    Apply the history filters in ``params`` to ``queryset``.
+
+    Dates are turned into a half-open ``created_at`` range so the filter stays
+    a range scan on the composite ``(user, <filter>, created_at)`` indexes.
+    """
+    filters = TransactionFilterSerializer(data=params)
+    filters.is_valid(raise_exception=True)
+    data = filters.validated_data
+
+    for field in ('category', 'status', 'transaction_type'):
+        if field in data:
+            queryset = queryset.filter(**{field: data[field]})
+
+    tz = timezone.get_current_timezone()
+    if 'date_from' in data:
+        queryset = queryset.filter(created_at__gte=datetime.combine(data['date_from'], datetime.min.time(), tzinfo=tz))
+    if 'date_to' in data:
+        end = data['date_to'] + timedelta(days=1)
+        queryset = queryset.filter(created_at__lt=datetime.combine(end, datetime.min.time(), tzinfo=tz))
+    return queryset
+
+DETAIL_RELATIONS = ['fee', 'crypto_details', 'airtime_details', 'data_details']
+
+def _split_param(value):
+    return [name.strip() for name in value.split(',') if name.strip()] if value else []
+
+def sparse_fields(serializer_class, params, compact):
+    """
+    Resolve ``?fields=`` and ``?expand=`` into the list of fields to render.
+
+    ``fields`` picks the fields outright; otherwise the compact representation
+    (when ``compact``) drops the serializer's expandable fields. ``expand``
+    adds fields back on top of either.
+    """
+    available = serializer_class.Meta.fields
+    requested = _split_param(params.get('fields'))
+    expand = _split_param(params.get('expand'))
+
+    errors = {}
+    for param, names in (('fields', requested), ('expand', expand)):
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            errors[param] = [f"Unknown field(s): {', '.join(unknown)}"]
+    if errors:
+        raise ValidationError(errors)
+
+    if requested:
+        selected = set(requested)
+    elif compact:
+        selected = set(available) - set(serializer_class.expandable_fields)
+    else:
+        selected = set(available)
+    selected.update(expand)
+    return [name for name in available if name in selected]
+
+class SparseFieldsViewMixin:
+    """
+    View side of ``?fields=`` / ``?expand=``: renders only the selected fields,
+    joins only the detail relations being rendered and leaves unrendered
+    JSON columns unread.
+    """
+    compact = False
+
+    def get_rendered_fields(self):
+        if not hasattr(self, '_rendered_fields'):
+            self._rendered_fields = sparse_fields(self.get_serializer_class(), self.request.query_params, self.compact)
+        return self._rendered_fields
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_rendered_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def trim_queryset(self, queryset):
+        fields = self.get_rendered_fields()
+        relations = [name for name in DETAIL_RELATIONS if name in fields]
+        if relations:
+            queryset = queryset.select_related(*relations)
+        columns = {field.name for field in queryset.model._meta.concrete_fields}
+        deferred = [
+            name for name in self.get_serializer_class().expandable_fields
+            if name in columns and name not in fields
+        ]
+        return queryset.defer(*deferred) if deferred else queryset
+
+class TransactionListView(SparseFieldsViewMixin, generics.ListAPIView):
+    """
+    Transaction history, compact by default. Use ``?expand=metadata,fee`` to
+    include heavy fields or ``?fields=id,amount`` to pick fields outright.
+    """
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    compact = True
+
+    def is_archived(self):
+        return self.request.query_params.get('archived', '').lower() in ('1', 'true', 'yes')
+
+    def get_serializer_class(self):
+        if self.is_archived():
+            return ArchivedTransactionSerializer
+        return TransactionSerializer
 
     def get_queryset(self):
-        return Transaction.objects.filter(user=self.request.user).select_related(
-            'fee', 'crypto_details', 'airtime_details', 'data_details'
+        # ?archived=true reads months that have been moved out of the
+        # partitioned table; otherwise only the live partitions are scanned.
+        if self.is_archived():
+            queryset = ArchivedTransaction.objects.filter(user=self.request.user)
+        else:
+            queryset = Transaction.objects.filter(user=self.request.user)
+        return filter_transactions(self.trim_queryset(queryset), self.request.query_params)
+
+class Echo:
+    """File-like object whose write() hands the value back, for csv.writer streaming."""
+    def write(self, value):
+        return value
+
+STATEMENT_COLUMNS = [
+    'reference', 'created_at', 'completed_at', 'transaction_type', 'category',
+    'status', 'amount', 'description', 'recipient_email',
+]
+STATEMENT_CHUNK_SIZE = 2000
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def export_statement(request, export_format):
+    """
+    Stream the user's transactions as CSV or NDJSON, oldest first.
+
+    Rows are read through a server-side cursor and written out as they arrive,
+    so memory stays flat regardless of how long the statement is. Accepts the
+    same filters as the history endpoint.
+    """
+    if export_format not in ('csv', 'ndjson'):
+        return Response({'error': 'Unsupported format. Use csv or ndjson.'}, status=status.HTTP_404_NOT_FOUND)
+
+    queryset = filter_transactions(Transaction.objects.filter(user=request.user), request.query_params)
+    rows = queryset.order_by('created_at', 'id').values_list(*STATEMENT_COLUMNS).iterator(
+        chunk_size=STATEMENT_CHUNK_SIZE
+    )
+
+    if export_format == 'csv':
+        writer = csv.writer(Echo())
+        content = itertools.chain(
+            [writer.writerow(STATEMENT_COLUMNS)],
+            (writer.writerow(row) for row in rows),
         )
+        content_type = 'text/csv'
+    else:
+        content = (
+            json.dumps(dict(zip(STATEMENT_COLUMNS, row)), cls=DjangoJSONEncoder) + '\n'
+            for row in rows
+        )
+        content_type = 'application/x-ndjson'
+
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="statement.{export_format}"'
+    return response
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def spending_summary(request):
+    """
+    Spending totals by category and by day, read from the daily rollups.
 
-class TransactionDetailView(generics.RetrieveAPIView):
+    Defaults to debits over the last 30 days; accepts transaction_type,
+    category, date_from and date_to.
+    """
+    filters = TransactionFilterSerializer(data=request.query_params)
+    filters.is_valid(raise_exception=True)
+    data = filters.validated_data
+
+    date_to = data.get('date_to', timezone.localdate())
+    date_from = data.get('date_from', date_to - timedelta(days=29))
+    rows = DailySpend.objects.filter(
+        user=request.user,
+        transaction_type=data.get('transaction_type', 'debit'),
+        day__gte=date_from,
+        day__lte=date_to,
+    )
+    if 'category' in data:
+        rows = rows.filter(category=data['category'])
+
+    by_category = rows.values('category').annotate(count=Sum('count'), total=Sum('total')).order_by('-total')
+    by_day = rows.values('day').annotate(count=Sum('count'), total=Sum('total')).order_by('day')
+    return Response({
+        'date_from': date_from,
+        'date_to': date_to,
+        'by_category': list(by_category),
+        'by_day': list(by_day),
+    })
+
+class TransactionDetailView(SparseFieldsViewMixin, generics.RetrieveAPIView):
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Transaction.objects.filter(user=self.request.user).select_related(
-            'fee', 'crypto_details', 'airtime_details', 'data_details'
-        )
+        return self.trim_queryset(Transaction.objects.filter(user=self.request.user))
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
@@ -57,25 +256,19 @@ def transfer_funds(request):
                     amount=data['amount'],
                     description=data['description'],
                     recipient=recipient,
-                    recipient_email=data['recipient_email']
+                    recipient_email=data['recipient_email'],
+                    status='completed'
                 )
                 
-                # Deduct from sender
-                request.user.wallet_balance -= data['amount']
-                request.user.save()
-                
-                # Add to recipient
-                recipient.wallet_balance += data['amount']
-                recipient.save()
-                
-                # Update transaction status
-                transaction.status = 'completed'
-                transaction.save()
+                # Move the funds from sender to recipient
+                wallet.transfer(request.user, recipient, data['amount'], transaction=transaction)
                 
                 return Response(TransactionSerializer(transaction).data, status=status.HTTP_201_CREATED)
                 
         except User.DoesNotExist:
             return Response({'error': 'Recipient not found'}, status=status.HTTP_404_NOT_FOUND)
+        except InsufficientFunds as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
@@ -116,8 +309,7 @@ def add_funds(request):
             )
             
             # Update user's wallet balance
-            request.user.wallet_balance += amount
-            request.user.save()
+            wallet.credit(request.user, amount, transaction=transaction)
 
             return Response(TransactionSerializer(transaction).data, status=status.HTTP_201_CREATED)
     except Exception as e:
@@ -144,8 +336,7 @@ def withdraw_funds(request):
                 )
                 
                 # Deduct from wallet
-                request.user.wallet_balance -= data['amount']
-                request.user.save()
+                wallet.debit(request.user, data['amount'], transaction=transaction)
                 
                 # TODO: Integrate with Paystack or other payment gateway for actual bank transfer
                 
@@ -153,6 +344,8 @@ def withdraw_funds(request):
                 
         except BankAccount.DoesNotExist:
             return Response({'error': 'Bank account not found'}, status=status.HTTP_404_NOT_FOUND)
+        except InsufficientFunds as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     
@@ -164,13 +357,13 @@ def purchase_crypto(request):
     serializer = CryptoPurchaseSerializer(data=request.data)
     if serializer.is_valid():
         try:
+            data = serializer.validated_data
+            
+            # TODO: Get current exchange rate from CoinGecko API
+            exchange_rate = Decimal('1500.00')  # Placeholder - replace with actual API call
+            crypto_amount = data['amount_ngn'] / exchange_rate
+            
             with db_transaction.atomic():
-                data = serializer.validated_data
-                
-                # TODO: Get current exchange rate from CoinGecko API
-                exchange_rate = 1500.00  # Placeholder - replace with actual API call
-                crypto_amount = data['amount_ngn'] / exchange_rate
-                
                 # Create transaction
                 transaction = Transaction.objects.create(
                     user=request.user,
@@ -192,13 +385,12 @@ def purchase_crypto(request):
                 )
                 
                 # Deduct from wallet
-                request.user.wallet_balance -= data['amount_ngn']
-                request.user.save()
+                wallet.debit(request.user, data['amount_ngn'], transaction=transaction)
                 
                 transaction.status = 'completed'
                 transaction.save()
-                
-                return Response(TransactionSerializer(transaction).data, status=status.HTTP_201_CREATED)
+            
+            return Response(TransactionSerializer(transaction).data, status=status.HTTP_201_CREATED)
                 
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -232,8 +424,7 @@ def purchase_airtime(request):
                 )
                 
                 # Deduct from wallet
-                request.user.wallet_balance -= data['amount']
-                request.user.save()
+                wallet.debit(request.user, data['amount'], transaction=transaction)
                 
                 # TODO: Integrate with airtime API
                 
@@ -275,8 +466,7 @@ def purchase_data(request):
                 )
 
                 # Deduct from wallet
-                request.user.wallet_balance -= data['amount']
-                request.user.save()
+                wallet.debit(request.user, data['amount'], transaction=transaction)
 
                 # TODO: Integrate with data API
 
@@ -290,404 +480,347 @@ def purchase_data(request):
 
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-@api_view(['GET'])
-@permission_classes([permissions.IsAuthenticated])
-def get_billers(request, category):
+@aio.api_view(['GET'])
+async def get_billers(request, category):
     """
-    Fetch billers from Yanga API for the specified category (airtime or data_bundle)
+    Billers for the specified category (airtime or data_bundle), served from
+    the local catalog
     """
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Bearer {settings.YANGA_API_KEY}",
-        "User-Agent": "SpaceVest/1.0 (https://spacevest.com.ng; support@spacevest.com.ng)",
-        "X-Requested-With": "XMLHttpRequest",
-        "Referer": "https://spacevest.com.ng"
-    }
-
     # Map frontend category to Yanga API category
     api_category = 'data_bundle' if category == 'data_bundle' else category
 
-    # Configure session with retry strategy
-    session = requests.Session()
-    retry_strategy = Retry(
-        total=3,
-        backoff_factor=1,
-        status_forcelist=[429, 500, 502, 503, 504],
-        allowed_methods=["GET", "POST"]
-    )
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-    
     try:
-        url = f"{settings.YANGA_API_BASE_URL}/bill-payments/billers/{api_category}"
-        print(f"Making request to: {url}")  # Log the URL being called
-        
-        response = session.get(url, headers=headers, timeout=10)
-        print(f"Response status: {response.status_code}")  # Log response status
-        
-        response.raise_for_status()  # Raise HTTPError for bad responses
-        
-        data = response.json()
-        print(f"Yanga API response for {api_category}: {data}")  # Debug logging
+        return aio.Response({'billers': await catalog.abillers(api_category)}, status=status.HTTP_200_OK)
+    except catalog.CatalogError as e:
+        logger.warning('Catalog error for %s: %s', api_category, e)
+        return aio.Response({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
+    except (httpx.HTTPError, requests.exceptions.RequestException) as e:
+        logger.error('Request error in get_billers for %s: %s', api_category, e)
+        return aio.Response({'error': 'Failed to fetch billers. Please try again later.', 'details': str(e)}, 
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    except ValueError as e:
+        logger.error('Invalid response format in get_billers for %s: %s', api_category, e)
+        return aio.Response({'error': 'Invalid response from service provider', 'details': str(e)},
+                            status=status.HTTP_502_BAD_GATEWAY)
+    except Exception as e:
+        logger.exception('Unexpected error in get_billers for %s', api_category)
+        return aio.Response({'error': 'An unexpected error occurred', 'details': str(e)},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        if not isinstance(data, dict):
-            raise ValueError(f"Expected dict response, got {type(data).__name__}")
-            
-        if data.get('success'):
-            billers_data = data.get('data', {})
-            # Ensure billers_data has the expected structure
-            if isinstance(billers_data, dict) and 'billers' in billers_data:
-                billers_list = billers_data['billers']
-            elif isinstance(billers_data, list):
-                billers_list = billers_data
-            else:
-                billers_list = billers_data if billers_data else []
-
-            # Use the actual biller codes from Yanga API response
-            transformed_billers = []
-            for biller in billers_list:
-                if isinstance(biller, dict):
-                    # Use the actual biller codes from Yanga API
-                    biller_code = biller.get('code', '')
-                    biller_name = biller.get('name', '')
-                    has_products = biller.get('has_products', False)
-
-                    transformed_billers.append({
-                        'code': biller_code,
-                        'name': biller_name,
-                        'has_products': has_products,
-                        'minimum': biller.get('minimum'),
-                        'maximum': biller.get('maximum'),
-                        'category': biller.get('category', api_category)
-                    })
-
-            return Response({'billers': transformed_billers}, status=status.HTTP_200_OK)
-        else:
-            error_msg = data.get('message', f'No billers found for this category ({response.status_code})')
-            print(f"Yanga API error for {api_category}: {response.status_code} - {response.text}")
-            return Response({'error': error_msg}, status=status.HTTP_404_NOT_FOUND)
-    except requests.exceptions.RequestException as e:
-        error_msg = f"Request error in get_billers for {api_category}: {str(e)}"
-        print(error_msg)
-        return Response({'error': 'Failed to fetch billers. Please try again later.', 'details': str(e)}, 
-                       status=status.HTTP_503_SERVICE_UNAVAILABLE)
+@aio.api_view(['GET'])
+async def get_products(request, biller_code):
+    """
+    Products for a specific biller, served from the local catalog
+    """
+    try:
+        return aio.Response({'products': await catalog.aproducts(biller_code)}, status=status.HTTP_200_OK)
+    except catalog.CatalogError as e:
+        logger.warning('Catalog products error for %s: %s', biller_code, e)
+        return aio.Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except (httpx.HTTPError, requests.exceptions.RequestException) as e:
+        logger.error('Request error in get_products for %s: %s', biller_code, e)
+        return aio.Response({'error': 'Failed to fetch products. Please try again later.', 'details': str(e)}, 
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
     except ValueError as e:
-        error_msg = f"Invalid response format in get_billers for {api_category}: {str(e)}"
-        print(error_msg)
-        return Response({'error': 'Invalid response from service provider', 'details': str(e)},
-                       status=status.HTTP_502_BAD_GATEWAY)
+        logger.error('Invalid response format in get_products for %s: %s', biller_code, e)
+        return aio.Response({'error': 'Invalid response from service provider', 'details': str(e)},
+                            status=status.HTTP_502_BAD_GATEWAY)
     except Exception as e:
-        error_msg = f"Unexpected error in get_billers for {api_category}: {str(e)}"
-        print(error_msg)
-        return Response({'error': 'An unexpected error occurred', 'details': str(e)},
-                       status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        logger.exception('Unexpected error in get_products for %s', biller_code)
+        return aio.Response({'error': 'An unexpected error occurred', 'details': str(e)},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-@api_view(['GET'])
-@permission_classes([permissions.IsAuthenticated])
-def get_products(request, biller_code):
+def run_top_up(user, category, amount, description, payload, details_model, details, submit_async):
     """
-    Fetch products for a specific biller from Yanga API
+    Reserve the funds for a top-up, then either queue the purchase (202 with
+    the pending transaction's reference) or send it and settle it inline.
+    An inline purchase Yanga has not finished, or that the Yanga bulkhead
+    turned away (it is then queued), is also answered with 202.
     """
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Bearer {settings.YANGA_API_KEY}",
-        "User-Agent": "SpaceVest/1.0 (https://spacevest.com.ng; support@spacevest.com.ng)",
-        "X-Requested-With": "XMLHttpRequest",
-        "Referer": "https://spacevest.com.ng"
-    }
+    if yanga.breaker().state == circuit.OPEN:
+        # Fail fast rather than reserve funds for a purchase that cannot be sent
+        return Response({'error': f'{category} purchases are temporarily unavailable, please try again shortly'},
+                        status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    transaction = topups.reserve(user, category, amount, description, payload, details_model, details)
+
+    if submit_async:
+        db_transaction.on_commit(lambda: topups.submit(transaction.pk))
+        return Response({
+            'reference': transaction.reference,
+            'status': transaction.status,
+            'transaction': TransactionSerializer(transaction).data,
+        }, status=status.HTTP_202_ACCEPTED)
+
+    topups.claim([transaction.pk])
+    status_code, result = topups.send(payload)
+    if result.get('busy'):
+        # Nothing was sent; queue it like an async top-up rather than fail it
+        topups.unclaim([transaction.pk])
+        db_transaction.on_commit(lambda: topups.submit(transaction.pk))
+    else:
+        transaction = topups.settle(transaction.pk, status_code, result)
+
+    if transaction.status == 'pending':
+        # Yanga has not confirmed yet (poll_topup_status settles it later), or
+        # the purchase was queued
+        return Response({
+            'reference': transaction.reference,
+            'status': transaction.status,
+            'transaction': TransactionSerializer(transaction).data,
+        }, status=status.HTTP_202_ACCEPTED)
+    if transaction.status != 'completed':
+        if status_code is None:
+            return Response({'error': f'Failed to complete {category} purchase'}, status=status.HTTP_502_BAD_GATEWAY)
+        return Response({'error': result.get('message', 'Purchase failed')}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(TransactionSerializer(transaction).data, status=status.HTTP_201_CREATED)
+
+def _requires_product_code(biller_code):
+    try:
+        return catalog.requires_product_code(biller_code)
+    except (catalog.CatalogError, requests.exceptions.RequestException, ValueError):
+        # Assume no products for airtime
+        return False
 
-    # Use the actual biller codes from Yanga API
-    api_biller_code = biller_code
+def _airtime_order(data, requires_product_code=_requires_product_code):
+    """
+    Validate an airtime purchase. Returns ``(order, errors)``, where ``order``
+    is the ``(category, amount, description, payload, details_model,
+    details)`` tuple ``run_top_up`` and ``topups.reserve_batch`` take.
+    """
+    serializer = AirtimePurchaseSerializer(data=data)
+    if not serializer.is_valid():
+        return None, serializer.errors
+    validated_data = serializer.validated_data
+
+    # Use the actual biller code from the network field
+    api_biller_code = validated_data['network']
+
+    product_code = None
+    # For airtime, check the catalog for predefined products
+    if requires_product_code(api_biller_code):
+        # Has predefined products - use product code
+        product_code = validated_data.get('product_code')
+        if not product_code:
+            return None, {'error': 'Product code is required for this airtime plan'}
+
+    # Prepare payload for purchase
+    purchase_payload = {
+        "request_id": str(uuid.uuid4()),
+        "biller_code": api_biller_code,
+        "recipient": validated_data['phone_number'],
+        "sync": False
+    }
 
-    # Configure session with retry strategy
-    session = requests.Session()
-    retry_strategy = Retry(
-        total=3,
-        backoff_factor=1,
-        status_forcelist=[429, 500, 502, 503, 504],
-        allowed_methods=["GET", "POST"]
-    )
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-    
-    try:
-        url = f"{settings.YANGA_API_BASE_URL}/bill-payments/products/{api_biller_code}"
-        print(f"Making request to: {url}")  # Log the URL being called
-        
-        response = session.get(url, headers=headers, timeout=10)
-        print(f"Response status: {response.status_code}")  # Log response status
-        
-        response.raise_for_status()  # Raise HTTPError for bad responses
-        
-        data = response.json()
-        print(f"Yanga API products response for {api_biller_code}: {data}")
+    # Add product_code if available, otherwise add amount for custom airtime
+    if product_code:
+        purchase_payload["product_code"] = product_code
+    else:
+        # For custom airtime amount - convert to integer
+        purchase_payload["amount"] = int(validated_data['amount'])
+
+    return (
+        'airtime', validated_data['amount'],
+        f"Airtime purchase for {validated_data['phone_number']}",
+        purchase_payload, AirtimeTransaction, {
+            'phone_number': validated_data['phone_number'],
+            'network': validated_data['network'],
+            'plan_name': validated_data.get('plan_name'),
+        },
+    ), None
+
+def _data_order(data):
+    """
+    Validate a data bundle purchase. Returns ``(order, errors)`` like
+    ``_airtime_order``.
+    """
+    plan = data.get('data_plan', '')
+    amount = data.get('amount')
+    product_code = data.get('product_code')
+    network = data.get('network')
+
+    # Ensure amount is properly handled
+    if amount is None and plan:
+        match = re.search(r'₦(\d+)', plan)
+        if match:
+            amount = int(match.group(1))
+
+    data_copy = data.copy()
+    data_copy['data_plan'] = plan
+    data_copy['amount'] = amount
+
+    serializer = DataPurchaseSerializer(data=data_copy)
+    if not serializer.is_valid():
+        return None, serializer.errors
+    validated_data = serializer.validated_data
+
+    # For data bundles, product_code is always required since they have predefined products
+    if not product_code:
+        return None, {'error': 'Product code is required for data bundle purchase'}
+
+    # Prepare payload for purchase; the network field is the biller code
+    purchase_payload = {
+        "request_id": str(uuid.uuid4()),
+        "biller_code": network,
+        "recipient": validated_data['phone_number'],
+        "sync": False,
+        "product_code": product_code
+    }
 
-        if not isinstance(data, dict):
-            raise ValueError(f"Expected dict response, got {type(data).__name__}")
-            
-        if data.get('success'):
-            products_data = data.get('data', {})
-            # Ensure products_data has the expected structure
-            if isinstance(products_data, dict) and 'products' in products_data:
-                products_list = products_data['products']
-            elif isinstance(products_data, list):
-                products_list = products_data
-            else:
-                products_list = products_data if products_data else []
-
-            # Transform products to ensure consistent format
-            transformed_products = []
-            for product in products_list:
-                if isinstance(product, dict):
-                    transformed_products.append({
-                        'code': product.get('code', ''),
-                        'name': product.get('name', ''),
-                        'amount': product.get('amount', 0),
-                        'description': product.get('description', ''),
-                        'validity': product.get('validity', ''),
-                    })
-
-            return Response({'products': transformed_products}, status=status.HTTP_200_OK)
-        else:
-            error_msg = data.get('message', f'Failed to fetch products from external API ({response.status_code})')
-            print(f"Yanga API products error for {api_biller_code}: {response.status_code} - {response.text}")
-            return Response({'error': error_msg}, status=status.HTTP_400_BAD_REQUEST)
-    except requests.exceptions.RequestException as e:
-        error_msg = f"Request error in get_products for {api_biller_code}: {str(e)}"
-        print(error_msg)  # Debug logging
-        return Response({'error': 'Failed to fetch products. Please try again later.', 'details': str(e)}, 
-                       status=status.HTTP_503_SERVICE_UNAVAILABLE)
-    except ValueError as e:
-        error_msg = f"Invalid response format in get_products for {api_biller_code}: {str(e)}"
-        print(error_msg)  # Debug logging
-        return Response({'error': 'Invalid response from service provider', 'details': str(e)},
-                       status=status.HTTP_502_BAD_GATEWAY)
-    except Exception as e:
-        error_msg = f"Unexpected error in get_products for {api_biller_code}: {str(e)}"
-        print(error_msg)  # Debug logging
-        return Response({'error': 'An unexpected error occurred', 'details': str(e)},
-                       status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return (
+        'data', validated_data['amount'],
+        f"Data purchase for {validated_data['phone_number']}",
+        purchase_payload, DataTransaction, {
+            'phone_number': validated_data['phone_number'],
+            'network': validated_data['network'],
+            'data_plan': validated_data['data_plan'],
+            'validity': "30 days",  # Placeholder
+        },
+    ), None
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def top_up(request):
+    """
+    Buy airtime or data. With ``async`` set, the purchase is queued and the
+    response is 202 with the pending transaction's reference.
+
+    Funds are held while Yanga is called and only debited once it confirms,
+    so no database transaction is open during the vendor call.
+    """
     data = request.data
     top_up_type = data.get('type')
+    submit_async = str(data.get('async', '')).lower() in ('1', 'true', 'yes')
 
-    # Add a small random delay to avoid appearing automated
-    time.sleep(random.uniform(0.5, 1.5))
-
-
-
-    print(f"Top-up request data: {data}")  # Debug logging
-
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Bearer {settings.YANGA_API_KEY}",
-        "User-Agent": "SpaceVest/1.0 (https://spacevest.com.ng; support@spacevest.com.ng)"
-
-    }
-
-     # Configure retry strategy
-    session = requests.Session()
-    retries = Retry(
-        total=3,
-        backoff_factor=1,
-        status_forcelist=[500, 502, 503, 504, 429]
-    )
-    session.mount('https://', HTTPAdapter(max_retries=retries))
-    
     if top_up_type == 'airtime':
-        serializer = AirtimePurchaseSerializer(data=data)
-        print(f"Airtime serializer data: {data}")  # Debug logging
-        print(f"Airtime serializer is_valid: {serializer.is_valid()}")  # Debug logging
-        if not serializer.is_valid():
-            print(f"Airtime serializer errors: {serializer.errors}")  # Debug logging
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-        try:
-            with db_transaction.atomic():
-                validated_data = serializer.validated_data
-
-                # Use the actual biller code from the network field
-                api_biller_code = validated_data['network']
-
-                # For airtime, check if biller has products
-                products_url = f"{settings.YANGA_API_BASE_URL}/bill-payments/products/{api_biller_code}"
-                products_response = requests.get(products_url, headers=headers)
-
-                product_code = None
-                if products_response.status_code == 200:
-                    products_data = products_response.json()
-                    if products_data.get('success') and products_data.get('data', {}).get('products'):
-                        # Has predefined products - use product code
-                        product_code = validated_data.get('product_code')
-                        if not product_code:
-                            return Response({'error': 'Product code is required for this airtime plan'}, status=status.HTTP_400_BAD_REQUEST)
-                    else:
-                        # No predefined products - use amount directly
-                        product_code = None
-                else:
-                    # Assume no products for airtime
-                    product_code = None
-
-                # Prepare payload for purchase
-                import uuid
-                request_id = str(uuid.uuid4())
-                purchase_payload = {
-                    "request_id": request_id,
-                    "biller_code": api_biller_code,
-                    "recipient": validated_data['phone_number'],
-                    "sync": False
-                }
-
-                # Add product_code if available, otherwise add amount for custom airtime
-                if product_code:
-                    purchase_payload["product_code"] = product_code
-                else:
-                    # For custom airtime amount - convert to integer
-                    purchase_payload["amount"] = int(validated_data['amount'])
-
-                # Make purchase request
-                purchase_url = f"{settings.YANGA_API_BASE_URL}/bill-payments/pay"
-                print(f"Making purchase request to: {purchase_url}")  # Debug logging
-                print(f"Purchase payload: {purchase_payload}")  # Debug logging
-                purchase_response = requests.post(purchase_url, json=purchase_payload, headers=headers)
-                print(f"Purchase response status: {purchase_response.status_code}")  # Debug logging
-                print(f"Purchase response text: {purchase_response.text}")  # Debug logging
-
-                if purchase_response.status_code != 200:
-                    try:
-                        error_data = purchase_response.json()
-                        message = error_data.get('message', 'Failed to complete airtime purchase')
-                        return Response({'error': message}, status=status.HTTP_400_BAD_REQUEST)
-                    except ValueError:
-                        return Response({'error': 'Failed to complete airtime purchase'}, status=status.HTTP_400_BAD_REQUEST)
-                    
-                purchase_result = purchase_response.json()
-
-                if not purchase_result.get('success'):
-                    return Response({'error': purchase_result.get('message', 'Purchase failed')}, status=status.HTTP_400_BAD_REQUEST)
+        build_order = _airtime_order
+    elif top_up_type == 'data':
+        build_order = _data_order
+    else:
+        return Response({'error': 'Invalid top-up type'}, status=status.HTTP_400_BAD_REQUEST)
 
-                # Create transaction
-                transaction = Transaction.objects.create(
-                    user=request.user,
-                    transaction_type='debit',
-                    category='airtime',
-                    amount=validated_data['amount'],
-                    description=f"Airtime purchase for {validated_data['phone_number']}",
-                    metadata=purchase_result
-                )
+    try:
+        order, errors = build_order(data)
+        if errors:
+            logger.info('%s purchase rejected: %s', top_up_type.capitalize(), errors)
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        return run_top_up(request.user, *order, submit_async)
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-                # Create airtime details
-                AirtimeTransaction.objects.create(
-                    transaction=transaction,
-                    phone_number=validated_data['phone_number'],
-                    network=validated_data['network'],
-                    plan_name=validated_data.get('plan_name')
-                )
+def _bulk_rows(request):
+    """
+    Return an iterator over the rows of a bulk top-up: the lines of an
+    uploaded CSV ``file``, decoded as they are read, or the JSON ``rows``.
+    Returns ``None`` if the request has neither.
+    """
+    upload = request.FILES.get('file')
+    if upload is not None:
+        return csv.DictReader(codecs.iterdecode(upload, 'utf-8-sig'))
+    rows = request.data.get('rows')
+    return iter(rows) if isinstance(rows, list) else None
+
+def _clean_row(row, default_type):
+    if not isinstance(row, dict):
+        return None
+    # Blank CSV cells count as missing; columns without a header are dropped
+    row = {
+        key.strip(): value.strip() if isinstance(value, str) else value
+        for key, value in row.items()
+        if isinstance(key, str) and not isinstance(value, list)
+    }
+    row = {key: value for key, value in row.items() if value not in (None, '')}
+    row.setdefault('type', default_type)
+    return row
 
-                # Deduct from wallet
-                request.user.wallet_balance -= validated_data['amount']
-                request.user.save()
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def bulk_top_up(request):
+    """
+    Buy airtime and data for many phone numbers at once.
+
+    Rows come from an uploaded CSV ``file`` (one purchase per line, with the
+    same columns as ``top_up``) or a JSON list of ``rows``; a ``type`` sent
+    alongside applies to rows that do not set their own. Every row is
+    validated before anything is reserved, and any invalid row rejects the
+    whole batch. The batch total is then held with one wallet update and the
+    response is 202 with the batch; its rows are sent to Yanga in the
+    background and can be followed at ``top-up/bulk/<id>/``.
+    """
+    default_type = request.data.get('type')
+    max_rows = settings.YANGA_BULK_MAX_ROWS
+    # The catalog is asked at most once per network for the whole batch
+    requires_product_code = functools.lru_cache(maxsize=None)(_requires_product_code)
 
-                transaction.status = 'completed'
-                transaction.save()
+    rows = _bulk_rows(request)
+    if rows is None:
+        return Response({'error': 'Upload a CSV file or send a list of rows'}, status=status.HTTP_400_BAD_REQUEST)
 
-                return Response(TransactionSerializer(transaction).data, status=status.HTTP_201_CREATED)
+    orders = []
+    errors = []
+    try:
+        for row_number, row in enumerate(rows, start=1):
+            if row_number > max_rows:
+                return Response({'error': f'A batch can have at most {max_rows} rows'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            row = _clean_row(row, default_type)
+            if row is None:
+                row_errors = {'error': 'Each row must be an object'}
+            elif row['type'] == 'airtime':
+                order, row_errors = _airtime_order(row, requires_product_code)
+            elif row['type'] == 'data':
+                order, row_errors = _data_order(row)
+            else:
+                row_errors = {'type': ['Must be airtime or data']}
+            if row_errors:
+                errors.append({'row': row_number, 'errors': row_errors})
+            else:
+                orders.append(order)
+    except (UnicodeDecodeError, csv.Error) as e:
+        return Response({'error': f'Could not read the CSV file: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if errors:
+        return Response({
+            'error': f'{len(errors)} rows are invalid; nothing was purchased',
+            'rows': errors[:100],
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if not orders:
+        return Response({'error': 'No rows to purchase'}, status=status.HTTP_400_BAD_REQUEST)
+    if yanga.breaker().state == circuit.OPEN:
+        return Response({'error': 'Top-ups are temporarily unavailable, please try again shortly'},
+                        status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
-        else:
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        batch = topups.reserve_batch(request.user, orders)
+    except InsufficientFunds:
+        return Response({'error': 'Insufficient wallet balance for this batch'}, status=status.HTTP_400_BAD_REQUEST)
 
-    elif top_up_type == 'data':
-        plan = data.get('data_plan', '')
-        amount = data.get('amount')
-        product_code = data.get('product_code')
-        network = data.get('network')
-
-        # Ensure amount is properly handled
-        if amount is None and plan:
-            import re
-            match = re.search(r'₦(\d+)', plan)
-            if match:
-                amount = int(match.group(1))
-
-        data_copy = data.copy()
-        data_copy['data_plan'] = plan
-        data_copy['amount'] = amount
-
-        serializer = DataPurchaseSerializer(data=data_copy)
-        if serializer.is_valid():
-            try:
-                with db_transaction.atomic():
-                    validated_data = serializer.validated_data
-
-                    # Use the biller code from the network field (which is now the biller code)
-                    biller_code = network
-
-                    # For data bundles, product_code is always required since they have predefined products
-                    if not product_code:
-                        return Response({'error': 'Product code is required for data bundle purchase'}, status=status.HTTP_400_BAD_REQUEST)
-
-                    final_product_code = product_code
-
-                    # Prepare payload for purchase
-                    import uuid
-                    request_id = str(uuid.uuid4())
-                    purchase_payload = {
-                        "request_id": request_id,
-                        "biller_code": biller_code,
-                        "recipient": validated_data['phone_number'],
-                        "sync": False,
-                        "product_code": final_product_code
-                    }
-
-                    # Make purchase request
-                    purchase_url = f"{settings.YANGA_API_BASE_URL}/bill-payments/pay"
-                    purchase_response = requests.post(purchase_url, json=purchase_payload, headers=headers)
-                    if purchase_response.status_code != 200:
-                        return Response({'error': 'Failed to complete data bundle purchase'}, status=status.HTTP_502_BAD_GATEWAY)
-                    purchase_result = purchase_response.json()
-
-                    if not purchase_result.get('success'):
-                        return Response({'error': purchase_result.get('message', 'Purchase failed')}, status=status.HTTP_400_BAD_REQUEST)
-
-                    # Create transaction
-                    transaction = Transaction.objects.create(
-                        user=request.user,
-                        transaction_type='debit',
-                        category='data',
-                        amount=validated_data['amount'],
-                        description=f"Data purchase for {validated_data['phone_number']}",
-                        metadata=purchase_result
-                    )
-
-                    # Create data details
-                    DataTransaction.objects.create(
-                        transaction=transaction,
-                        phone_number=validated_data['phone_number'],
-                        network=validated_data['network'],
-                        data_plan=validated_data['data_plan'],
-                        validity="30 days"  # Placeholder
-                    )
-
-                    # Deduct from wallet
-                    request.user.wallet_balance -= validated_data['amount']
-                    request.user.save()
-
-                    transaction.status = 'completed'
-                    transaction.save()
-
-                    return Response(TransactionSerializer(transaction).data, status=status.HTTP_201_CREATED)
-
-            except Exception as e:
-                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
-        else:
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    db_transaction.on_commit(lambda: topups.start_batch(batch.pk))
+    return Response(TopUpBatchSerializer(batch).data, status=status.HTTP_202_ACCEPTED)
 
-    else:
-        return Response({'error': 'Invalid top-up type'}, status=status.HTTP_400_BAD_REQUEST)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def top_up_batch_detail(request, pk):
+    """
+    Progress of a bulk top-up: its rows counted by status, and the failed
+    rows with Yanga's reason.
+    """
+    batch = TopUpBatch.objects.filter(pk=pk, user=request.user).first()
+    if batch is None:
+        return Response({'error': 'Batch not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    rows = topups.batch_transactions(batch)
+    summary = {
+        row['status']: {'count': row['count'], 'amount': row['amount']}
+        for row in rows.values('status').annotate(count=Count('id'), amount=Sum('amount')).order_by()
+    }
+    failed = [
+        {
+            'row': metadata.get('row'),
+            'reference': reference,
+            'recipient': metadata.get('request', {}).get('recipient'),
+            'message': (metadata.get('response') or {}).get('message'),
+        }
+        for reference, metadata in rows.filter(status='failed').order_by('id').values_list('reference', 'metadata')
+    ]
+    return Response({**TopUpBatchSerializer(batch).data, 'rows': summary, 'failed_rows': failed})
@@ -0,0 +1,263 @@
+"""
+Wallet balance mutations.
+
+Every change to ``CustomUser.wallet_balance`` goes through this module. Each
+mutation is a single conditional ``UPDATE`` on the balance column, so money
+paths never rewrite the whole user row (and its JSON columns), never fire the
+user ``post_save`` signals, and cannot race each other into a negative balance.
+Each mutation also posts a balanced journal to the ledger in the same database
+transaction.
+
+Payments that wait on a provider use two phases instead: ``hold`` reserves the
+amount in a short transaction, the provider is called with no locks held, and
+``capture`` or ``release`` settles the hold afterwards. Open holds are tracked
+in ``held_balance`` and count against the available balance of every debit.
+``hold_many`` and ``settle_many`` do the same for a batch of payments with one
+balance update per user, as ``credit_many`` does for a batch of deposits.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import ledger
+from .models import WalletHold
+
+User = get_user_model()
+
+
+class InsufficientFunds(Exception):
+    """Raised when a wallet does not hold enough funds for a debit."""
+
+
+class HoldSettled(Exception):
+    """Raised when capturing or releasing a hold that is no longer open."""
+
+
+def _to_amount(amount):
+    amount = Decimal(str(amount))
+    if amount <= 0:
+        raise ValueError('Amount must be greater than 0')
+    return amount
+
+
+def _read_balance(user_id):
+    return User.objects.filter(pk=user_id).values_list('wallet_balance', flat=True).get()
+
+
+def _debit(user, amount):
+    updated = User.objects.filter(pk=user.pk, wallet_balance__gte=F('held_balance') + amount).update(
+        wallet_balance=F('wallet_balance') - amount
+    )
+    if not updated:
+        raise InsufficientFunds('Insufficient wallet balance')
+    user.wallet_balance = _read_balance(user.pk)
+    return user.wallet_balance
+
+
+def _credit(user, amount):
+    User.objects.filter(pk=user.pk).update(wallet_balance=F('wallet_balance') + amount)
+    user.wallet_balance = _read_balance(user.pk)
+    return user.wallet_balance
+
+
+def debit(user, amount, transaction=None):
+    """
+    Take ``amount`` from the user's wallet.
+
+    Raises ``InsufficientFunds`` if the balance is too low. Returns the new
+    balance and refreshes ``user.wallet_balance`` in place.
+    """
+    amount = _to_amount(amount)
+    with db_transaction.atomic():
+        balance = _debit(user, amount)
+        ledger.post([
+            (user, 'wallet', 'debit', amount),
+            (user, 'external', 'credit', amount),
+        ], transaction=transaction)
+    return balance
+
+
+def credit(user, amount, transaction=None):
+    """
+    Add ``amount`` to the user's wallet.
+
+    Returns the new balance and refreshes ``user.wallet_balance`` in place.
+    """
+    amount = _to_amount(amount)
+    with db_transaction.atomic():
+        balance = _credit(user, amount)
+        ledger.post([
+            (user, 'external', 'debit', amount),
+            (user, 'wallet', 'credit', amount),
+        ], transaction=transaction)
+    return balance
+
+
+def credit_many(credits):
+    """
+    Add several amounts to wallets, given as ``(user, amount, transaction)``
+    triples.
+
+    Balances are updated once per user, in primary-key order, and the credits
+    are posted to the ledger in one insert.
+    """
+    credits = [(user, _to_amount(amount), transaction) for user, amount, transaction in credits]
+    totals = defaultdict(Decimal)
+    for user, amount, _ in credits:
+        totals[user.pk] += amount
+    with db_transaction.atomic():
+        for user_id in sorted(totals):
+            User.objects.filter(pk=user_id).update(wallet_balance=F('wallet_balance') + totals[user_id])
+        ledger.post_many(
+            ([
+                (user, 'external', 'debit', amount),
+                (user, 'wallet', 'credit', amount),
+            ], transaction)
+            for user, amount, transaction in credits
+        )
+
+
+def transfer(sender, recipient, amount, transaction=None):
+    """
+    Move ``amount`` from ``sender`` to ``recipient`` atomically.
+
+    Both rows are locked in primary-key order before either is touched, so two
+    opposite transfers between the same pair of users cannot deadlock.
+    Returns the sender's new balance.
+    """
+    amount = _to_amount(amount)
+    with db_transaction.atomic():
+        list(
+            User.objects.select_for_update()
+            .filter(pk__in={sender.pk, recipient.pk})
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        balance = _debit(sender, amount)
+        _credit(recipient, amount)
+        ledger.post([
+            (sender, 'wallet', 'debit', amount),
+            (recipient, 'wallet', 'credit', amount),
+        ], transaction=transaction)
+    return balance
+
+
+def hold(user, amount, transaction=None):
+    """
+    Reserve ``amount`` of the user's available balance.
+
+    Raises ``InsufficientFunds`` if the available balance is too low. Returns
+    the open ``WalletHold``.
+    """
+    amount = _to_amount(amount)
+    with db_transaction.atomic():
+        updated = User.objects.filter(pk=user.pk, wallet_balance__gte=F('held_balance') + amount).update(
+            held_balance=F('held_balance') + amount
+        )
+        if not updated:
+            raise InsufficientFunds('Insufficient wallet balance')
+        return WalletHold.objects.create(user=user, amount=amount, transaction=transaction)
+
+
+def hold_many(user, amounts):
+    """
+    Reserve several amounts of the user's available balance at once, given as
+    ``(amount, transaction)`` pairs.
+
+    Their total is reserved with a single update, so either every hold is
+    placed or ``InsufficientFunds`` is raised. Returns the open holds in the
+    order given.
+    """
+    amounts = [(_to_amount(amount), transaction) for amount, transaction in amounts]
+    if not amounts:
+        return []
+    total = sum(amount for amount, _ in amounts)
+    with db_transaction.atomic():
+        updated = User.objects.filter(pk=user.pk, wallet_balance__gte=F('held_balance') + total).update(
+            held_balance=F('held_balance') + total
+        )
+        if not updated:
+            raise InsufficientFunds('Insufficient wallet balance')
+        return WalletHold.objects.bulk_create([
+            WalletHold(user=user, amount=amount, transaction=transaction)
+            for amount, transaction in amounts
+        ])
+
+
+def _settle(hold, status):
+    updated = WalletHold.objects.filter(pk=hold.pk, status='open').update(
+        status=status, settled_at=timezone.now()
+    )
+    if not updated:
+        raise HoldSettled(f'Hold {hold.pk} is no longer open')
+    hold.status = status
+
+
+def capture(hold):
+    """
+    Debit the funds reserved by an open hold. Returns the new balance.
+    """
+    with db_transaction.atomic():
+        _settle(hold, 'captured')
+        User.objects.filter(pk=hold.user_id).update(
+            wallet_balance=F('wallet_balance') - hold.amount,
+            held_balance=F('held_balance') - hold.amount,
+        )
+        ledger.post([
+            (hold.user, 'wallet', 'debit', hold.amount),
+            (hold.user, 'external', 'credit', hold.amount),
+        ], transaction=hold.transaction)
+        hold.user.wallet_balance = _read_balance(hold.user_id)
+    return hold.user.wallet_balance
+
+
+def release(hold):
+    """
+    Return the funds reserved by an open hold to the available balance.
+    """
+    with db_transaction.atomic():
+        _settle(hold, 'released')
+        User.objects.filter(pk=hold.user_id).update(held_balance=F('held_balance') - hold.amount)
+
+
+def settle_many(captured=(), released=()):
+    """
+    Capture the ``captured`` holds and release the ``released`` ones.
+
+    Balances are updated once per user, in primary-key order, and the
+    captures are posted to the ledger in one insert. Raises ``HoldSettled``
+    (and settles nothing) if any of the holds is no longer open.
+    """
+    now = timezone.now()
+    debited = defaultdict(Decimal)
+    unheld = defaultdict(Decimal)
+    with db_transaction.atomic():
+        for holds, status in ((captured, 'captured'), (released, 'released')):
+            if not holds:
+                continue
+            updated = WalletHold.objects.filter(pk__in=[h.pk for h in holds], status='open').update(
+                status=status, settled_at=now
+            )
+            if updated != len(holds):
+                raise HoldSettled(f'{len(holds) - updated} of the holds are no longer open')
+            for hold in holds:
+                hold.status = status
+                unheld[hold.user_id] += hold.amount
+                if status == 'captured':
+                    debited[hold.user_id] += hold.amount
+        for user_id in sorted(unheld):
+            User.objects.filter(pk=user_id).update(
+                wallet_balance=F('wallet_balance') - debited[user_id],
+                held_balance=F('held_balance') - unheld[user_id],
+            )
+        ledger.post_many(
+            ([
+                (hold.user, 'wallet', 'debit', hold.amount),
+                (hold.user, 'external', 'credit', hold.amount),
+            ], hold.transaction)
+            for hold in captured
+        )
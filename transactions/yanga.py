@@ -0,0 +1,116 @@
+"""
+Shared HTTP client for the Yanga bill-payment API.
+
+One ``requests.Session`` is kept per process, so calls reuse pooled
+keep-alive connections instead of paying a TCP and TLS handshake each time.
+All calls share one retry policy and the same connect/read timeouts, and go
+through the ``yanga`` circuit breaker (``spacevest.circuit``), so while Yanga
+is failing or slow calls raise ``ProviderUnavailable`` instead of waiting.
+
+``aget``/``apost`` are the same calls for async views, made with a pooled
+``httpx.AsyncClient`` (``spacevest.aio``) behind the same breaker.
+"""
+import os
+import threading
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from spacevest import aio, circuit
+
+# Fail fast when Yanga is unreachable; leave room for slow purchase replies
+TIMEOUT = (settings.YANGA_CONNECT_TIMEOUT, settings.YANGA_READ_TIMEOUT)
+
+# Reads are retried on errors and overload responses. Purchases are only
+# retried when the connection was never made, so a payment is never sent twice.
+RETRY = Retry(
+    total=3,
+    connect=3,
+    read=2,
+    status=3,
+    backoff_factor=0.5,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=frozenset(['GET']),
+    raise_on_status=False,
+)
+
+HEADERS = {
+    "accept": "application/json",
+    "User-Agent": "SpaceVest/1.0 (https://spacevest.com.ng; support@spacevest.com.ng)",
+    "X-Requested-With": "XMLHttpRequest",
+    "Referer": "https://spacevest.com.ng",
+}
+
+_lock = threading.Lock()
+_session = None
+
+
+def _reset():
+    global _session
+    _session = None
+
+
+# A forked worker must open its own connections
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset)
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                session.headers.update(HEADERS)
+                session.headers['Authorization'] = f"Bearer {settings.YANGA_API_KEY}"
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.YANGA_POOL_SIZE, max_retries=RETRY)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def url(path):
+    return f"{settings.YANGA_API_BASE_URL}/{path.lstrip('/')}"
+
+
+def breaker():
+    return circuit.breaker('yanga', settings.YANGA_MAX_CONCURRENT)
+
+
+def get(path, **kwargs):
+    kwargs.setdefault('timeout', TIMEOUT)
+    return breaker().call(get_session().get, url(path), **kwargs)
+
+
+def post(path, **kwargs):
+    kwargs.setdefault('timeout', TIMEOUT)
+    return breaker().call(get_session().post, url(path), **kwargs)
+
+
+def _new_async_client():
+    limits = httpx.Limits(
+        max_connections=settings.YANGA_MAX_CONCURRENT,
+        max_keepalive_connections=settings.YANGA_POOL_SIZE,
+    )
+    return httpx.AsyncClient(
+        headers={**HEADERS, 'Authorization': f"Bearer {settings.YANGA_API_KEY}"},
+        timeout=httpx.Timeout(settings.YANGA_READ_TIMEOUT, connect=settings.YANGA_CONNECT_TIMEOUT),
+        # httpx only retries failed connections, so purchases are never sent twice
+        transport=httpx.AsyncHTTPTransport(retries=RETRY.connect, limits=limits),
+    )
+
+
+def get_async_client():
+    return aio.client('yanga', _new_async_client)
+
+
+async def aget(path, **kwargs):
+    return await breaker().acall(get_async_client().get, url(path), **kwargs)
+
+
+async def apost(path, **kwargs):
+    return await breaker().acall(get_async_client().post, url(path), **kwargs)
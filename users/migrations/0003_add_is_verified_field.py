@@ -5,10 +5,13 @@ class Migration(migrations.Migration):
         ('users', '0002_add_is_verified_to_bankaccount'),
     ]
 
+    # 0001 already creates the column, so this only records it in the state
     operations = [
-        migrations.AddField(
-            model_name='bankaccount',
-            name='is_verified',
-            field=models.BooleanField(default=False),
-        ),
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AddField(
+                model_name='bankaccount',
+                name='is_verified',
+                field=models.BooleanField(default=False),
+            ),
+        ]),
     ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_add_is_verified_field'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='held_balance',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=15),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_held_balance'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='virtualaccount',
+            name='account_number',
+            field=models.CharField(db_index=True, max_length=20),
+        ),
+    ]
@@ -12,6 +12,8 @@ class CustomUser(AbstractUser):
     
     # Wallet and financial information
     wallet_balance = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
+    # Reserved by open wallet holds; only wallet_balance - held_balance can be spent
+    held_balance = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
     
     # KYC verification
     kyc_verified = models.BooleanField(default=False)
@@ -43,3 +45,7 @@ class CustomUser(AbstractUser):
     
     def __str__(self):
         return self.email or self.username
+    
+    @property
+    def available_balance(self):
+        return self.wallet_balance - self.held_balance
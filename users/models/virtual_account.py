@@ -4,7 +4,8 @@ from .custom_user import CustomUser
 class VirtualAccount(models.Model):
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='virtual_account')
     bank_name = models.CharField(max_length=255)
-    account_number = models.CharField(max_length=20)
+    # Deposit webhooks are matched to their account by number
+    account_number = models.CharField(max_length=20, db_index=True)
     account_name = models.CharField(max_length=255)
     provider_reference = models.CharField(max_length=255, blank=True, null=True)
     is_active = models.BooleanField(default=True)
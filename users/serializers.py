@@ -4,7 +4,16 @@ from .models import CustomUser, BankAccount, VirtualAccount
 class CustomUserSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
-        fields = ['id', 'email', 'username', 'first_name', 'last_name', 'phone', 'country', 'wallet_balance', 'kyc_verified', 'role', 'created_at', 'updated_at']
+        fields = ['id', 'email', 'username', 'first_name', 'last_name', 'phone', 'country', 'wallet_balance', 'held_balance', 'available_balance', 'kyc_verified', 'role', 'created_at', 'updated_at']
+        read_only_fields = ['wallet_balance', 'held_balance']
+
+    def update(self, instance, validated_data):
+        # Balances only change through transactions.wallet; a full save would
+        # overwrite the balances of any wallet update made since the load
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
 
 class BankAccountSerializer(serializers.ModelSerializer):
     class Meta:
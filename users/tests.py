@@ -1,3 +1,51 @@
+import json
+from decimal import Decimal
+from unittest import mock
+
+from django.db.models import F
 from django.test import TestCase
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from .models import CustomUser
+from .serializers import CustomUserSerializer
+
+
+def credit_meanwhile(user, amount='50.00'):
+    # What a wallet credit committed by another request looks like
+    CustomUser.objects.filter(pk=user.pk).update(wallet_balance=F('wallet_balance') + Decimal(amount))
+
+
+class UserSaveTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='saver', email='saver@example.com', password='pass')
+
+    def balance(self):
+        return CustomUser.objects.values_list('wallet_balance', flat=True).get(pk=self.user.pk)
+
+    def test_profile_update_keeps_concurrent_credit(self):
+        serializer = CustomUserSerializer(self.user, data={'first_name': 'Ada', 'wallet_balance': '999.00'},
+                                          partial=True)
+        self.assertTrue(serializer.is_valid())
+        credit_meanwhile(self.user)
+        serializer.save()
+
+        self.assertEqual(self.balance(), Decimal('50.00'))
+        self.assertEqual(CustomUser.objects.get(pk=self.user.pk).first_name, 'Ada')
+
+    def test_password_reset_keeps_concurrent_credit(self):
+        def check_token(user, token):
+            credit_meanwhile(user)
+            return True
+
+        with mock.patch('users.views.default_token_generator.check_token', side_effect=check_token):
+            response = self.client.post(
+                '/reset-password/x/y/',
+                json.dumps({'uidb64': urlsafe_base64_encode(force_bytes(self.user.pk)), 'token': 'token',
+                            'new_password1': 'n3w-Password', 'new_password2': 'n3w-Password'}),
+                content_type='application/json',
+            )
 
-# Create your tests here.
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.balance(), Decimal('50.00'))
+        self.assertTrue(CustomUser.objects.get(pk=self.user.pk).check_password('n3w-Password'))
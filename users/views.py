@@ -12,6 +12,7 @@ from django.contrib.messages import get_messages
 from django.utils.http import urlsafe_base64_decode
 from django.utils.encoding import force_str
 from django.contrib.auth.tokens import default_token_generator
+import httpx
 import requests
 from django.conf import settings
 import logging
@@ -33,6 +34,10 @@ from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.contrib.auth.tokens import default_token_generator
 from django.contrib.auth.hashers import make_password
+from django.db import transaction as db_transaction
+from banking import paystack, resolve
+from spacevest import aio
+from spacevest.circuit import ProviderUnavailable
 
 import logging
 
@@ -44,50 +49,43 @@ def home_view(request):
     """
     return render(request, 'users/landing.html', {})
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def verify_bank_account(request):
+@aio.api_view(['POST'])
+async def verify_bank_account(request):
     """
     Verify a bank account using Paystack's resolve account number endpoint
     """
     try:
-        data = json.loads(request.body)
+        data = request.data
         account_number = data.get('account_number')
         bank_code = data.get('bank_code')
         
         if not account_number or not bank_code:
-            return Response(
+            return aio.Response(
                 {'error': 'Account number and bank code are required'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Call Paystack API to resolve account number
-        headers = {
-            'Authorization': f'Bearer {settings.PAYSTACK_SECRET_KEY}',
-            'Content-Type': 'application/json',
-        }
-        
-        response = requests.get(
-            f'https://api.paystack.co/bank/resolve?account_number={account_number}&bank_code={bank_code}',
-            headers=headers
-        )
+        # Resolve the account with Paystack (cached, and shared with identical lookups in flight)
+        data = await resolve.aresolve(account_number, bank_code)
+        return aio.Response({
+            'account_name': data['data']['account_name'],
+            'account_number': account_number,
+            'bank_code': bank_code,
+            'bank_name': data['data'].get('bank_name', '')
+        })
         
-        if response.status_code == 200:
-            data = response.json()
-            return Response({
-                'account_name': data['data']['account_name'],
-                'account_number': account_number,
-                'bank_code': bank_code,
-                'bank_name': data['data'].get('bank_name', '')
-            })
-            
-        return Response(
+    except (resolve.AccountNotResolved, httpx.HTTPStatusError):
+        return aio.Response(
             {'error': 'Could not verify account details'}, 
             status=status.HTTP_400_BAD_REQUEST
         )
-        
+    except ProviderUnavailable:
+        return aio.Response(
+            {'error': 'Bank verification is temporarily unavailable, please try again shortly'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
     except Exception as e:
-        return Response(
+        return aio.Response(
             {'error': str(e)}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
@@ -179,30 +177,22 @@ class VirtualAccountView(generics.RetrieveAPIView):
         except VirtualAccount.DoesNotExist:
             return None
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def generate_virtual_account(request):
+@aio.api_view(['POST'])
+async def generate_virtual_account(request):
     """
     Generate a dedicated virtual account for the user using Paystack API
     """
     user = request.user
 
     # Check if user already has a virtual account
-    existing_account = VirtualAccount.objects.filter(user=user).first()
+    existing_account = await VirtualAccount.objects.filter(user=user).afirst()
     if existing_account:
         serializer = VirtualAccountSerializer(existing_account)
-        return Response({
+        return aio.Response({
             'message': 'Virtual account already exists',
             'virtual_account': serializer.data
         }, status=status.HTTP_200_OK)
 
-    # Paystack API endpoint and headers
-    url = "https://api.paystack.co/dedicated_account"
-    headers = {
-        "Authorization": f"Bearer {settings.PAYSTACK_SECRET_KEY}",
-        "Content-Type": "application/json"
-    }
-
     # Request payload
     data = {
         "customer": user.id,  # Using user ID as customer identifier
@@ -211,14 +201,14 @@ def generate_virtual_account(request):
 
     try:
         # Make API call to Paystack
-        response = requests.post(url, json=data, headers=headers)
+        response = await paystack.apost("dedicated_account", json=data)
         response_data = response.json()
 
         if response.status_code == 200 and response_data.get('status'):
             account_data = response_data.get('data', {})
 
             # Create virtual account record
-            virtual_account = VirtualAccount.objects.create(
+            virtual_account = await VirtualAccount.objects.acreate(
                 user=user,
                 bank_name=account_data.get('bank', {}).get('name', 'Wema Bank'),
                 account_number=account_data.get('account_number'),
@@ -228,21 +218,25 @@ def generate_virtual_account(request):
             )
 
             serializer = VirtualAccountSerializer(virtual_account)
-            return Response({
+            return aio.Response({
                 'message': 'Virtual account generated successfully',
                 'virtual_account': serializer.data
             }, status=status.HTTP_201_CREATED)
         else:
-            return Response({
+            return aio.Response({
                 'error': response_data.get('message', 'Failed to generate virtual account')
             }, status=status.HTTP_400_BAD_REQUEST)
 
-    except requests.RequestException as e:
-        return Response({
+    except ProviderUnavailable:
+        return aio.Response({
+            'error': 'Virtual accounts are temporarily unavailable, please try again shortly'
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    except (httpx.HTTPError, requests.RequestException) as e:
+        return aio.Response({
             'error': f'Network error: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     except Exception as e:
-        return Response({
+        return aio.Response({
             'error': f'Server error: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -250,64 +244,35 @@ def generate_virtual_account(request):
 @permission_classes([IsAuthenticated])
 def confirm_payment_sent(request):
     """
-    Handle user confirmation that they have sent money to virtual account
-    This would typically trigger a webhook check or manual verification
+    Handle user confirmation that they have sent money to virtual account.
+    Deposits are credited from Paystack's webhooks (see banking.deposits),
+    so this only reports the deposits credited in the last 24 hours.
     """
     user = request.user
 
-    try:
-        virtual_account = VirtualAccount.objects.get(user=user, is_active=True)
-    except VirtualAccount.DoesNotExist:
+    if not VirtualAccount.objects.filter(user=user, is_active=True).exists():
         return Response({
             'error': 'No active virtual account found'
         }, status=status.HTTP_404_NOT_FOUND)
 
-    # For now, we'll simulate a payment confirmation
-    # In production, this should check Paystack webhooks or API for actual payments
-    amount = request.data.get('amount')
-    if not amount:
-        return Response({
-            'error': 'Amount is required'
-        }, status=status.HTTP_400_BAD_REQUEST)
-
-    try:
-        amount = float(amount)
-        if amount <= 0:
-            raise ValueError("Invalid amount")
-
-        # Credit the user's wallet
-        user.wallet_balance += amount
-        user.save()
-
-        # Create a transaction record
-        from transactions.models import Transaction
-        Transaction.objects.create(
-            user=user,
-            transaction_type='credit',
-            category='deposit',
-            amount=amount,
-            description=f'Wallet top-up via virtual account {virtual_account.account_number}',
-            status='completed',
-            metadata={
-                'payment_method': 'virtual_account',
-                'account_number': virtual_account.account_number,
-                'bank_name': virtual_account.bank_name
-            }
-        )
+    from transactions.models import Transaction
+    since = timezone.now() - timedelta(days=1)
+    deposits = Transaction.objects.filter(
+        user=user,
+        category='deposit',
+        created_at__gte=since,
+        metadata__payment_method='virtual_account',
+    ).order_by('-created_at')[:10]
+    user.refresh_from_db(fields=['wallet_balance'])
 
-        return Response({
-            'message': f'Wallet credited with ₦{amount}',
-            'new_balance': user.wallet_balance
-        }, status=status.HTTP_200_OK)
-
-    except ValueError:
-        return Response({
-            'error': 'Invalid amount format'
-        }, status=status.HTTP_400_BAD_REQUEST)
-    except Exception as e:
-        return Response({
-            'error': f'Error processing payment: {str(e)}'
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return Response({
+        'message': 'Your wallet is credited automatically as soon as the bank confirms your transfer',
+        'wallet_balance': user.wallet_balance,
+        'recent_deposits': [
+            {'amount': tx.amount, 'reference': tx.reference, 'created_at': tx.created_at}
+            for tx in deposits
+        ],
+    }, status=status.HTTP_200_OK)
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -541,7 +506,8 @@ def password_reset_confirm(request, uidb64=None, token=None):
                 
                 # Update password
                 user.set_password(new_password1)
-                user.save()
+                # A full save would write back the balances loaded above
+                user.save(update_fields=['password'])
                 
                 success_msg = 'Your password has been reset successfully. You can now log in with your new password.'
                 if is_json: